@@ -0,0 +1,328 @@
+# Standard driver workloads measured against the host simulator.
+# Run from the firmware directory:
+#   python benchmarks/bench_it8951.py --json before.json
+#   python benchmarks/bench_it8951.py --json after.json --compare before.json
+import sys
+import os
+import struct
+import argparse
+import time
+import tempfile
+# Ensure that the firmware directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from host.it8951_sim import SimulatedIT8951, SimSPI
+from controller_state import FileStore
+from update_queue import UpdateQueue
+from panel_asset import AssetHeader, Compression, rle_encode
+from transfer_pipeline import TransferPipeline
+from glyph_atlas import GlyphAtlas, GlyphCache
+from tile_cache import TileLayer
+import harness
+
+PANEL_WIDTH  = 1872
+PANEL_HEIGHT = 1404
+
+def write_bmp(path: str, width: int, height: int):
+    """
+    Writes a bottom-up 4bpp BMP with a grayscale gradient
+    """
+    stride = ((width*4 + 31) // 32) * 4
+    row = bytes(((x//8) & 0xF) * 0x11 for x in range(width//2)).ljust(stride, b'\0')
+    palette = b''.join(bytes([v*17, v*17, v*17, 0]) for v in range(16))
+    offset = 14 + 40 + len(palette)
+    size = stride*height
+    with open(path, 'wb') as f:
+        f.write(b'BM' + struct.pack('<IHHI', offset + size, 0, 0, offset))
+        f.write(struct.pack('<IiiHHIIiiII', 40, width, height, 1, 4, 0, size, 0, 0, 16, 0))
+        f.write(palette)
+        for _ in range(height):
+            f.write(row)
+
+def write_background_asset(path: str, compression: int):
+    """
+    Writes a full-panel calendar background as a 4bpp panel asset: white
+    with a grey title band and the 7x5 grid of day cells
+    """
+    row_bytes = PANEL_WIDTH // 2
+    white = bytes([0xFF])*row_bytes
+    band  = bytes([0x88])*row_bytes
+    line  = bytes(row_bytes)
+    grid  = bytearray(white)
+    for x in range(0, PANEL_WIDTH, PANEL_WIDTH // 7):
+        grid[x // 2] = 0x00
+    data = bytearray()
+    for y in range(PANEL_HEIGHT):
+        if y < 120:
+            data += band
+        elif (y - 120) % 256 < 2:
+            data += line
+        else:
+            data += grid
+    if compression == Compression.RLE:
+        data = rle_encode(data)
+    header = AssetHeader(ColorDepth.BPP_4BIT, Endianness.LITTLE, PANEL_WIDTH, PANEL_HEIGHT,
+                         compression=compression)
+    with open(path, 'wb') as f:
+        f.write(header.to_bytes() + AssetHeader.pack_index([len(data)]) + data)
+
+def background_asset(compression: int):
+    """
+    Loads the calendar background from a raw or a run-length coded asset
+    """
+    sim = SimulatedIT8951(PANEL_WIDTH, PANEL_HEIGHT)
+    tcon = harness.make_tcon(sim)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "background.ita")
+        write_background_asset(path, compression)
+        def workload():
+            tcon.load_asset(0, 0, path)
+            tcon.display_area(tcon.panel_area, DisplayMode.GC16)
+        metrics = harness.measure(sim, workload)
+        metrics["flash_bytes"] = os.path.getsize(path)
+        return metrics
+
+class ThrottledFile:
+    """
+    File whose reads take as long as they would from the board's flash
+    """
+    def __init__(self, f, bytes_per_s: float):
+        self._f = f
+        self._bytes_per_s = bytes_per_s
+
+    def read(self, n: int = -1) -> bytes:
+        return self._f.read(n)
+
+    def seek(self, offset: int):
+        return self._f.seek(offset)
+
+    def readinto(self, buf) -> int:
+        n = self._f.readinto(buf)
+        time.sleep(n / self._bytes_per_s)
+        return n
+
+class BlockingSPI(SimSPI):
+    """
+    SPI that also sleeps for the time on the wire, like a DMA transfer that
+    leaves the CPU to other threads
+    """
+    def write(self, buf):
+        super().write(buf)
+        time.sleep(len(buf)*8 / self._sim.spi_hz)
+
+def throttled_bmp(pipelined: bool):
+    """
+    Streams a full frame BMP from a 4MB/s flash over a 24MHz SPI bus that
+    both block in real time. Only wall_s shows the overlap.
+    """
+    sim = SimulatedIT8951(PANEL_WIDTH, PANEL_HEIGHT)
+    sim.spi = BlockingSPI(sim)
+    tcon = harness.make_tcon(sim)
+    pipeline = TransferPipeline(4096) if pipelined else None
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "frame.bmp")
+        write_bmp(path, PANEL_WIDTH, PANEL_HEIGHT)
+        def workload():
+            with open(path, 'rb') as f:
+                tcon.load_bmp(0, 0, ThrottledFile(f, 4e6), pipeline=pipeline)
+        metrics = harness.measure(sim, workload)
+        metrics["flash_bytes"] = os.path.getsize(path)
+        return metrics
+
+# Calendar event titles, one per line of a day cell
+EVENT_TITLES = ["Dentist 9:30", "Team stand-up", "Lunch with Anna", "Gym", "Flight BA117 18:05",
+                "Pick up parcel", "Call mum"]
+
+def write_atlas(path: str, height: int = 24):
+    """
+    Writes a 4bpp glyph atlas of printable ASCII with synthetic glyphs, so
+    that the benchmark doesn't need Pillow
+    """
+    img_info = ImageInfo(Endianness.BIG, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+    index = b''
+    data = b''
+    for cp in range(0x20, 0x7F):
+        width = 8 + 2*(cp % 5)
+        pixels = [0x0 if (x*y + cp) % 7 == 0 else 0xF for y in range(height) for x in range(width)]
+        packed = bytes(it8951.pack_pixels_into(img_info, Rectangle(0, 0, width, height), pixels))
+        row_words = len(packed) // height
+        data_rows = b''.join(packed[r*row_words:r*row_words + width // 2] for r in range(height))
+        index += struct.pack(GlyphAtlas._ENTRY, cp, len(data), width)
+        data += data_rows
+    header = struct.pack(GlyphAtlas._FORMAT, GlyphAtlas._MAGIC, GlyphAtlas._VERSION,
+                         ColorDepth.BPP_4BIT, height, height, height - 6, 0x7F - 0x20, b"bench")
+    with open(path, 'wb') as f:
+        f.write(header + index + data)
+
+def event_titles(glyphs: bool):
+    """
+    Redraws the event titles of a day cell from a warm glyph cache, or from
+    per-pixel values packed with pack_pixels_into
+    """
+    sim = SimulatedIT8951(PANEL_WIDTH, PANEL_HEIGHT)
+    tcon = harness.make_tcon(sim)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "font.itg")
+        write_atlas(path)
+        atlas = GlyphAtlas(path)
+        cache = GlyphCache()
+        img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+        for i, title in enumerate(EVENT_TITLES):
+            tcon.draw_text(272, 240 + 26*i, title, atlas, cache)
+        rects = [Rectangle(272, 240 + 26*i, 256, atlas.height) for i in range(len(EVENT_TITLES))]
+        pixels = [[0xF]*rect.area() for rect in rects]
+        def workload():
+            for i, title in enumerate(EVENT_TITLES):
+                if glyphs:
+                    tcon.draw_text(272, 240 + 26*i, title, atlas, cache)
+                else:
+                    packed = it8951.pack_pixels_into(img_info, rects[i], pixels[i])
+                    tcon.write_packed_pixels(img_info, rects[i], packed)
+        metrics = harness.measure(sim, workload)
+        atlas.close()
+        return metrics
+
+def month_resync():
+    """
+    Redraws the 7x5 grid of day cells after a sync that changed one event.
+    Only that cell is rendered and uploaded, the rest hit the tile cache.
+    """
+    sim = SimulatedIT8951(PANEL_WIDTH, PANEL_HEIGHT)
+    tcon = harness.make_tcon(sim)
+    layer = TileLayer(tcon)
+    cells = [Rectangle(4 + 264*(i % 7), 204 + 240*(i // 7), 264, 200) for i in range(35)]
+    def render(rect, img_info):
+        return it8951.pack_pixels_into(img_info, rect, day_cell_pixels(rect))
+    def redraw(changed: int):
+        for i, rect in enumerate(cells):
+            events = ("Dentist 9:30",) if i == changed else ()
+            layer.draw(i, rect, (i, events, "light"), render)
+    redraw(-1)
+    return harness.measure(sim, lambda: redraw(17))
+
+def boot():
+    sim = SimulatedIT8951(PANEL_WIDTH, PANEL_HEIGHT)
+    # Constructed without the start-up sequence, so that the measured one
+    # starts from an empty register cache like a real cold boot
+    tcon = harness.make_tcon(sim, initialise=False)
+    return harness.measure(sim, lambda: tcon.initialise(None))
+
+def warm_boot():
+    """
+    Wake from deep sleep with the controller state saved by the previous boot
+    """
+    sim = SimulatedIT8951(PANEL_WIDTH, PANEL_HEIGHT)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FileStore(os.path.join(tmp, "it8951.state"))
+        # The previous boot, which saves the state
+        harness.make_tcon(sim, state_store=store)
+        # A fresh driver after the wake, with nothing cached
+        tcon = harness.make_tcon(sim, state_store=store, initialise=False)
+        return harness.measure(sim, lambda: tcon.initialise(None))
+
+def full_frame_bmp():
+    sim = SimulatedIT8951(PANEL_WIDTH, PANEL_HEIGHT)
+    tcon = harness.make_tcon(sim)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "frame.bmp")
+        write_bmp(path, PANEL_WIDTH, PANEL_HEIGHT)
+        def workload():
+            tcon.load_bmp(0, 0, path)
+            tcon.display_area(tcon.panel_area, DisplayMode.GC16)
+        return harness.measure(sim, workload)
+
+def fill_rect_x100():
+    sim = SimulatedIT8951(PANEL_WIDTH, PANEL_HEIGHT)
+    tcon = harness.make_tcon(sim)
+    def workload():
+        for i in range(100):
+            rect = Rectangle((i % 10)*180, (i // 10)*136, 64, 48)
+            tcon.fill_rect(rect, DisplayMode.DU, 0 if i % 2 else 0xF)
+    return harness.measure(sim, workload)
+
+def day_cell_pixels(rect: Rectangle) -> bytearray:
+    """
+    Dark text-like strokes on white, one 4bpp value per pixel
+    """
+    colour = bytearray(0xF for _ in range(rect.area()))
+    for y in range(20, rect.height - 20, 24):
+        for x in range(12, rect.width - 12):
+            if (x // 3) % 4:
+                for dy in range(12):
+                    colour[(y + dy)*rect.width + x] = 0x0 if dy % 11 else 0x8
+    return colour
+
+def day_cell_redraw():
+    """
+    Redraws one 264x200 calendar day cell
+    """
+    sim = SimulatedIT8951(PANEL_WIDTH, PANEL_HEIGHT)
+    tcon = harness.make_tcon(sim)
+    rect = Rectangle(268, 204, 264, 200)
+    colour = day_cell_pixels(rect)
+    img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+    def workload():
+        packed = it8951.pack_pixels_into(img_info, rect, colour)
+        tcon.write_packed_pixels(img_info, rect, bytearray(packed))
+        tcon.display_area(rect, DisplayMode.GL16)
+    return harness.measure(sim, workload)
+
+def week_redraw(pipelined: bool):
+    """
+    Redraws the seven day cells of a calendar week, one after the other or
+    through an UpdateQueue
+    """
+    sim = SimulatedIT8951(PANEL_WIDTH, PANEL_HEIGHT)
+    tcon = harness.make_tcon(sim)
+    queue = UpdateQueue(tcon)
+    img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+    cells = [Rectangle(4 + 264*i, 204, 264, 200) for i in range(7)]
+    packed = [bytearray(it8951.pack_pixels_into(img_info, rect, day_cell_pixels(rect))) for rect in cells]
+    def workload():
+        for rect, data in zip(cells, packed):
+            if pipelined:
+                queue.submit(img_info, rect, data, DisplayMode.GL16)
+            else:
+                tcon.write_packed_pixels(img_info, rect, data)
+                tcon.display_area(rect, DisplayMode.GL16)
+        if pipelined:
+            queue.wait_idle()
+        else:
+            tcon._wait_for_display_ready()
+    return harness.measure(sim, workload)
+
+WORKLOADS = {
+    "boot":            boot,
+    "warm_boot":       warm_boot,
+    "full_frame_bmp":  full_frame_bmp,
+    "fill_rect_x100":  fill_rect_x100,
+    "day_cell_redraw": day_cell_redraw,
+    "week_redraw":     lambda: week_redraw(False),
+    "week_redraw_pipelined": lambda: week_redraw(True),
+    "background_asset":     lambda: background_asset(Compression.NONE),
+    "background_asset_rle": lambda: background_asset(Compression.RLE),
+    "throttled_bmp":           lambda: throttled_bmp(False),
+    "throttled_bmp_pipelined": lambda: throttled_bmp(True),
+    "event_titles_packed":     lambda: event_titles(False),
+    "event_titles_glyphs":     lambda: event_titles(True),
+    "month_resync":            month_resync,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the driver workloads against the simulator")
+    parser.add_argument("--only", nargs="*", choices=list(WORKLOADS), help="Workloads to run")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Compare against a previous --json file")
+    args = parser.parse_args()
+
+    report = harness.run(WORKLOADS, args.only)
+    harness.print_table(report)
+    if args.json:
+        harness.save(report, args.json)
+    if args.compare:
+        print()
+        harness.compare(harness.load(args.compare), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Compares the single-pass pack_pixels_into kernel against the original
+# list-based 4bpp pack_pixels on a full 1872x1404 frame.
+# Run from the firmware directory with: python benchmarks/bench_pack_pixels.py
+import sys
+import os
+import time
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+
+PANEL_WIDTH  = 1872
+PANEL_HEIGHT = 1404
+
+def legacy_pack_pixels(img_info: ImageInfo, rect: Rectangle, colour: list) -> list:
+    # Verbatim copy of the original implementation (4bpp little endian only)
+    words = []
+    if img_info.bpp == ColorDepth.BPP_4BIT and img_info.endianness == Endianness.LITTLE:
+        start_mod = rect.x % 4
+        end_mod   = (rect.x + rect.width) % 4
+
+        start_padding = start_mod if start_mod != 0 else 0
+        end_padding   = 4 - end_mod if end_mod != 0 else 0
+
+        for row in range(rect.height-1, -1, -1):
+            idx = (row+1)*rect.width
+            colour[idx:idx] = [0]*end_padding
+            idx = row*rect.width
+            colour[idx:idx] = [0]*start_padding
+
+    for i in range(0, len(colour), 4):
+        words.append(colour[i] | (colour[i+1] << 4) | (colour[i+2] << 8) | (colour[i+3] << 12))
+    return words
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+def timed(fn) -> tuple:
+    """
+    Returns the wall time of fn and its peak heap usage in bytes (CPython only)
+    """
+    t = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t
+    peak = 0
+    if tracemalloc:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+    pixels = bytearray(i & 0xF for i in range(PANEL_WIDTH*PANEL_HEIGHT))
+    # An unaligned area forces the legacy implementation to insert padding
+    cases = [
+        ("aligned",   Rectangle(0, 0, PANEL_WIDTH,   PANEL_HEIGHT)),
+        ("unaligned", Rectangle(1, 0, PANEL_WIDTH-4, PANEL_HEIGHT)),
+    ]
+    print(f"{'case':<10} {'impl':<18} {'seconds':>8} {'Mpix/s':>7} {'peak KiB':>9}")
+    for name, rect in cases:
+        colour = pixels[:rect.area()]
+        out = bytearray(it8951.packed_size(img_info.bpp, rect))
+
+        # The legacy implementation pads its input in place, so give it a
+        # fresh list on every run
+        t_legacy = timed(lambda: legacy_pack_pixels(img_info, rect, list(colour)))
+        t_list   = timed(lambda: it8951.pack_pixels(img_info, rect, colour))
+        t_into   = timed(lambda: it8951.pack_pixels_into(img_info, rect, colour, out))
+        for impl, (t, peak) in (("legacy", t_legacy), ("pack_pixels", t_list), ("pack_pixels_into", t_into)):
+            print(f"{name:<10} {impl:<18} {t:8.3f} {rect.area()/t/1e6:7.2f} {peak/1024:9.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Throughput of the pixconv kernels on a full 1872x1404 frame of 8 bit grey
+# pixels, in megapixels per second. Runs on the host or on the device, where
+# pixconv picks the viper kernels:
+#   python benchmarks/bench_pixconv.py
+#   mpremote run benchmarks/bench_pixconv.py   (with pixconv on the board)
+import sys
+import os
+import time
+# Ensure that the parent directory is visible from this module
+try:
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    sys.path.insert(0, project_root)
+except AttributeError:
+    # MicroPython's os has no path module, the board imports from its root
+    pass
+from it8951 import ColorDepth, Rectangle, it8951
+import pixconv
+from pixconv import Quantiser, OrderedDither, ErrorDiffusion
+
+PANEL_WIDTH  = 1872
+PANEL_HEIGHT = 1404
+
+def _now() -> float:
+    if hasattr(time, "perf_counter"):
+        return time.perf_counter()
+    return time.ticks_us() / 1e6
+
+def main(height: int = PANEL_HEIGHT):
+    # Conversion runs a row at a time, so a single gradient row stands in
+    # for every row of the frame without holding 2.6MB of source pixels
+    src = bytearray(x*255 // (PANEL_WIDTH - 1) for x in range(PANEL_WIDTH))
+    out = bytearray(PANEL_WIDTH // 2)
+    kernels = (("quantise", lambda bpp: Quantiser(bpp)),
+               ("ordered",  lambda bpp: OrderedDither(bpp)),
+               ("diffusion", lambda bpp: ErrorDiffusion(bpp, PANEL_WIDTH)))
+    print("kernels:", "viper" if pixconv.NATIVE else "python")
+    print(f"{'kernel':<10} {'bpp':>3} {'seconds':>8} {'MP/s':>7}")
+    for name, make in kernels:
+        for bpp in (ColorDepth.BPP_1BIT, ColorDepth.BPP_2BIT, ColorDepth.BPP_4BIT):
+            quantiser = make(bpp)
+            t = _now()
+            for y in range(height):
+                quantiser.row(src, out, 0, y)
+            elapsed = _now() - t
+            bits = 8 // ColorDepth.pixel_per_byte(bpp)
+            print(f"{name:<10} {bits:>3} {elapsed:8.3f} {PANEL_WIDTH*height/elapsed/1e6:7.2f}")
+
+if __name__ == "__main__":
+    main()
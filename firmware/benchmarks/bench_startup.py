@@ -0,0 +1,128 @@
+# Start-up cost of the driver, paid on every wake from deep sleep:
+# - per module: source size, the time to compile the source (what MicroPython
+#   does for every .py import, and what a .mpy skips), the time to execute
+#   the compiled module and the time of a real import
+# - on the host: wake to first command, i.e. importing the driver, a warm
+#   start from the saved controller state and the first fill_rect, against
+#   the simulator
+# Run from the firmware directory, or on the board with the modules (.py or
+# .mpy) in its root:
+#   python benchmarks/bench_startup.py
+#   mpremote run benchmarks/bench_startup.py
+import sys
+import os
+import gc
+import time
+# Ensure that the parent directory is visible from this module
+try:
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    sys.path.insert(0, project_root)
+except AttributeError:
+    # MicroPython's os has no path module, the board imports from its root
+    project_root = ""
+
+# Modules imported on every wake
+MODULES = ("it8951", "controller_state")
+REPEAT = 20
+
+def _now() -> float:
+    if hasattr(time, "perf_counter"):
+        return time.perf_counter()
+    return time.ticks_us() / 1e6
+
+def _median(times: list) -> float:
+    times = sorted(times)
+    return times[len(times) // 2]
+
+def _forget(*names):
+    for name in names:
+        if name in sys.modules:
+            del sys.modules[name]
+    gc.collect()
+
+def _exec(name: str, code) -> float:
+    """
+    Executes a compiled module under a fresh name and returns the time taken
+    """
+    module = type(sys)(name)
+    _forget(name)
+    t = _now()
+    exec(code, module.__dict__)
+    return _now() - t
+
+def module_times(name: str) -> dict:
+    path = (project_root + "/" if project_root else "") + name + ".py"
+    result = {"source_bytes": 0, "compile_s": None, "exec_s": None}
+    try:
+        with open(path) as f:
+            source = f.read()
+    except OSError:
+        # Only the .mpy is on the board
+        source = None
+    if source is not None:
+        result["source_bytes"] = len(source)
+        try:
+            compiled = [None]
+            def compile_once():
+                t = _now()
+                compiled[0] = compile(source, path, "exec")
+                return _now() - t
+            result["compile_s"] = _median([compile_once() for _ in range(REPEAT)])
+            result["exec_s"] = _median([_exec(name, compiled[0]) for _ in range(REPEAT)])
+        except NameError:
+            # A port built without the compile() builtin
+            pass
+    imports = []
+    for _ in range(REPEAT):
+        _forget(name)
+        t = _now()
+        __import__(name)
+        imports.append(_now() - t)
+    result["import_s"] = _median(imports)
+    return result
+
+def wake_to_first_command() -> dict:
+    """
+    Host only: a warm start against the simulator, from a cold interpreter
+    state of the driver modules to the first refresh command
+    """
+    import tempfile
+    from host.it8951_sim import SimulatedIT8951
+    totals = []
+    inits = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "it8951.state")
+        sim = SimulatedIT8951(1872, 1404)
+        for i in range(REPEAT + 1):
+            # Asleep long enough for the previous refresh to finish
+            sim.advance(10)
+            _forget(*MODULES)
+            t = _now()
+            from it8951 import it8951, Rectangle, DisplayMode
+            from controller_state import FileStore
+            tcon = it8951(sim.spi, sim.ncs, sim.hrdy, None, state_store=FileStore(path))
+            tcon.fill_rect(Rectangle(0, 0, 64, 64), DisplayMode.DU, 0xF)
+            elapsed = _now() - t
+            # The first round is the cold start that saves the state
+            if i:
+                totals.append(elapsed)
+                inits.append(tcon.init_time_us / 1e6)
+    return {"wake_to_first_command_s": _median(totals), "warm_start_s": _median(inits)}
+
+def main():
+    print(f"{'module':<18} {'source B':>9} {'compile ms':>11} {'exec ms':>8} {'import ms':>10}")
+    for name in MODULES:
+        r = module_times(name)
+        ms = lambda s: "-" if s is None else f"{s*1e3:.3f}"
+        print(f"{name:<18} {r['source_bytes']:>9} {ms(r['compile_s']):>11} "
+              f"{ms(r['exec_s']):>8} {ms(r['import_s']):>10}")
+    if sys.platform != "esp32":
+        import io
+        import contextlib
+        with contextlib.redirect_stdout(io.StringIO()):
+            r = wake_to_first_command()
+        for key, value in r.items():
+            print(f"{key:<26} {value*1e3:8.3f} ms")
+
+if __name__ == "__main__":
+    main()
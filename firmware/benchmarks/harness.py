@@ -0,0 +1,122 @@
+# Shared measurement helpers for the driver benchmarks. Every workload runs
+# against the host simulator so that, next to the host's wall time, the
+# simulated device time and the SPI/HRDY/LUTAFSR traffic can be reported.
+# Results are plain JSON so that runs from two commits can be diffed with
+# compare().
+import sys
+import os
+import io
+import gc
+import json
+import time
+import contextlib
+# Ensure that the firmware directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from it8951 import it8951
+from host.it8951_sim import SimulatedIT8951
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Keys reported for every workload, in print order
+METRICS = ("wall_s", "sim_s", "spi_transactions", "spi_bytes", "hrdy_polls",
+           "lutafsr_polls", "retained_blocks", "alloc_peak_bytes")
+# Reported by the workloads that stream a file, next to METRICS
+EXTRA_METRICS = ("flash_bytes",)
+
+def make_tcon(sim: SimulatedIT8951, **kwargs) -> it8951:
+    """
+    Creates a driver bound to the simulator with its start-up sequence run
+    (unless initialise=False is passed) and its console output discarded
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        tcon = it8951(sim.spi, sim.ncs, sim.hrdy, None, **kwargs)
+    return tcon
+
+def measure(sim: SimulatedIT8951, fn) -> dict:
+    """
+    Runs fn once and returns its metrics.
+    retained_blocks is the net change in the interpreter's allocated heap
+    blocks (sys.getallocatedblocks) across fn, i.e. the blocks that fn left
+    allocated, not the number of allocations it made: neither CPython nor
+    MicroPython counts those. alloc_peak_bytes is the highest heap usage
+    while fn ran, from tracemalloc where available.
+    """
+    gc.collect()
+    sim.reset_stats()
+    sim_t0 = sim.now
+    if tracemalloc:
+        tracemalloc.start()
+    blocks = sys.getallocatedblocks() if hasattr(sys, "getallocatedblocks") else 0
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    wall = time.perf_counter() - t0
+    blocks = (sys.getallocatedblocks() - blocks) if hasattr(sys, "getallocatedblocks") else 0
+    peak = 0
+    if tracemalloc:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    stats = sim.stats
+    return {
+        "wall_s":           round(wall, 6),
+        "sim_s":            round(sim.now - sim_t0, 6),
+        "spi_transactions": stats["transactions"],
+        "spi_bytes":        stats["bytes_tx"],
+        "hrdy_polls":       stats["hrdy_polls"],
+        "lutafsr_polls":    stats["lutafsr_reads"],
+        "retained_blocks":  blocks,
+        "alloc_peak_bytes": peak,
+    }
+
+def run(workloads: dict, only: list = None) -> dict:
+    """
+    Runs every workload, name -> callable returning a metrics dict
+    """
+    results = {}
+    for name, workload in workloads.items():
+        if only and name not in only:
+            continue
+        results[name] = workload()
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "implementation": sys.implementation.name,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+def print_table(report: dict):
+    results = report["results"]
+    print(f"{'workload':<20}" + "".join(f"{m:>18}" for m in METRICS + EXTRA_METRICS))
+    for name, metrics in results.items():
+        print(f"{name:<20}" + "".join(f"{metrics.get(m, ''):>18}" for m in METRICS + EXTRA_METRICS))
+
+def compare(old: dict, new: dict):
+    """
+    Prints the relative change of every metric between two reports
+    """
+    print(f"{'workload':<20} {'metric':<18} {'old':>14} {'new':>14} {'change':>8}")
+    for name, metrics in new["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            continue
+        for m in METRICS + EXTRA_METRICS:
+            a, b = before.get(m), metrics.get(m)
+            if a is None or b is None:
+                continue
+            change = f"{(b - a)/a*100:+.1f}%" if a else ("n/a" if b else "0%")
+            print(f"{name:<20} {m:<18} {a:>14} {b:>14} {change:>8}")
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def save(report: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
@@ -0,0 +1,83 @@
+import struct
+from it8951 import DeviceInfo
+
+class ControllerState:
+    """
+    Snapshot of the IT8951 configuration that the driver sets up at start-up.
+    It is kept across deep sleep so that a warm start can skip the device
+    info, image buffer address and VCOM round trips.
+    """
+    _MAGIC   = b'IT89'
+    _VERSION = 1
+    # magic, version, width, height, image buffer address, firmware version,
+    # LUT version, VCOM in mV, I80CPCR, checksum
+    _FORMAT  = '<4sBHHI16s16shHH'
+    Size     = struct.calcsize(_FORMAT)
+
+    def __init__(self, device_info: DeviceInfo, vcom_mV: int, i80cpcr: int):
+        self.device_info = device_info
+        self.vcom_mV     = vcom_mV
+        self.i80cpcr     = i80cpcr
+
+    @staticmethod
+    def _checksum(data: bytes) -> int:
+        return sum(data) & 0xFFFF
+
+    def to_bytes(self) -> bytes:
+        info = self.device_info
+        body = struct.pack(self._FORMAT[:-1], self._MAGIC, self._VERSION,
+                           info.panel_width, info.panel_height, info.img_buff_addr,
+                           info.firmware_version.encode(), info.lut_version.encode(),
+                           self.vcom_mV, self.i80cpcr)
+        return body + struct.pack('<H', self._checksum(body))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'ControllerState':
+        """
+        Returns None if data isn't a valid record of the current version
+        """
+        if data is None or len(data) < cls.Size:
+            return None
+        data = bytes(data[:cls.Size])
+        magic, version, width, height, addr, fw, lut, vcom_mV, i80cpcr, checksum = \
+            struct.unpack(cls._FORMAT, data)
+        if magic != cls._MAGIC or version != cls._VERSION or \
+           checksum != cls._checksum(data[:-2]):
+            return None
+        info = DeviceInfo(width, height, addr, fw.decode(), lut.decode())
+        return cls(info, vcom_mV, i80cpcr)
+
+class RtcStore:
+    """
+    Keeps the state in the ESP32's RTC memory, which survives deep sleep but
+    not a power cycle
+    """
+    def __init__(self, rtc = None):
+        if rtc is None:
+            from machine import RTC
+            rtc = RTC()
+        self._rtc = rtc
+
+    def load(self) -> bytes:
+        return self._rtc.memory()
+
+    def save(self, data: bytes):
+        self._rtc.memory(data)
+
+class FileStore:
+    """
+    Keeps the state in a small file on the flash file system
+    """
+    def __init__(self, path: str = '/it8951.state'):
+        self._path = path
+
+    def load(self) -> bytes:
+        try:
+            with open(self._path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def save(self, data: bytes):
+        with open(self._path, 'wb') as f:
+            f.write(data)
@@ -0,0 +1,94 @@
+from it8951 import *
+from update_queue import UpdateQueue
+
+class DoubleBuffer:
+    """
+    Page flipping between two image buffers in the IT8951's SDRAM. Pixels are
+    uploaded to the back buffer while the front one is shown, and flip()
+    refreshes the drawn areas from the back buffer with DPY_BUF_AREA and then
+    swaps the two. Uploads therefore never overwrite an image that a running
+    refresh is still reading.
+
+    The back buffer lags behind the front one in the areas that were drawn
+    before the last flip, and initially everywhere. stale_areas() lists them;
+    partial updates must redraw them (e.g. with resync()) before the next
+    flip, whereas full frames simply overwrite them.
+
+    Uploads leave LISAR pointing at the back buffer. Plain it8951 uploads
+    that follow need set_img_buff_base_address(device_info.img_buff_addr).
+    """
+    def __init__(self, tcon: it8951, back_address: int = None, queue: UpdateQueue = None):
+        """
+        Args:
+            tcon: Initialised IT8951 driver
+            back_address: [Optional] SDRAM address of the second buffer.
+                          Defaults to right after the IT8951's own 8bpp one.
+            queue: [Optional] UpdateQueue that tracks the running refreshes.
+                   A private one is created by default.
+        """
+        self._tcon = tcon
+        self.queue = queue if queue is not None else UpdateQueue(tcon)
+        info = tcon.device_info
+        self.front = info.img_buff_addr
+        self.back = back_address if back_address is not None else \
+                    self.front + info.panel_width*info.panel_height
+        if self.back & 0x3FF_FFFF != self.back:
+            raise ValueError("Base address must be maximum 26 bits")
+        # Areas uploaded to the back buffer since the last flip
+        self._drawn = []
+        # Areas in which the back buffer lags behind the front one
+        self._stale = [tcon.panel_area]
+
+    def stale_areas(self) -> list:
+        return list(self._stale)
+
+    def write_packed_pixels(self, img_info: ImageInfo, rect: Rectangle, data, stride: int = None):
+        """
+        Uploads packed pixels (see it8951.write_packed_pixels) to the back
+        buffer. The area is refreshed by the next flip().
+        """
+        self.queue.upload(img_info, rect, data, self.back, stride)
+        self._drawn.append(rect)
+
+    def resync(self, img_info: ImageInfo, rect: Rectangle, data, stride: int = None):
+        """
+        Uploads the current content of a stale area to the back buffer. The
+        area isn't refreshed by the next flip() unless it is also drawn.
+        """
+        self.queue.upload(img_info, rect, data, self.back, stride)
+        self._stale = [area for area in self._stale if not area.is_contained_within(rect)]
+
+    def load_bmp(self, x: int, y: int, img: str, chunk_size: int = 4096) -> Rectangle:
+        """
+        Loads a BMP (see it8951.load_bmp) to the back buffer
+        """
+        # The image's size is only known once it's open
+        self.queue.wait_buffer(self.back)
+        self._tcon.set_img_buff_base_address(self.back)
+        rect = self._tcon.load_bmp(x, y, img, chunk_size)
+        self._drawn.append(rect)
+        return rect
+
+    def display(self, rect: Rectangle, mode: DisplayMode):
+        """
+        Refreshes an area from the back buffer without flipping
+        """
+        self.queue.display(rect, mode, self.back)
+
+    def swap(self):
+        """
+        Makes the back buffer the front one. The new back buffer lags behind
+        in everything that was drawn since the last swap.
+        """
+        self.front, self.back = self.back, self.front
+        self._stale = self._drawn
+        self._drawn = []
+
+    def flip(self, mode: DisplayMode, areas: list = None):
+        """
+        Refreshes the areas (default: every area drawn since the last flip)
+        from the back buffer and swaps the buffers
+        """
+        for rect in (self._drawn if areas is None else areas):
+            self.display(rect, mode)
+        self.swap()
@@ -0,0 +1,211 @@
+import struct
+from it8951 import ColorDepth, Endianness, ImageInfo, Rectangle, RotateMode, it8951
+
+class GlyphAtlas:
+    """
+    A font at one size, rasterised and packed on the host by
+    host/font_convert.py. Every glyph is a cell of the font's line height and
+    of its advance width, rounded up to whole bytes. The cells are packed with
+    the IT8951's big endian packing, where the bytes of a row follow the
+    pixels from left to right, so that lines of text are composed by copying
+    glyph rows into the upload buffer.
+
+    The header is followed by an index of (codepoint u32, offset u32, width
+    u16) entries sorted by codepoint, with offsets relative to the end of the
+    index, and the packed rows of every glyph. The index stays in RAM, the
+    glyphs are read from the file when GlyphCache misses them.
+    """
+    _MAGIC   = b'IT8G'
+    _VERSION = 1
+    # magic, version, colour depth, font size, line height, baseline, number
+    # of glyphs, font name
+    _FORMAT  = '<4sBBHHHH16s'
+    Size     = struct.calcsize(_FORMAT)
+    _ENTRY   = '<IIH'
+    EntrySize = struct.calcsize(_ENTRY)
+    # Drawn in place of the codepoints that the atlas doesn't hold
+    FALLBACK = ord('?')
+
+    def __init__(self, atlas):
+        """
+        Args:
+            atlas: Path to the atlas file, or a file object opened in binary
+                   mode. The file stays open until close().
+        """
+        self._f = open(atlas, 'rb') if isinstance(atlas, str) else atlas
+        magic, version, bpp, size, height, baseline, nglyphs, name = \
+            struct.unpack(self._FORMAT, self._f.read(self.Size))
+        if magic != self._MAGIC or version != self._VERSION:
+            raise ValueError("Not a glyph atlas of the current version")
+        if bpp not in (ColorDepth.BPP_1BIT, ColorDepth.BPP_2BIT, ColorDepth.BPP_4BIT,
+                       ColorDepth.BPP_8BIT):
+            raise ValueError("Unsupported glyph colour depth")
+        self.bpp      = bpp
+        self.size     = size
+        self.height   = height
+        self.baseline = baseline
+        self.font     = name.rstrip(b'\0').decode()
+        self._nglyphs = nglyphs
+        self._index   = self._f.read(nglyphs*self.EntrySize)
+        if len(self._index) != nglyphs*self.EntrySize:
+            raise ValueError("Glyph atlas index is truncated")
+        self._data_offset = self.Size + len(self._index)
+
+    def close(self):
+        self._f.close()
+
+    def img_info(self) -> ImageInfo:
+        return ImageInfo(Endianness.BIG, self.bpp, RotateMode.ROTATE_0)
+
+    def background(self) -> int:
+        """
+        Byte of packed background pixels: white, or 0 at 1bpp (the background
+        colour of display_1bpp)
+        """
+        return 0x00 if self.bpp == ColorDepth.BPP_1BIT else 0xFF
+
+    def _find(self, codepoint: int) -> int:
+        """
+        Binary search of the index. Returns the entry number or -1.
+        """
+        lo, hi = 0, self._nglyphs
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cp = struct.unpack_from('<I', self._index, mid*self.EntrySize)[0]
+            if cp == codepoint:
+                return mid
+            if cp < codepoint:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+
+    def _entry(self, codepoint: int) -> tuple:
+        n = self._find(codepoint)
+        if n < 0:
+            n = self._find(self.FALLBACK)
+            if n < 0:
+                raise ValueError("Glyph missing from the atlas")
+        return struct.unpack_from(self._ENTRY, self._index, n*self.EntrySize)
+
+    def width(self, codepoint: int) -> int:
+        """
+        Advance of a glyph in pixels
+        """
+        return self._entry(codepoint)[2]
+
+    def read_glyph(self, codepoint: int) -> tuple:
+        """
+        Reads a glyph's packed rows from the file
+        Returns:
+            (width in pixels, packed rows)
+        """
+        _, offset, width = self._entry(codepoint)
+        size = self.height*width // ColorDepth.pixel_per_byte(self.bpp)
+        self._f.seek(self._data_offset + offset)
+        data = self._f.read(size)
+        if len(data) != size:
+            raise ValueError("Glyph atlas is truncated")
+        return width, data
+
+class GlyphCache:
+    """
+    Least recently used glyphs of any number of atlases, keyed by (font,
+    size, colour depth, codepoint)
+    """
+    def __init__(self, capacity: int = 128):
+        """
+        Args:
+            capacity: [Optional] Number of glyphs kept
+        """
+        if capacity <= 0:
+            raise ValueError("The capacity must be positive")
+        self.capacity = capacity
+        # key -> [last use, width, packed rows]
+        self._glyphs = {}
+        self._tick = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._glyphs)
+
+    def get(self, atlas: GlyphAtlas, codepoint: int) -> tuple:
+        """
+        Returns:
+            (width in pixels, packed rows) of the glyph
+        """
+        self._tick += 1
+        key = (atlas.font, atlas.size, atlas.bpp, codepoint)
+        entry = self._glyphs.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            entry[0] = self._tick
+            return entry[1], entry[2]
+        self.stats["misses"] += 1
+        if len(self._glyphs) >= self.capacity:
+            # Only scanned on misses of a full cache
+            oldest = None
+            for k, e in self._glyphs.items():
+                if oldest is None or e[0] < self._glyphs[oldest][0]:
+                    oldest = k
+            del self._glyphs[oldest]
+            self.stats["evictions"] += 1
+        width, data = atlas.read_glyph(codepoint)
+        self._glyphs[key] = [self._tick, width, data]
+        return width, data
+
+def text_width(atlas: GlyphAtlas, text: str) -> int:
+    """
+    Width of a line of text in pixels
+    """
+    return sum(atlas.width(ord(c)) for c in text)
+
+def render_line(atlas: GlyphAtlas, text: str, x: int, cache: GlyphCache = None,
+                out = None) -> tuple:
+    """
+    Composes a line of text into packed rows for write_packed_pixels, by
+    copying the rows of every glyph next to each other on a background fill
+    Args:
+        atlas: Font to render with
+        text: Line of text
+        x: Panel x that the line is loaded to. It must fall on a byte of the
+           packed rows, i.e. be a multiple of the pixels per byte.
+        cache: [Optional] GlyphCache, read from the atlas without one
+        out: [Optional] Preallocated buffer of at least the packed size
+    Returns:
+        (ImageInfo, width in pixels, packed rows)
+    """
+    ppb = ColorDepth.pixel_per_byte(atlas.bpp)
+    if x % ppb:
+        raise ValueError("Text must start on a whole byte of pixels")
+    glyphs = [cache.get(atlas, ord(c)) if cache is not None else atlas.read_glyph(ord(c))
+              for c in text]
+    width = sum(g[0] for g in glyphs)
+    height = atlas.height
+    row_bytes = it8951.packed_size(atlas.bpp, Rectangle(x, 0, width, 1))
+    size = row_bytes*height
+    if out is None:
+        out = bytearray(size)
+    elif len(out) < size:
+        raise ValueError("Output buffer is too small")
+    mv = memoryview(out)
+    # The glyph cells cover the whole line. Only the bytes that pad it to
+    # whole words, which the IT8951 doesn't load, are filled with background
+    # instead.
+    lead = (x % ColorDepth.pixel_per_word(atlas.bpp)) // ppb
+    bg = atlas.background()
+    for row in range(height):
+        o = row*row_bytes
+        for i in range(o, o + lead):
+            mv[i] = bg
+        for i in range(o + lead + width // ppb, o + row_bytes):
+            mv[i] = bg
+    pen = lead
+    for w, data in glyphs:
+        nbytes = w // ppb
+        src = memoryview(data)
+        for row in range(height):
+            o = row*row_bytes + pen
+            mv[o:o + nbytes] = src[row*nbytes:(row + 1)*nbytes]
+        pen += nbytes
+    return atlas.img_info(), width, mv[:size]
@@ -0,0 +1,115 @@
+# Host-side converter from PNG/BMP images to panel assets (see
+# panel_asset.py). Quantising, packing and aligning the pixels for
+# LD_IMG_AREA happens here, vectorised with NumPy, so that the device only
+# streams the file to the IT8951:
+#
+#   python host/asset_convert.py weather.png weather.ita --bpp 4 --tile 64x64
+#   python host/asset_convert.py background.png background.ita --rle
+#
+# Needs NumPy and Pillow, which the firmware itself never imports.
+import sys
+import os
+import argparse
+import numpy as np
+from PIL import Image
+# Ensure that the firmware directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from it8951 import ColorDepth, Endianness
+from panel_asset import AssetHeader, Compression, rle_encode
+
+def load_grey(path: str) -> np.ndarray:
+    """
+    Reads an image as 8 bit grey levels (0: black). Transparent pixels are
+    composited onto white, the panel's background.
+    """
+    with Image.open(path) as img:
+        if 'A' in img.getbands():
+            white = Image.new('RGBA', img.size, (255, 255, 255, 255))
+            img = Image.alpha_composite(white, img.convert('RGBA'))
+        return np.asarray(img.convert('L'))
+
+def quantise(grey: np.ndarray, bpp: int) -> np.ndarray:
+    """
+    Maps 8 bit grey levels to the pixel values of a colour depth. At 1bpp,
+    1 marks the dark pixels, i.e. display_1bpp's default foreground.
+    """
+    if bpp == 1:
+        return (grey < 128).astype(np.uint8)
+    levels = (1 << bpp) - 1
+    return ((grey.astype(np.uint32)*levels + 127) // 255).astype(np.uint8)
+
+def pack(values: np.ndarray, bpp: ColorDepth, endianness: Endianness, x_phase: int = 0) -> bytes:
+    """
+    Vectorised equivalent of it8951.pack_pixels_into for a 2D array of pixel
+    values whose area starts at an x with x % pixel_per_word(bpp) == x_phase
+    """
+    ppw   = ColorDepth.pixel_per_word(bpp)
+    slot  = 16 // ppw
+    shift = 1 if bpp == ColorDepth.BPP_3BIT else 0
+    height, width = values.shape
+    row_words = (x_phase + width + ppw - 1) // ppw
+    # Rows are padded with 0 pixels to whole words on both sides
+    padded = np.zeros((height, row_words*ppw), dtype=np.uint16)
+    padded[:, x_phase:x_phase + width] = values & ((1 << (slot - shift)) - 1)
+    shifts = np.arange(ppw, dtype=np.uint16)*slot + shift
+    words = np.bitwise_or.reduce(padded.reshape(height, row_words, ppw) << shifts, axis=2)
+    # Words go on the wire MSB first. Big endian swaps the 2 bytes
+    return words.astype('<u2' if endianness == Endianness.BIG else '>u2').tobytes()
+
+def convert(grey: np.ndarray, bpp: int = 4, endianness: Endianness = Endianness.LITTLE,
+            x_phase: int = 0, tile: tuple = None, compression: int = Compression.NONE) -> bytes:
+    """
+    Builds a panel asset from 8 bit grey levels
+    Args:
+        grey: 2D array of grey levels, e.g. from load_grey
+        bpp: [Optional] Bits per pixel: 1, 2, 4 or 8
+        endianness: [Optional] Packing of the pixel data
+        x_phase: [Optional] x % pixels per word of the positions that the
+                 asset will be loaded to
+        tile: [Optional] (width, height) of the tiles to index separately
+        compression: [Optional] Coding of every tile's packed rows
+    Returns:
+        The asset file's content
+    """
+    depth = ColorDepth.bpp_to_code(bpp)
+    if depth is None or depth == ColorDepth.BPP_3BIT:
+        raise ValueError(f"Unsupported colour depth: {bpp}bpp")
+    values = quantise(grey, bpp)
+    height, width = values.shape
+    tile_width, tile_height = tile if tile is not None else (width, height)
+    header = AssetHeader(depth, endianness, width, height, tile_width, tile_height, x_phase,
+                         compression)
+    tiles = [pack(values[ty:ty + tile_height, tx:tx + tile_width], depth, endianness, x_phase)
+             for ty in range(0, height, tile_height)
+             for tx in range(0, width, tile_width)]
+    if compression == Compression.RLE:
+        tiles = [rle_encode(t) for t in tiles]
+    return header.to_bytes() + AssetHeader.pack_index([len(t) for t in tiles]) + b''.join(tiles)
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Converts an image to a panel asset")
+    parser.add_argument("input", help="PNG or BMP image")
+    parser.add_argument("output", help="Panel asset to write")
+    parser.add_argument("--bpp", type=int, choices=(1, 2, 4, 8), default=4)
+    parser.add_argument("--endianness", choices=("little", "big"), default="little")
+    parser.add_argument("--x-phase", type=int, default=0,
+                        help="x %% pixels per word of the load positions")
+    parser.add_argument("--tile", default=None, help="Tile grid as WxH, e.g. 64x64")
+    parser.add_argument("--rle", action="store_true",
+                        help="Run-length code the tiles, for mostly flat images")
+    args = parser.parse_args(argv)
+
+    tile = None
+    if args.tile:
+        tile = tuple(int(v) for v in args.tile.lower().split('x'))
+    endianness = Endianness.BIG if args.endianness == "big" else Endianness.LITTLE
+    compression = Compression.RLE if args.rle else Compression.NONE
+    data = convert(load_grey(args.input), args.bpp, endianness, args.x_phase, tile, compression)
+    with open(args.output, 'wb') as f:
+        f.write(data)
+    print(f"{args.output}: {len(data)} bytes")
+
+if __name__ == '__main__':
+    main()
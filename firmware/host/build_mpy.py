@@ -0,0 +1,99 @@
+# Host-side build of the firmware into precompiled .mpy modules, so that the
+# board loads bytecode on every wake from deep sleep instead of compiling the
+# modules' source:
+#
+#   python host/build_mpy.py build
+#   mpremote cp -r build/. :
+#
+# main.py and boot.py are copied as source, as MicroPython only runs them
+# from .py files, so they should stay thin and import the rest. The mpy-cross
+# version must match the board's MicroPython version. Needs mpy-cross, either
+# on PATH or from pip (pip install mpy-cross).
+import sys
+import os
+import shutil
+import argparse
+import subprocess
+# Ensure that the firmware directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Run by MicroPython as source only
+SOURCE_ONLY = ("main.py", "boot.py")
+
+def modules(root: str = project_root) -> list:
+    """
+    Firmware modules to compile: the .py files of the firmware directory,
+    without the host tools, tests and benchmarks in its subdirectories
+    """
+    return sorted(name for name in os.listdir(root)
+                  if name.endswith(".py") and name not in SOURCE_ONLY)
+
+def find_mpy_cross() -> list:
+    """
+    Returns the command that runs mpy-cross, or None
+    """
+    path = shutil.which("mpy-cross")
+    if path is not None:
+        return [path]
+    try:
+        import mpy_cross
+    except ImportError:
+        return None
+    return [sys.executable, "-m", "mpy_cross"]
+
+def command(mpy_cross: list, src: str, dst: str, march: str = "xtensawin",
+            opt: int = 1) -> list:
+    """
+    mpy-cross command line that compiles src to dst
+    Args:
+        mpy_cross: Command that runs mpy-cross, see find_mpy_cross
+        src: Module source file
+        dst: .mpy file to write
+        march: [Optional] Native code architecture of the viper kernels.
+               xtensawin is the ESP32-S3's.
+        opt: [Optional] Optimisation level. 1 and above drop the asserts
+             and __debug__ blocks.
+    """
+    return mpy_cross + ["-march=" + march, "-O%d" % opt, "-s", os.path.basename(src),
+                        "-o", dst, src]
+
+def build(out_dir: str, root: str = project_root, march: str = "xtensawin",
+          opt: int = 1, mpy_cross: list = None) -> list:
+    """
+    Compiles every firmware module into out_dir and copies the SOURCE_ONLY
+    files next to them
+    Returns:
+        The files written
+    """
+    if mpy_cross is None:
+        mpy_cross = find_mpy_cross()
+    if mpy_cross is None:
+        raise RuntimeError("mpy-cross not found. Install it with: pip install mpy-cross")
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for name in modules(root):
+        dst = os.path.join(out_dir, name[:-3] + ".mpy")
+        subprocess.run(command(mpy_cross, os.path.join(root, name), dst, march, opt),
+                       check=True)
+        written.append(dst)
+    for name in SOURCE_ONLY:
+        src = os.path.join(root, name)
+        if os.path.exists(src):
+            shutil.copy(src, out_dir)
+            written.append(os.path.join(out_dir, name))
+    return written
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Compiles the firmware to .mpy files")
+    parser.add_argument("output", help="Directory to write the .mpy files to")
+    parser.add_argument("--march", default="xtensawin",
+                        help="Native code architecture, xtensawin for the ESP32-S3")
+    parser.add_argument("-O", dest="opt", type=int, default=1, help="Optimisation level")
+    args = parser.parse_args(argv)
+
+    written = build(args.output, march=args.march, opt=args.opt)
+    size = sum(os.path.getsize(path) for path in written)
+    print(f"{args.output}: {len(written)} files, {size} bytes")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# Host-side converter from TrueType/OpenType fonts to glyph atlases (see
+# glyph_atlas.py). Every glyph is rasterised with Pillow, quantised and packed
+# here so that the device only copies glyph rows:
+#
+#   python host/font_convert.py Inter.ttf 28 inter28.itg --bpp 4
+#   python host/font_convert.py Inter.ttf 64 digits64.itg --bpp 1 --chars 0123456789:
+#
+# Needs NumPy and Pillow, which the firmware itself never imports.
+import sys
+import os
+import struct
+import argparse
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+# Ensure that the firmware directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from it8951 import ColorDepth, Endianness
+from glyph_atlas import GlyphAtlas
+from host.asset_convert import quantise, pack
+
+# Printable ASCII
+DEFAULT_CHARS = ''.join(chr(c) for c in range(0x20, 0x7F))
+
+def rasterise(font: ImageFont.FreeTypeFont, char: str, height: int, baseline: int,
+              ppb: int) -> np.ndarray:
+    """
+    Draws a glyph into a cell of its advance width, rounded up to whole
+    bytes of pixels, as 8 bit grey levels on white
+    """
+    width = max(1, int(round(font.getlength(char))))
+    width = (width + ppb - 1) // ppb * ppb
+    img = Image.new('L', (width, height), 255)
+    ImageDraw.Draw(img).text((0, baseline), char, font=font, fill=0, anchor='ls')
+    return np.asarray(img)
+
+def convert(font: ImageFont.FreeTypeFont, name: str, size: int, bpp: int = 4,
+            chars: str = DEFAULT_CHARS) -> bytes:
+    """
+    Builds a glyph atlas
+    Args:
+        font: Font loaded at size pixels
+        name: Name of the font in the atlas, up to 16 bytes. Together with
+              size it keys the glyphs in a GlyphCache.
+        size: Font size in pixels
+        bpp: [Optional] Bits per pixel: 1, 2, 4 or 8
+        chars: [Optional] Characters to include. '?' is always included, as
+               the replacement of the missing ones.
+    Returns:
+        The atlas file's content
+    """
+    depth = ColorDepth.bpp_to_code(bpp)
+    if depth is None or depth == ColorDepth.BPP_3BIT:
+        raise ValueError(f"Unsupported colour depth: {bpp}bpp")
+    if len(name.encode()) > 16:
+        raise ValueError("The font name must fit in 16 bytes")
+    ppb = ColorDepth.pixel_per_byte(depth)
+    ascent, descent = font.getmetrics()
+    height = ascent + descent
+    index = []
+    glyphs = []
+    offset = 0
+    for cp in sorted(set(ord(c) for c in chars) | {GlyphAtlas.FALLBACK}):
+        values = quantise(rasterise(font, chr(cp), height, ascent, ppb), bpp)
+        row_bytes = values.shape[1] // ppb
+        # Big endian packing of whole words, trimmed back to the cell's bytes
+        rows = np.frombuffer(pack(values, depth, Endianness.BIG), dtype=np.uint8)
+        data = rows.reshape(height, -1)[:, :row_bytes].tobytes()
+        index.append(struct.pack(GlyphAtlas._ENTRY, cp, offset, values.shape[1]))
+        glyphs.append(data)
+        offset += len(data)
+    header = struct.pack(GlyphAtlas._FORMAT, GlyphAtlas._MAGIC, GlyphAtlas._VERSION, depth,
+                         size, height, ascent, len(index), name.encode())
+    return header + b''.join(index) + b''.join(glyphs)
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Converts a font to a glyph atlas")
+    parser.add_argument("font", help="TrueType or OpenType font file")
+    parser.add_argument("size", type=int, help="Font size in pixels")
+    parser.add_argument("output", help="Glyph atlas to write")
+    parser.add_argument("--bpp", type=int, choices=(1, 2, 4, 8), default=4)
+    parser.add_argument("--chars", default=DEFAULT_CHARS, help="Characters to include")
+    parser.add_argument("--name", default=None,
+                        help="Font name in the atlas. Defaults to the font file's name.")
+    args = parser.parse_args(argv)
+
+    name = args.name or os.path.splitext(os.path.basename(args.font))[0][:16]
+    font = ImageFont.truetype(args.font, args.size)
+    data = convert(font, name, args.size, args.bpp, args.chars)
+    with open(args.output, 'wb') as f:
+        f.write(data)
+    print(f"{args.output}: {len(data)} bytes")
+
+if __name__ == '__main__':
+    main()
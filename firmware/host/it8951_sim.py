@@ -0,0 +1,577 @@
+# Host-side simulation of the IT8951 timing controller. It plugs into the
+# driver in place of the machine.SPI and machine.Pin objects:
+#
+#   sim  = SimulatedIT8951()
+#   tcon = it8951(sim.spi, sim.ncs, sim.hrdy, None)
+#
+# The simulator decodes the preamble/command/data SPI protocol and keeps an
+# 8bpp image buffer per SDRAM address, like the real controller, and the
+# 4bpp pixels currently shown on the panel. Time is virtual: every SPI
+# transaction, HRDY poll and waveform advances a clock so that throughput can
+# be measured deterministically without the panel.
+import sys
+import os
+import time
+# Ensure that the firmware directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from it8951 import Command, ColorDepth, DisplayMode, Endianness, Register, SpiPreamble
+
+# Approximate waveform durations of the 10.3" panel in seconds
+WAVEFORM_TIMES = {
+    DisplayMode.INIT:  2.000,
+    DisplayMode.DU:    0.260,
+    DisplayMode.GC16:  0.450,
+    DisplayMode.GL16:  0.450,
+    DisplayMode.GLR16: 0.450,
+    DisplayMode.GLD16: 0.450,
+    DisplayMode.A2:    0.120,
+    DisplayMode.DU4:   0.290,
+}
+
+# Number of argument words each command waits for before it is executed.
+# Callables receive the arguments received so far.
+_ARG_COUNT = {
+    Command.SYS_RUN:         0,
+    Command.STANDBY:         0,
+    Command.SLEEP:           0,
+    Command.GET_DEV_INFO:    0,
+    Command.LD_IMG_END:      0,
+    Command.REG_RD:          1,
+    Command.REG_WR:          2,
+    Command.LD_IMG:          1,
+    Command.LD_IMG_AREA:     5,
+    Command.DPY_AREA:        5,
+    Command.DPY_BUF_AREA:    7,
+    Command.FILL_RECT:       6,
+    Command.POWER_SEQUENCE:  1,
+    Command.BPP_SETTINGS:    1,
+    Command.CMD_VCOM:        lambda args: 1 if args[0] == 0 else 2,
+    Command.CMD_TEMPERATURE: lambda args: 2 if args[0] == 1 else 1,
+}
+
+# 8bpp image buffer value -> 4bpp panel value
+_TO_PANEL = bytes(v >> 4 for v in range(256))
+# UP1SR+2 bit that switches the display commands to 1bpp bitmaps
+_BITMAP_MODE = 1 << 2
+
+class SimPin:
+    """
+    Stand-in for machine.Pin. Reads and writes are forwarded to the simulator.
+    """
+    def __init__(self, read=None, write=None):
+        self._read  = read
+        self._write = write
+        self._level = 1
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self._read() if self._read else self._level
+        self._level = value
+        if self._write:
+            self._write(value)
+
+class SimSPI:
+    """
+    Stand-in for machine.SPI. Every call is one SPI transaction.
+    """
+    def __init__(self, sim: 'SimulatedIT8951'):
+        self._sim = sim
+
+    def write(self, buf):
+        self._sim._transfer(buf, None)
+
+    def read(self, nbytes: int, write: int = 0x00) -> bytes:
+        rx = bytearray(nbytes)
+        self._sim._transfer(bytes([write])*nbytes, rx)
+        return bytes(rx)
+
+    def readinto(self, buf, write: int = 0x00):
+        self._sim._transfer(bytes([write])*len(buf), buf)
+
+    def write_readinto(self, write_buf, read_buf):
+        self._sim._transfer(write_buf, read_buf)
+
+class SimulatedIT8951:
+    def __init__(self, width: int = 1872, height: int = 1404,
+                 img_buff_addr: int = 0x001236E0, vcom_mV: int = -1580,
+                 firmware_version: str = "SWv_0.2.1.R1", lut_version: str = "M841_TFA5210",
+                 lut_engines: int = 16, spi_hz: int = 24_000_000,
+                 txn_overhead_s: float = 20e-6, hrdy_busy_s: float = 2e-6,
+                 hrdy_poll_s: float = 1e-6, waveform_times: dict = None,
+                 realtime: bool = False):
+        """
+        Args:
+            width, height, img_buff_addr, firmware_version, lut_version:
+                Reported by GET_DEV_INFO
+            vcom_mV: Initial VCOM value
+            lut_engines: Number of LUT engines, one LUTAFSR bit each
+            spi_hz: SPI clock used to account for the time on the wire
+            txn_overhead_s: Host-side cost of a single SPI transaction
+            hrdy_busy_s: Time HRDY stays low after each command or argument
+            hrdy_poll_s: Host-side cost of a single HRDY poll
+            waveform_times: DisplayMode -> refresh duration in seconds
+            realtime: True also advances the clock with the host's wall time,
+                      for code that sleeps instead of polling
+        """
+        self.width            = width
+        self.height           = height
+        self.img_buff_addr    = img_buff_addr
+        self.vcom_mV          = vcom_mV
+        self.firmware_version = firmware_version
+        self.lut_version      = lut_version
+        self.spi_hz           = spi_hz
+        self.txn_overhead_s   = txn_overhead_s
+        self.hrdy_busy_s      = hrdy_busy_s
+        self.hrdy_poll_s      = hrdy_poll_s
+        self.waveform_times   = dict(WAVEFORM_TIMES)
+        if waveform_times:
+            self.waveform_times.update(waveform_times)
+        self.realtime         = realtime
+
+        self.spi  = SimSPI(self)
+        self.ncs  = SimPin(write=self._set_ncs)
+        self.hrdy = SimPin(read=self._hrdy_value)
+
+        # Pixels shown on the panel, one 4bpp value per byte
+        self.panel = bytearray(width*height)
+        # 8bpp image buffers in SDRAM, keyed by their base address
+        self.memory = {}
+        self.registers = {}
+        self.power = "run"
+        self.powered = False
+        self.temperature_C = 25
+        self.forced_temperature_C = None
+        self.bpp2_white = False
+        # Busy-until time of every LUT engine
+        self.lut_busy_until = [0.0]*lut_engines
+        # (x, y, w, h, mode, base address, start, end) of every refresh
+        self.refreshes = []
+        # Protocol violations, which the tests expect to stay empty
+        self.errors = []
+        # Image buffer writes into an area that a running refresh still reads.
+        # The controller accepts them, but the panel would show a torn image.
+        self.hazards = []
+
+        self._t = 0.0
+        self._t0 = time.perf_counter()
+        self._busy_until = 0.0
+        self._ncs_level = 1
+        self._out = []
+        self._cmd = None
+        self._args = []
+        self._load = None
+        self._tables = {}
+        self.image_buffer()
+        self.reset_stats()
+
+    # --- Clock and statistics ---------------------------------------------
+
+    @property
+    def now(self) -> float:
+        """
+        Simulated time in seconds
+        """
+        if self.realtime:
+            return self._t + time.perf_counter() - self._t0
+        return self._t
+
+    def advance(self, seconds: float):
+        self._t += seconds
+
+    def ticks_us(self) -> int:
+        return int(self.now*1e6)
+
+    def reset_stats(self):
+        self.stats = {
+            "transactions": 0,
+            "bytes_tx":     0,
+            "bytes_rx":     0,
+            "frames":       0,
+            "hrdy_polls":   0,
+            "lutafsr_reads": 0,
+            "commands":     {},
+        }
+
+    def lut_busy(self) -> int:
+        """
+        LUTAFSR value: one set bit per LUT engine that is still refreshing
+        """
+        now = self.now
+        mask = 0
+        for i, t in enumerate(self.lut_busy_until):
+            if t > now:
+                mask |= 1 << i
+        return mask
+
+    def image_buffer(self, base_address: int = None) -> bytearray:
+        """
+        Returns the 8bpp image buffer at base_address (default: the one
+        reported by GET_DEV_INFO)
+        """
+        if base_address is None:
+            base_address = self.img_buff_addr
+        buf = self.memory.get(base_address)
+        if buf is None:
+            buf = self.memory[base_address] = bytearray(self.width*self.height)
+        return buf
+
+    def panel_rect(self, x: int, y: int, w: int, h: int) -> list:
+        """
+        Returns the displayed 4bpp pixels of an area in row-major order
+        """
+        pixels = []
+        for row in range(y, y + h):
+            pixels.extend(self.panel[row*self.width + x:row*self.width + x + w])
+        return pixels
+
+    # --- Pins --------------------------------------------------------------
+
+    def _set_ncs(self, level: int):
+        if level == self._ncs_level:
+            return
+        self._ncs_level = level
+        if level == 0:
+            self.stats["frames"] += 1
+            self._hdr = bytearray()
+            self._pending = bytearray()
+            self._load_bytes_in_frame = 0
+            self._preamble = None
+            self._rd_pos = 0
+            self._cmd_seen = False
+        else:
+            self._end_frame()
+
+    def _hrdy_value(self) -> int:
+        self.stats["hrdy_polls"] += 1
+        self._t += self.hrdy_poll_s
+        return 1 if self.now >= self._busy_until else 0
+
+    def _busy(self, seconds: float):
+        self._busy_until = max(self._busy_until, self.now + seconds)
+
+    # --- SPI protocol --------------------------------------------------------
+
+    def _transfer(self, tx, rx):
+        tx = bytes(tx)
+        n = len(tx)
+        self.stats["transactions"] += 1
+        self.stats["bytes_tx"] += n
+        self._t += self.txn_overhead_s + n*8/self.spi_hz
+        if rx is not None:
+            self.stats["bytes_rx"] += n
+            for i in range(n):
+                rx[i] = 0
+        if self._ncs_level:
+            self.errors.append("SPI transfer while nCS is high")
+            return
+
+        i = 0
+        if self._preamble is None:
+            i = min(2 - len(self._hdr), n)
+            self._hdr += tx[:i]
+            if len(self._hdr) == 2:
+                self._preamble = (self._hdr[0] << 8) | self._hdr[1]
+        if i == n:
+            return
+
+        if self._preamble == SpiPreamble.COMMAND:
+            self._pending += tx[i:]
+            if len(self._pending) >= 2 and not self._cmd_seen:
+                self._cmd_seen = True
+                self._begin_command((self._pending[0] << 8) | self._pending[1])
+        elif self._preamble == SpiPreamble.WRITE_DATA:
+            self._write_data(tx[i:])
+        elif self._preamble == SpiPreamble.READ_DATA:
+            if rx is not None:
+                for k in range(i, n):
+                    rx[k] = self._read_byte(self._rd_pos)
+                    self._rd_pos += 1
+        else:
+            self.errors.append(f"Unknown preamble {self._preamble:#06x}")
+
+    def _end_frame(self):
+        if self._preamble == SpiPreamble.COMMAND:
+            if len(self._pending) != 2:
+                self.errors.append("Command frame must hold exactly one word")
+        elif self._preamble == SpiPreamble.WRITE_DATA and \
+             (self._pending or self._load_bytes_in_frame % 2):
+            self.errors.append("Data frame ended on an odd byte")
+        elif self._preamble == SpiPreamble.READ_DATA:
+            # The first word clocked out after the preamble is a dummy
+            consumed = max(0, (self._rd_pos - 2) // 2)
+            del self._out[:consumed]
+        self._pending = bytearray()
+
+    def _read_byte(self, pos: int) -> int:
+        if pos < 2:
+            return 0
+        idx = (pos - 2) // 2
+        if idx >= len(self._out):
+            self.errors.append("Read past the end of the available data")
+            return 0
+        word = self._out[idx]
+        return word >> 8 if pos % 2 == 0 else word & 0xFF
+
+    def _write_data(self, data: bytes):
+        if self._load is not None:
+            self._load_bytes(data)
+            return
+        self._pending += data
+        nwords = len(self._pending) // 2
+        for k in range(nwords):
+            self._args.append((self._pending[2*k] << 8) | self._pending[2*k+1])
+            self._busy(self.hrdy_busy_s)
+            self._maybe_execute()
+            if self._load is not None:
+                # Everything after the LD_IMG(_AREA) arguments is pixel data
+                rest = bytes(self._pending[2*k+2:])
+                self._pending = bytearray()
+                self._load_bytes(rest)
+                return
+        del self._pending[:2*nwords]
+
+    # --- Commands ------------------------------------------------------------
+
+    def _begin_command(self, cmd: int):
+        counts = self.stats["commands"]
+        counts[cmd] = counts.get(cmd, 0) + 1
+        if self._load is not None and cmd != Command.LD_IMG_END:
+            self.errors.append(f"Command {cmd:#06x} issued during an image load")
+        self._cmd = cmd
+        self._args = []
+        self._busy(self.hrdy_busy_s)
+        if cmd not in _ARG_COUNT:
+            self.errors.append(f"Unsupported command {cmd:#06x}")
+            self._cmd = None
+            return
+        self._maybe_execute()
+
+    def _maybe_execute(self):
+        cmd = self._cmd
+        if cmd is None:
+            if self._args:
+                self.errors.append("Data written without a command")
+                self._args = []
+            return
+        count = _ARG_COUNT[cmd]
+        if callable(count):
+            if not self._args:
+                return
+            count = count(self._args)
+        if len(self._args) < count:
+            return
+        args = self._args
+        self._cmd = None
+        self._args = []
+        self._execute(cmd, args)
+
+    def _execute(self, cmd: int, args: list):
+        if cmd == Command.SYS_RUN:
+            self.power = "run"
+        elif cmd == Command.STANDBY:
+            self.power = "standby"
+        elif cmd == Command.SLEEP:
+            self.power = "sleep"
+        elif cmd == Command.GET_DEV_INFO:
+            words = [self.width, self.height,
+                     self.img_buff_addr & 0xFFFF, self.img_buff_addr >> 16]
+            words += self._str_to_words(self.firmware_version)
+            words += self._str_to_words(self.lut_version)
+            self._out.extend(words)
+        elif cmd == Command.REG_RD:
+            self._out.append(self._read_reg(args[0]))
+        elif cmd == Command.REG_WR:
+            if args[0] == Register.LUTAFSR:
+                self.errors.append("LUTAFSR is read-only")
+            else:
+                if args[0] == Register.UP1SR + 2 and self.lut_busy() and \
+                   (args[1] ^ self.registers.get(args[0], 0)) & _BITMAP_MODE:
+                    self.errors.append("1bpp mode switched while a refresh is running")
+                self.registers[args[0]] = args[1]
+        elif cmd == Command.LD_IMG:
+            self._start_load(args[0], 0, 0, self.width, self.height)
+        elif cmd == Command.LD_IMG_AREA:
+            self._start_load(*args)
+        elif cmd == Command.LD_IMG_END:
+            if self._load is None:
+                self.errors.append("LD_IMG_END without an image load")
+            elif self._load["row"] != self._load["h"]:
+                self.errors.append("Image load ended before the area was filled")
+            self._load = None
+        elif cmd == Command.DPY_AREA:
+            self._display(args[0], args[1], args[2], args[3], args[4], self.img_buff_addr)
+        elif cmd == Command.DPY_BUF_AREA:
+            self._display(args[0], args[1], args[2], args[3], args[4], (args[6] << 16) | args[5])
+        elif cmd == Command.FILL_RECT:
+            x, y, w, h, mode, colour = args
+            if self._check_area(x, y, w, h):
+                self._check_hazard(self.img_buff_addr, x, y, w, h)
+                value = colour*0x11 if colour <= 0xF else colour
+                buf = self.image_buffer()
+                for row in range(y, y + h):
+                    buf[row*self.width + x:row*self.width + x + w] = bytes([value])*w
+                self._display(x, y, w, h, mode & 0xFF, self.img_buff_addr)
+        elif cmd == Command.CMD_VCOM:
+            if args[0] == 0:
+                self._out.append(abs(self.vcom_mV))
+            else:
+                self.vcom_mV = -args[1]
+        elif cmd == Command.CMD_TEMPERATURE:
+            if args[0] == 0:
+                forced = self.forced_temperature_C
+                self._out.extend([self.temperature_C, forced if forced is not None else 0])
+            elif args[0] == 1:
+                self.forced_temperature_C = args[1]
+            else:
+                self.forced_temperature_C = None
+        elif cmd == Command.POWER_SEQUENCE:
+            self.powered = bool(args[0])
+        elif cmd == Command.BPP_SETTINGS:
+            self.bpp2_white = bool(args[0])
+
+    @staticmethod
+    def _str_to_words(text: str) -> list:
+        raw = text.encode()[:16].ljust(16, b'\0')
+        return [(raw[i] << 8) | raw[i+1] for i in range(0, 16, 2)]
+
+    def _read_reg(self, reg: int) -> int:
+        if reg == Register.LUTAFSR:
+            self.stats["lutafsr_reads"] += 1
+            return self.lut_busy()
+        return self.registers.get(reg, 0)
+
+    def _lisar(self) -> int:
+        return self.registers.get(Register.LISAR, 0) | \
+               (self.registers.get(Register.LISAR + 2, 0) << 16)
+
+    def _check_area(self, x: int, y: int, w: int, h: int) -> bool:
+        if w <= 0 or h <= 0 or x + w > self.width or y + h > self.height:
+            self.errors.append(f"Area ({x},{y},{w},{h}) outside the panel")
+            return False
+        return True
+
+    # --- Image loads and refreshes -------------------------------------------
+
+    def _check_hazard(self, base_address: int, x: int, y: int, w: int, h: int):
+        now = self.now
+        for rx, ry, rw, rh, _, addr, _, end in self.refreshes:
+            if end > now and addr == base_address and \
+               x < rx + rw and rx < x + w and y < ry + rh and ry < y + h:
+                self.hazards.append((x, y, w, h))
+                return
+
+    def _start_load(self, info: int, x: int, y: int, w: int, h: int):
+        rotation = info & 0x3
+        bpp = (info >> 4) & 0x3
+        if rotation != 0:
+            self.errors.append("Only ROTATE_0 image loads are simulated")
+        if not self._check_area(x, y, w, h):
+            return
+        self._check_hazard(self._lisar(), x, y, w, h)
+        ppw = ColorDepth.pixel_per_word(bpp)
+        start = x % ppw
+        self._load = {
+            "x": x, "y": y, "w": w, "h": h,
+            "bpp": bpp,
+            "big": (info >> 8) & 1 == Endianness.BIG,
+            "ppw": ppw,
+            "slot": 16 // ppw,
+            "start": start,
+            "row_words": (start + w + ppw - 1) // ppw,
+            "row": 0,
+            "pending": bytearray(),
+            "buf": self.image_buffer(self._lisar()),
+        }
+
+    def _expand(self, bpp: int, value: int) -> int:
+        """
+        Converts a loaded pixel to the 8bpp value stored in the image buffer
+        """
+        if bpp == ColorDepth.BPP_2BIT:
+            # Without BPP_SETTINGS 2bpp white doesn't reach full white
+            return value*0x55 if self.bpp2_white else value << 6
+        if bpp == ColorDepth.BPP_3BIT:
+            return ((value >> 1) << 1)*0x11
+        if bpp == ColorDepth.BPP_4BIT:
+            return value*0x11
+        return value
+
+    def _pixel_table(self, bpp: int, shift: int, mask: int) -> bytes:
+        """
+        Translation table that extracts one pixel slot from a byte and expands
+        it to its 8bpp image buffer value
+        """
+        key = (bpp, shift, mask, self.bpp2_white)
+        table = self._tables.get(key)
+        if table is None:
+            table = self._tables[key] = bytes(self._expand(bpp, (b >> shift) & mask) for b in range(256))
+        return table
+
+    def _load_bytes(self, data: bytes):
+        """
+        Collects the image data of a load and decodes it one row at a time
+        """
+        ld = self._load
+        self._load_bytes_in_frame += len(data)
+        # Rows may be split across data frames
+        pending = ld["pending"]
+        pending += data
+        row_bytes = 2*ld["row_words"]
+        offset = 0
+        while len(pending) - offset >= row_bytes:
+            if ld["row"] >= ld["h"]:
+                self.errors.append("Image data past the end of the loaded area")
+                ld["pending"] = bytearray()
+                return
+            self._load_row(ld, pending[offset:offset + row_bytes])
+            offset += row_bytes
+        del pending[:offset]
+
+    def _load_row(self, ld: dict, row: bytes):
+        ppw, slot = ld["ppw"], ld["slot"]
+        # Split the words into their low (bits 7:0) and high (bits 15:8) bytes
+        if ld["big"]:
+            lo, hi = row[0::2], row[1::2]
+        else:
+            hi, lo = row[0::2], row[1::2]
+        pixels = bytearray(ld["row_words"]*ppw)
+        for s in range(ppw):
+            bit = s*slot
+            src, shift = (lo, bit) if bit < 8 else (hi, bit - 8)
+            pixels[s::ppw] = src.translate(self._pixel_table(ld["bpp"], shift, (1 << slot) - 1))
+        a = (ld["y"] + ld["row"])*self.width + ld["x"]
+        ld["buf"][a:a + ld["w"]] = pixels[ld["start"]:ld["start"] + ld["w"]]
+        ld["row"] += 1
+
+    def _display(self, x: int, y: int, w: int, h: int, mode: int, base_address: int):
+        if not self._check_area(x, y, w, h):
+            return
+        if mode not in self.waveform_times:
+            self.errors.append(f"Unknown display mode {mode}")
+            return
+        buf = self.image_buffer(base_address)
+        if self.registers.get(Register.UP1SR + 2, 0) & _BITMAP_MODE:
+            # Pixel x of a row is bit x%8 of byte x/8, coloured through BGVR
+            bgvr = self.registers.get(Register.BGVR, 0)
+            colours = (_TO_PANEL[bgvr & 0xFF], _TO_PANEL[bgvr >> 8])
+            for row in range(y, y + h):
+                a = row*self.width
+                for px in range(x, x + w):
+                    self.panel[a + px] = colours[(buf[a + px//8] >> (px % 8)) & 1]
+        else:
+            for row in range(y, y + h):
+                a = row*self.width + x
+                self.panel[a:a+w] = buf[a:a+w].translate(_TO_PANEL)
+
+        # Take the LUT engine that frees up first
+        now = self.now
+        engine = min(range(len(self.lut_busy_until)), key=lambda i: self.lut_busy_until[i])
+        start = max(now, self.lut_busy_until[engine])
+        end = start + self.waveform_times[mode]
+        self.lut_busy_until[engine] = end
+        self.refreshes.append((x, y, w, h, mode, base_address, start, end))
@@ -1,13 +1,131 @@
 import sys
-# TODO: This creates a dependency forthe ESP32 platform
+import time
+from array import array
 if sys.platform == "esp32":
-    import pros3
     from machine import Pin, SPI
-if sys.platform == "win32":
-    from unittest.mock import Mock
+else:
+    # Host builds (unit tests, benchmarks) only need the names for annotations
     class SPI: pass
     class Pin: pass
 
+try:
+    from micropython import const
+except ImportError:
+    # CPython shim. MicroPython's compiler replaces the _NAME = const(...)
+    # names below with their values wherever this module uses them, so the
+    # driver's hot paths don't look up class attributes, and the names take
+    # no RAM.
+    def const(value: int) -> int:
+        return value
+
+if hasattr(time, "ticks_us"):
+    _ticks_us   = time.ticks_us
+    _ticks_diff = time.ticks_diff
+else:
+    def _ticks_us() -> int:
+        return time.perf_counter_ns() // 1000
+    def _ticks_diff(end: int, start: int) -> int:
+        return end - start
+
+# Register blocks
+_BASE_DISP_CTRL   = const(0x1000)
+_BASE_SYSTEM      = const(0x0000)
+_BASE_MEMORY_CONV = const(0x0200)
+
+# Engine width/height register
+_REG_LUT0EWHR  = const(_BASE_DISP_CTRL + 0x000)
+# LUT0 XY register
+_REG_LUT0XYR   = const(_BASE_DISP_CTRL + 0x040)
+# LUT0 Base Address Reg
+_REG_LUT0BADDR = const(_BASE_DISP_CTRL + 0x080)
+# LUT0 Mode and Frame number Reg
+_REG_LUT0MFN   = const(_BASE_DISP_CTRL + 0x0C0)
+# LUT0 and LUT1 Active Flag Reg
+_REG_LUT01AF   = const(_BASE_DISP_CTRL + 0x114)
+# Update parameter0 setting reg
+_REG_UP0SR     = const(_BASE_DISP_CTRL + 0x134)
+# Update parameter1 setting reg
+_REG_UP1SR     = const(_BASE_DISP_CTRL + 0x138)
+# LUT0 Alpha blend and fill rectangle value
+_REG_LUT0ABFRV = const(_BASE_DISP_CTRL + 0x13C)
+# Update buffer base address
+_REG_UPBBADDR  = const(_BASE_DISP_CTRL + 0x17C)
+# LUT0 Image buffer X/Y offset register
+_REG_LUT0IMXY  = const(_BASE_DISP_CTRL + 0x180)
+# LUT Status Reg (status of All LUT Engines)
+_REG_LUTAFSR   = const(_BASE_DISP_CTRL + 0x224)
+# Set BG and FG Color if Bitmap mode enable only (1bpp)
+_REG_BGVR      = const(_BASE_DISP_CTRL + 0x250)
+_REG_I80CPCR   = const(_BASE_SYSTEM + 0x004)
+_REG_MCSR      = const(_BASE_MEMORY_CONV + 0x00)
+_REG_LISAR     = const(_BASE_MEMORY_CONV + 0x08)
+
+# These double-words are used in an SPI frame to set their type
+_PRE_COMMAND    = const(0x6000)
+_PRE_WRITE_DATA = const(0x0000)
+_PRE_READ_DATA  = const(0x1000)
+
+# System running command: enable all clocks, and go to active state
+_CMD_SYS_RUN         = const(0x0001)
+# Standby command: gate off clocks, and go to standby state
+_CMD_STANDBY         = const(0x0002)
+# Sleep command: disable all clocks, and go to sleep state
+_CMD_SLEEP           = const(0x0003)
+# Read register command
+_CMD_REG_RD          = const(0x0010)
+# Write register command
+_CMD_REG_WR          = const(0x0011)
+_CMD_MEM_BST_RD_T    = const(0x0012)
+_CMD_MEM_BST_RD_S    = const(0x0013)
+_CMD_MEM_BST_WR      = const(0x0014)
+_CMD_MEM_BST_END     = const(0x0015)
+_CMD_LD_IMG          = const(0x0020)
+_CMD_LD_IMG_AREA     = const(0x0021)
+_CMD_LD_IMG_END      = const(0x0022)
+_CMD_LD_IMG_1BPP     = const(0x0095)
+_CMD_DPY_AREA        = const(0x0034)
+_CMD_DPY_BUF_AREA    = const(0x0037)
+_CMD_POWER_SEQUENCE  = const(0x0038)
+_CMD_VCOM            = const(0x0039)
+_CMD_FILL_RECT       = const(0x003A)
+_CMD_TEMPERATURE     = const(0x0040)
+_CMD_BPP_SETTINGS    = const(0x0080)
+_CMD_GET_DEV_INFO    = const(0x0302)
+
+# |P[n+7]|P[n+6]|P[n+5]|P[n+4]|P[n+3]|P[n+2]|P[n+1]|P[n+0]|
+_BPP_2BIT = const(0)
+# |P[n+3] 0|P[n+2] 0|P[n+1] 0|P[n+0] 0|
+_BPP_3BIT = const(1)
+# |P[n+3]|P[n+2]|P[n+1]|P[n+0]|
+_BPP_4BIT = const(2)
+# |P[n+1]|P[n+0]|
+_BPP_8BIT = const(3)
+# |P[n+15]|...|P[n+0]|, loaded as 8bpp pixels that hold 8 bits each
+_BPP_1BIT = const(4)
+
+# Endianness of the loaded pixel words
+_ENDIAN_LITTLE = const(0)
+_ENDIAN_BIG    = const(1)
+
+# Rotational angle of the displayed image
+_ROTATE_0   = const(0)
+_ROTATE_90  = const(1)
+_ROTATE_180 = const(2)
+_ROTATE_270 = const(3)
+
+# Waveform display modes are described here:
+# http://www.waveshare.net/w/upload/c/c4/E-paper-mode-declaration.pdf
+_MODE_INIT  = const(0)
+_MODE_DU    = const(1)
+_MODE_GC16  = const(2)
+_MODE_GL16  = const(3)
+_MODE_GLR16 = const(4)
+_MODE_GLD16 = const(5)
+_MODE_A2    = const(6)
+_MODE_DU4   = const(7)
+
+# The classes below are the public names of the constants, for the users of
+# the driver
 class RegisterBase:
     USB         = 0x4E00
     I2C         = 0x4C00
@@ -16,44 +134,30 @@ class RegisterBase:
     GPIO        = 0x1E00
     HS_UART     = 0x1C00
     INTC        = 0x1400
-    DISP_CTRL   = 0x1000
+    DISP_CTRL   = _BASE_DISP_CTRL
     SPI         = 0x0E00
     THERM       = 0x0800
     SD_CARD     = 0x0600
-    MEMORY_CONV = 0x0200
-    SYSTEM      = 0x0000
+    MEMORY_CONV = _BASE_MEMORY_CONV
+    SYSTEM      = _BASE_SYSTEM
     
 # IT8951 register memory map
 class Register:
-    # Engine width/height register
-    LUT0EWHR  = RegisterBase.DISP_CTRL + 0x000
-    # LUT0 XY register
-    LUT0XYR   = RegisterBase.DISP_CTRL + 0x040
-    # LUT0 Base Address Reg
-    LUT0BADDR = RegisterBase.DISP_CTRL + 0x080
-    # LUT0 Mode and Frame number Reg
-    LUT0MFN   = RegisterBase.DISP_CTRL + 0x0C0 
-    # LUT0 and LUT1 Active Flag Reg
-    LUT01AF   = RegisterBase.DISP_CTRL + 0x114 
-    # Update parameter0 setting reg
-    UP0SR     = RegisterBase.DISP_CTRL + 0x134
-    # Update parameter1 setting reg
-    UP1SR     = RegisterBase.DISP_CTRL + 0x138
-    # LUT0 Alpha blend and fill rectangle value
-    LUT0ABFRV = RegisterBase.DISP_CTRL + 0x13C
-    # Update buffer base address
-    UPBBADDR  = RegisterBase.DISP_CTRL + 0x17C
-    # LUT0 Image buffer X/Y offset register
-    LUT0IMXY  = RegisterBase.DISP_CTRL + 0x180
-    # LUT Status Reg (status of All LUT Engines)
-    LUTAFSR   = RegisterBase.DISP_CTRL + 0x224
-    # Set BG and FG Color if Bitmap mode enable only (1bpp)
-    BGVR      = RegisterBase.DISP_CTRL + 0x250
-
-    I80CPCR   = RegisterBase.SYSTEM    + 0x004
-
-    MCSR      = RegisterBase.MEMORY_CONV + 0x00
-    LISAR     = RegisterBase.MEMORY_CONV + 0x08
+    LUT0EWHR  = _REG_LUT0EWHR
+    LUT0XYR   = _REG_LUT0XYR
+    LUT0BADDR = _REG_LUT0BADDR
+    LUT0MFN   = _REG_LUT0MFN
+    LUT01AF   = _REG_LUT01AF
+    UP0SR     = _REG_UP0SR
+    UP1SR     = _REG_UP1SR
+    LUT0ABFRV = _REG_LUT0ABFRV
+    UPBBADDR  = _REG_UPBBADDR
+    LUT0IMXY  = _REG_LUT0IMXY
+    LUTAFSR   = _REG_LUTAFSR
+    BGVR      = _REG_BGVR
+    I80CPCR   = _REG_I80CPCR
+    MCSR      = _REG_MCSR
+    LISAR     = _REG_LISAR
 
 class CommsMode:
     # TEST_CFG[2:0] = 0b000, I80CPCR = 0 (not supported)
@@ -67,98 +171,93 @@ class CommsMode:
     # TEST_CFG[2:0] = 0b111, I80CPCR = X (not supported)
     I2C_0x35 = 4
 
-# These double-words are used in an SPI frame to set their type
 class SpiPreamble:
-    COMMAND    = 0x6000
-    WRITE_DATA = 0x0000
-    READ_DATA  = 0x1000
+    COMMAND    = _PRE_COMMAND
+    WRITE_DATA = _PRE_WRITE_DATA
+    READ_DATA  = _PRE_READ_DATA
     
 class Command:
-    # System running command: enable all clocks, and go to active state
-    SYS_RUN         = 0x0001
-    # Standby command: gate off clocks, and go to standby state
-    STANDBY         = 0x0002
-    # Sleep command: disable all clocks, and go to sleep state
-    SLEEP           = 0x0003
-    # Read register command
-    REG_RD          = 0x0010
-    # Write register command
-    REG_WR          = 0x0011
-    MEM_BST_RD_T    = 0x0012
-    MEM_BST_RD_S    = 0x0013
-    MEM_BST_WR      = 0x0014
-    MEM_BST_END     = 0x0015
-    LD_IMG          = 0x0020
-    LD_IMG_AREA     = 0x0021
-    LD_IMG_END      = 0x0022
-    LD_IMG_1BPP     = 0x0095
-    DPY_AREA        = 0x0034
-    DPY_BUF_AREA    = 0x0037
-    POWER_SEQUENCE  = 0x0038
-    CMD_VCOM        = 0x0039
-    FILL_RECT       = 0x003A
-    CMD_TEMPERATURE = 0x0040
-    BPP_SETTINGS    = 0x0080
-    GET_DEV_INFO    = 0x0302
+    SYS_RUN         = _CMD_SYS_RUN
+    STANDBY         = _CMD_STANDBY
+    SLEEP           = _CMD_SLEEP
+    REG_RD          = _CMD_REG_RD
+    REG_WR          = _CMD_REG_WR
+    MEM_BST_RD_T    = _CMD_MEM_BST_RD_T
+    MEM_BST_RD_S    = _CMD_MEM_BST_RD_S
+    MEM_BST_WR      = _CMD_MEM_BST_WR
+    MEM_BST_END     = _CMD_MEM_BST_END
+    LD_IMG          = _CMD_LD_IMG
+    LD_IMG_AREA     = _CMD_LD_IMG_AREA
+    LD_IMG_END      = _CMD_LD_IMG_END
+    LD_IMG_1BPP     = _CMD_LD_IMG_1BPP
+    DPY_AREA        = _CMD_DPY_AREA
+    DPY_BUF_AREA    = _CMD_DPY_BUF_AREA
+    POWER_SEQUENCE  = _CMD_POWER_SEQUENCE
+    CMD_VCOM        = _CMD_VCOM
+    FILL_RECT       = _CMD_FILL_RECT
+    CMD_TEMPERATURE = _CMD_TEMPERATURE
+    BPP_SETTINGS    = _CMD_BPP_SETTINGS
+    GET_DEV_INFO    = _CMD_GET_DEV_INFO
 
 # Color-depth of the display to drive
 class ColorDepth:
-    # |P[n+7]|P[n+6]|P[n+5]|P[n+4]|P[n+3]|P[n+2]|P[n+1]|P[n+0]|
-    BPP_2BIT = 0
-    # |P[n+3] 0|P[n+2] 0|P[n+1] 0|P[n+0] 0|
-    BPP_3BIT = 1
-    # |P[n+3]|P[n+2]|P[n+1]|P[n+0]|
-    BPP_4BIT = 2
-    # |P[n+1]|P[n+0]|
-    BPP_8BIT = 3
-    BPP_1BIT = 4
+    BPP_2BIT = _BPP_2BIT
+    BPP_3BIT = _BPP_3BIT
+    BPP_4BIT = _BPP_4BIT
+    BPP_8BIT = _BPP_8BIT
+    BPP_1BIT = _BPP_1BIT
 
     _bpp_per_byte_map = {
-        BPP_1BIT: 8,
-        BPP_2BIT: 4,
-        BPP_3BIT: 2,
-        BPP_4BIT: 2,
-        BPP_8BIT: 1
+        _BPP_1BIT: 8,
+        _BPP_2BIT: 4,
+        _BPP_3BIT: 2,
+        _BPP_4BIT: 2,
+        _BPP_8BIT: 1
     }
 
     _bpp_code_map = {
-        1: BPP_1BIT,
-        2: BPP_2BIT,
-        3: BPP_3BIT,
-        4: BPP_4BIT,
-        8: BPP_8BIT
+        1: _BPP_1BIT,
+        2: _BPP_2BIT,
+        3: _BPP_3BIT,
+        4: _BPP_4BIT,
+        8: _BPP_8BIT
     }
     
     @classmethod
     def pixel_per_byte(cls, bpp: 'ColorDepth'):
         return cls._bpp_per_byte_map.get(bpp)
 
+    @classmethod
+    def pixel_per_word(cls, bpp: 'ColorDepth'):
+        """
+        Number of pixels packed in a u16 word. This is also the horizontal
+        alignment (in pixels) that a loaded area must start and end on.
+        """
+        return 2*cls._bpp_per_byte_map.get(bpp)
+
     @classmethod
     def bpp_to_code(cls, bpp: int):
         return cls._bpp_code_map.get(bpp)
 
-# Rotational angle of the displayed image
 class RotateMode:
-    ROTATE_0   = 0
-    ROTATE_90  = 1
-    ROTATE_180 = 2
-    ROTATE_270 = 3
+    ROTATE_0   = _ROTATE_0
+    ROTATE_90  = _ROTATE_90
+    ROTATE_180 = _ROTATE_180
+    ROTATE_270 = _ROTATE_270
 
 class Endianness:
-    LITTLE = 0
-    BIG    = 1
+    LITTLE = _ENDIAN_LITTLE
+    BIG    = _ENDIAN_BIG
     
-# Waveform display modes are described here:
-# http://www.waveshare.net/w/upload/c/c4/E-paper-mode-declaration.pdf
 class DisplayMode:
-    INIT  = 0
-    DU    = 1
-    GC16  = 2
-    GL16  = 3
-    GLR16 = 4
-    GLD16 = 5
-    A2    = 6
-    DU4   = 7
+    INIT  = _MODE_INIT
+    DU    = _MODE_DU
+    GC16  = _MODE_GC16
+    GL16  = _MODE_GL16
+    GLR16 = _MODE_GLR16
+    GLD16 = _MODE_GLD16
+    A2    = _MODE_A2
+    DU4   = _MODE_DU4
     
 class DeviceInfo:
     Size = 40
@@ -190,11 +289,8 @@ class DeviceInfo:
         )
 
     def __str__(self) -> str:
-        return f"Panel width: {self.panel_width}\n" + \
-               f"Panel height: {self.panel_height}\n" + \
-               f"Image buffer address: {hex(self.img_buff_addr)}\n" + \
-               f"Firmware version: {self.firmware_version}\n" + \
-               f"LUT version: {self.lut_version}"
+        from it8951_service import describe
+        return describe(self)
 
 class Rectangle:
     def __init__(self, x: int, y: int, w: int, h: int):
@@ -214,7 +310,15 @@ class Rectangle:
             self.x >= rect.x and
             self.y >= rect.y and
             self.x + self.width <= rect.x + rect.width and
-            self.y + self.height <= rect.x + rect.height
+            self.y + self.height <= rect.y + rect.height
+        )
+
+    def intersects(self, rect: 'Rectangle') -> bool:
+        return (
+            self.x < rect.x + rect.width and
+            rect.x < self.x + self.width and
+            self.y < rect.y + rect.height and
+            rect.y < self.y + self.height
         )
 
     def __str__(self) -> str:
@@ -231,11 +335,53 @@ class ImageInfo:
     def pack_to_u16(self) -> int:
         return (self.endianness << 8) | (self.bpp << 4) | self.rotation
 
+# Names of the driver methods that set_tracer records as spans
+_TRACED = []
+
+def _traced(method):
+    """
+    Marks a driver method whose calls are recorded as spans while a Tracer is
+    attached. The method itself is left as is, set_tracer wraps it per
+    instance, so that untraced calls cost nothing.
+    """
+    _TRACED.append(method.__name__)
+    return method
+
+def _span(trace, name: str, method):
+    def traced(*args, **kwargs):
+        trace.begin(name)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            trace.end()
+    return traced
+
 # For the SPI protocol description, refer to 
 # https://www.waveshare.net/w/upload/1/18/IT8951_D_V0.2.4.3_20170728.pdf and
 # https://v4.cecdn.yun300.cn/100001_1909185148/IT8951_I80+ProgrammingGuide_16bits_20170904_v2.7_common_CXDX.pdf
 class it8951:
-    def __init__(self, spi: SPI, ncs: Pin, hrdy: Pin, vcom_mV):
+    # Number of u16 words that fit in the preallocated SPI frame buffer. Longer
+    # frames are clocked out in several bursts under the same nCS assertion
+    _TX_BUF_WORDS = 32
+    # Image data is clocked out in transactions of at most this many bytes,
+    # the largest DMA transfer of the ESP32's SPI master
+    _SPI_CHUNK = 4092
+    # Registers that only the host writes, so the last value written or read
+    # stays valid until the controller is put to sleep. Status registers such
+    # as LUTAFSR must never be added here.
+    _CACHED_REGS = (_REG_LISAR, _REG_LISAR+2, _REG_I80CPCR, _REG_BGVR,
+                    _REG_UP1SR+2)
+    # UP1SR+2 bit that makes the display commands read the image buffer as a
+    # 1bpp bitmap coloured by BGVR
+    _BITMAP_MODE_BIT = 1 << 2
+    # Cache keys of the VCOM, forced temperature and BPP_SETTINGS settings
+    _VCOM_KEY = "vcom"
+    _TEMP_KEY = "temperature"
+    _BPP_KEY  = "bpp"
+
+    def __init__(self, spi: SPI, ncs: Pin, hrdy: Pin, vcom_mV, strict_hrdy: bool = False,
+                 state_store = None, tracer = None, initialise: bool = True,
+                 read_burst: bool = False):
         """
         Args:
             spi: Initialised SPI channel with SCLK <24MHz.
@@ -244,6 +390,21 @@ class it8951:
             vcom_mV: [Optional] Note that the IT8951 development
             boards ship with waveforms that are tuned to a specific vcom voltage.
             Therefore setting this may mess up the drawn pixels.
+            strict_hrdy: [Optional] True polls HRDY before every u16 word, as
+            the datasheet describes. False (default) polls HRDY once per frame
+            and clocks the whole frame out in a single burst.
+            state_store: [Optional] RtcStore or FileStore (controller_state.py)
+            The configuration is saved there after a cold start and reused
+            on the next wake if the IT8951 kept it, e.g. across deep sleep.
+            tracer: [Optional] Tracer (tracer.py) to attach before the
+            start-up sequence, see set_tracer
+            initialise: [Optional] False skips the start-up sequence, which
+            must then be run with initialise() before the first command. Used
+            by the tests to drive the class without a panel.
+            read_burst: [Optional] True clocks a read's preamble, dummy word
+            and data out in a single transaction, without the HRDY waits
+            of the datasheet's read sequence. Only enable it on a board
+            where it was checked against the hardware.
         """
         # There are 2 hardware SPI channels on the ESP32 and they can be mapped
         # to any pin, however, they are limited to 40MHz if not used on the 
@@ -255,50 +416,189 @@ class it8951:
         self._ncs = ncs
         # Host-ready pin (toggled by the IT8951)
         self._hrdy = hrdy
+        self._strict_hrdy = strict_hrdy
+        self._read_burst = read_burst
+        # Preallocated frame buffer so that register/argument writes don't
+        # allocate on every call
+        self._txbuf = bytearray(2*self._TX_BUF_WORDS)
+        self._txmv  = memoryview(self._txbuf)
+        # Reusable read buffers, grown on demand by _read_words
+        self._rdtx    = bytearray(0)
+        self._rdrx    = bytearray(0)
+        self._rdwords = array('H')
+        # Reusable image transfer buffer, grown on demand by _chunk_buffer
+        self._chunk_buf = bytearray(0)
+        # Write-through cache of _CACHED_REGS, VCOM, the forced temperature and
+        # the BPP_SETTINGS setting
+        self._reg_cache = {}
+        # Number of register reads served from the cache and of writes that
+        # were skipped because the value didn't change
+        self.reg_cache_stats = {"read_hits": 0, "write_skips": 0}
+        # Whether the 1bpp bitmap display mode is on. None: unknown
+        self._bitmap_mode = None
 
-        if sys.platform != "win32":
-            print("Initialising IT8951...")
-            self.device_info = self.get_device_info()
+        self._state_store = state_store
+        self.warm_started = False
+        # Wake-up metrics. The ESP32 reboots when it wakes from deep sleep, so
+        # its tick counter starts at the wake-up
+        self._t_wake = 0 if sys.platform == "esp32" else _ticks_us()
+        self.init_time_us = None
+        self.wake_to_first_pixel_us = None
+        # Opt-in instrumentation, see set_tracer
+        self._trace = None
+        if tracer is not None:
+            self.set_tracer(tracer)
 
-            if self.device_info.panel_height == 0 or self.device_info.panel_width == 0:
-                raise Exception("Failed to establish communication with the IT8951")
+        if initialise:
+            self.initialise(vcom_mV)
 
-            self.set_img_buff_base_address(self.device_info.img_buff_addr)
-            self.set_i80_packed_mode(True)
+    def set_tracer(self, tracer):
+        """
+        Attaches a Tracer (tracer.py) that records every command and
+        high-level call, or detaches it with None. Without a tracer the
+        instrumentation costs one attribute check per command and frame.
+        """
+        if self._trace is not None:
+            self._spi = self._spi.spi
+            for name in _TRACED:
+                delattr(self, name)
+        self._trace = tracer
+        if tracer is not None:
+            from tracer import TracedSPI
+            self._spi = TracedSPI(self._spi, tracer)
+            # Instance attributes that shadow the plain methods until detached
+            for name in _TRACED:
+                setattr(self, name, _span(tracer, name, getattr(self, name)))
 
-            print(self.device_info)
-            self.panel_area = Rectangle(0, 0, self.device_info.panel_width, self.device_info.panel_height)
+    @_traced
+    def initialise(self, vcom_mV = None):
+        """
+        Reads the panel's parameters and configures the IT8951 for SPI image
+        loads. Called by the constructor on the target; host-side tests may
+        call it explicitly.
+        Args:
+            vcom_mV: [Optional] See __init__
+        """
+        t_start = _ticks_us()
+        state = None
+        if self._state_store is not None:
+            from controller_state import ControllerState
+            state = ControllerState.from_bytes(self._state_store.load())
 
-            rxvcom_mV = self.get_vcom()
-            print(f"Current VCOM = {rxvcom_mV/1000}")
+        if state is not None and self._controller_matches(state):
+            self._warm_start(state, vcom_mV)
+        else:
+            self._cold_start(vcom_mV)
+        self.init_time_us = _ticks_diff(_ticks_us(), t_start)
 
-            if vcom_mV is not None and vcom_mV != rxvcom_mV:
-                print(f"Settig VCOM to the new value: {vcom_mV/1000}... ", end='')
-                self.set_vcom(vcom_mV)
-                print("Success" if self.get_vcom() == vcom_mV else "Failed")
+    def _controller_matches(self, state) -> bool:
+        """
+        Cheap check that the IT8951 kept its configuration since the state
+        was saved. A controller that was reset or power cycled reads back its
+        default image load address and packed mode settings.
+        """
+        addr = state.device_info.img_buff_addr
+        return self._read_reg(_REG_LISAR)   == addr & 0xFFFF and \
+               self._read_reg(_REG_LISAR+2) == addr >> 16 and \
+               self._read_reg(_REG_I80CPCR) == state.i80cpcr
+
+    def _warm_start(self, state, vcom_mV):
+        self.warm_started = True
+        self.device_info = state.device_info
+        self.panel_area = Rectangle(0, 0, self.device_info.panel_width, self.device_info.panel_height)
+        self._reg_cache[self._VCOM_KEY] = state.vcom_mV
+        if vcom_mV is not None and vcom_mV != state.vcom_mV:
+            self.set_vcom(vcom_mV)
+            state.vcom_mV = vcom_mV
+            self._state_store.save(state.to_bytes())
+
+    def _cold_start(self, vcom_mV):
+        self.warm_started = False
+        self.device_info = self.get_device_info()
+
+        if self.device_info.panel_height == 0 or self.device_info.panel_width == 0:
+            raise Exception("Failed to establish communication with the IT8951")
+
+        self.set_img_buff_base_address(self.device_info.img_buff_addr)
+        self.set_i80_packed_mode(True)
+
+        self.panel_area = Rectangle(0, 0, self.device_info.panel_width, self.device_info.panel_height)
+
+        from it8951_service import cold_start_vcom
+        rxvcom_mV = cold_start_vcom(self, vcom_mV)
+
+        if self._state_store is not None:
+            from controller_state import ControllerState
+            state = ControllerState(self.device_info, rxvcom_mV, self._read_reg(_REG_I80CPCR))
+            self._state_store.save(state.to_bytes())
+
+    def _first_pixel(self):
+        """
+        Records the time from wake-up to the first command that drives pixels
+        """
+        self.wake_to_first_pixel_us = _ticks_diff(_ticks_us(), self._t_wake)
     
     def _wait_ready(self):
         """
         The host must wait for the HRDY pin to be high before Tx/Rx of the next 
         2x8 bits.
         """
+        if self._hrdy.value():
+            return
+        trace = self._trace
+        if trace is None:
+            while self._hrdy.value() == 0: pass
+            return
+        t_start = trace.now()
         while self._hrdy.value() == 0: pass
+        trace.hrdy_wait(trace.now() - t_start)
 
-    def _send_command(self, command: Command):
+    def _write_frame(self, preamble: SpiPreamble, words):
         """
-        Sends a command to the IT8951.
+        Sends a preamble followed by u16 words in a single nCS frame. The words
+        are encoded big-endian into the preallocated frame buffer and clocked
+        out in as few SPI transactions as possible. In strict mode HRDY is
+        polled before every word instead.
         Args:
-            command: Command to execute
+            preamble: SpiPreamble of the frame
+            words: Iterable of u16 words to send after the preamble
         """
         try:
-            txdata = [SpiPreamble.COMMAND, command]
             self._wait_ready()
             self._ncs(0)
-            for i in range(len(txdata)):
-                self._wait_ready()
-                self._spi.write(txdata[i].to_bytes(2, 'big'))
+            if self._strict_hrdy:
+                word = self._txmv[:2]
+                for w in (preamble,) + tuple(words):
+                    word[0] = (w >> 8) & 0xFF
+                    word[1] = w & 0xFF
+                    self._wait_ready()
+                    self._spi.write(word)
+                return
+
+            buf = self._txbuf
+            size = len(buf)
+            buf[0] = (preamble >> 8) & 0xFF
+            buf[1] = preamble & 0xFF
+            n = 2
+            for w in words:
+                if n == size:
+                    self._spi.write(buf)
+                    n = 0
+                buf[n]   = (w >> 8) & 0xFF
+                buf[n+1] = w & 0xFF
+                n += 2
+            self._spi.write(self._txmv[:n])
         finally:
             self._ncs(1)
+
+    def _send_command(self, command: Command):
+        """
+        Sends a command to the IT8951.
+        Args:
+            command: Command to execute
+        """
+        if self._trace is not None: self._trace.command(command)
+        self._write_frame(_PRE_COMMAND, (command,))
     
     def _write_data(self, data: list):
         """
@@ -307,29 +607,57 @@ class it8951:
             data: A list of u16 elements containing the data to be written.
         """
         if not data: return
+        self._write_frame(_PRE_WRITE_DATA, data)
+
+    @staticmethod
+    def _byte_view(data) -> memoryview:
+        """
+        Returns a memoryview onto the bytes of any buffer-protocol object, so
+        that its length and slices count bytes. MicroPython's memoryview can't
+        be cast, so there only buffers of single byte items are accepted.
+        """
+        mv = memoryview(data)
+        if hasattr(mv, "cast"):
+            return mv.cast("B")
+        # bytes() copies the whole first item, whatever its size
+        if mv and len(bytes(mv[:1])) != 1:
+            raise ValueError("Buffers of multi-byte items aren't supported on this port")
+        return mv
+
+    def _write_bytes(self, txbytes):
+        """
+        This method should be used for non-register data transfers, where the 
+        monitoring of the HRDY pin is irrelevant. Used to transfer images
+        Args:
+            txbytes: pre-formatted data bytes in any buffer-protocol object
+            (bytes, bytearray, memoryview, array...). Endianness depends on
+            ImageInfo. It is sent as memoryview slices of at most _SPI_CHUNK
+            bytes, without copies.
+        """
+        if not txbytes: return
+        mv = self._byte_view(txbytes)
+        step = self._SPI_CHUNK
         try:
-            txdata = [SpiPreamble.WRITE_DATA] + data
             self._wait_ready()
             self._ncs(0)
-            for i in range(len(txdata)):
-                self._wait_ready()
-                self._spi.write(txdata[i].to_bytes(2, 'big'))
+            self._spi.write(b'\x00\x00') # _PRE_WRITE_DATA
+            for i in range(0, len(mv), step):
+                self._spi.write(mv[i:i + step])
         finally:
             self._ncs(1)
 
-    def _write_bytes(self, txbytes: bytearray):
+    def _write_rows(self, data, row_bytes: int, stride: int, rows: int):
         """
-        This method should be used for non-register data transfers, where the 
-        monitoring of the HRDY pin is irrelevant. Used to transfer images
-        Args:
-            txbytes: pre-formatted data bytes. Endianness depends on ImageInfo
+        Sends rows of row_bytes that are stride bytes apart in data, e.g. the
+        area of a larger framebuffer, in a single data frame
         """
-        if not txbytes: return
+        mv = self._byte_view(data)
         try:
             self._wait_ready()
             self._ncs(0)
-            self._spi.write(SpiPreamble.WRITE_DATA.to_bytes(2, 'big'))
-            self._spi.write(txbytes)
+            self._spi.write(b'\x00\x00') # _PRE_WRITE_DATA
+            for i in range(0, rows*stride, stride):
+                self._spi.write(mv[i:i + row_bytes])
         finally:
             self._ncs(1)
 
@@ -337,17 +665,61 @@ class it8951:
         self._send_command(command)
         self._write_data(args)
 
-    def _read_data(self, length: int) -> list:
+    def _read_words(self, length: int):
         """
-        Reads the specified number of 16bit words from the IT8951.
+        Reads the specified number of 16bit words from the IT8951 into a
+        reusable buffer. HRDY is polled after the preamble and after the dummy
+        word, and the data is clocked in with a single full-duplex SPI
+        transaction (with read_burst, the whole read is). The returned
+        memoryview is only valid until the next read, copy it if it must be
+        kept.
         Args:
             length: number of u16 elements to read.
         """
-        if length == 0: return []
+        if self._strict_hrdy:
+            return memoryview(array('H', self._read_data_strict(length)))
+
+        # The preamble and the dummy word are clocked out before the data
+        nbytes = 2*(length+2)
+        if len(self._rdrx) < nbytes:
+            self._rdtx = bytearray(nbytes)
+            self._rdtx[0] = _PRE_READ_DATA >> 8
+            self._rdrx = bytearray(nbytes)
+            self._rdwords = array('H', [0]*length)
 
+        rx = self._rdrx
+        tx = memoryview(self._rdtx)
+        rxmv = memoryview(rx)
+        try:
+            self._wait_ready()
+            self._ncs(0)
+            if self._read_burst:
+                self._spi.write_readinto(tx[:nbytes], rxmv[:nbytes])
+            else:
+                self._spi.write(tx[:2])
+                self._wait_ready()
+                self._spi.write_readinto(tx[2:4], rxmv[2:4])
+                if length:
+                    self._wait_ready()
+                    self._spi.write_readinto(tx[4:nbytes], rxmv[4:nbytes])
+        finally:
+            self._ncs(1)
+
+        words = self._rdwords
+        for i in range(length):
+            words[i] = (rx[2*i+4] << 8) | rx[2*i+5]
+        return memoryview(words)[:length]
+
+    def _read_data_strict(self, length: int) -> list:
+        """
+        Reads the specified number of 16bit words from the IT8951, polling HRDY
+        before each word.
+        Args:
+            length: number of u16 elements to read.
+        """
         try:
             # The first word returned from the controller is dummy:u16
-            txdata = [SpiPreamble.READ_DATA] + [0]*(length+1)
+            txdata = [_PRE_READ_DATA] + [0]*(length+1)
             rxdata = []
 
             self._wait_ready()
@@ -362,50 +734,113 @@ class it8951:
             return rxdata[2:]
         finally:
             self._ncs(1)
+
+    def _read_data(self, length: int) -> list:
+        """
+        Reads the specified number of 16bit words from the IT8951.
+        Args:
+            length: number of u16 elements to read.
+        """
+        if length == 0: return []
+        if self._strict_hrdy:
+            return self._read_data_strict(length)
+        return list(self._read_words(length))
             
+    def _cache_hit(self, key, value) -> bool:
+        """
+        True if the cache already holds value for key, in which case the write
+        is counted as skipped
+        """
+        if self._reg_cache.get(key) == value:
+            self.reg_cache_stats["write_skips"] += 1
+            return True
+        return False
+
+    def invalidate_reg_cache(self):
+        """
+        Forgets every cached register value. Must be called if anything other
+        than this driver may have changed the IT8951's registers.
+        """
+        self._reg_cache.clear()
+        self._bitmap_mode = None
+
     def _write_reg(self, reg: Register, data: int):
         """
-        Writes the specified number of words to a register
+        Writes the specified number of words to a register. Writing the cached
+        value of a cached register is a no-op.
         Args:
             reg: Register to write to
             data: u16 word to write to reg
         """
-        self._send_command_args(Command.REG_WR, [reg, data])
+        cached = reg in self._CACHED_REGS
+        if cached and self._cache_hit(reg, data):
+            return
+        self._send_command_args(_CMD_REG_WR, [reg, data])
+        if cached:
+            self._reg_cache[reg] = data
     
     def _read_reg(self, reg: Register) -> int:
         """
-        Reads the specified number of words from a register
+        Reads the specified number of words from a register. Cached registers
+        are only read from the IT8951 once.
         Args:
             reg: Register to write to
         """
-        self._send_command_args(Command.REG_RD, [reg])
-        return self._read_data(1)[0]
+        cached = reg in self._CACHED_REGS
+        if cached:
+            value = self._reg_cache.get(reg)
+            if value is not None:
+                self.reg_cache_stats["read_hits"] += 1
+                return value
+        self._send_command_args(_CMD_REG_RD, [reg])
+        value = self._read_words(1)[0]
+        if cached:
+            self._reg_cache[reg] = value
+        return value
+
+    def lut_status(self) -> int:
+        """
+        Reads LUTAFSR: one set bit per LUT engine that is still refreshing
+        """
+        status = self._read_reg(_REG_LUTAFSR)
+        if self._trace is not None: self._trace.lut_status(status)
+        return status
 
     def _wait_for_display_ready(self): 
         """
         Waits for the LUT engine to finish
         """
-        while self._read_reg(Register.LUTAFSR) != 0: pass
+        trace = self._trace
+        if trace is None:
+            while self.lut_status() != 0: pass
+            return
+        t_start = trace.lut_wait_begin()
+        try:
+            while self.lut_status() != 0: pass
+        finally:
+            trace.lut_wait_end(t_start)
     
     def set_i80_packed_mode(self, enable: bool):
-        self._write_reg(Register.I80CPCR, int(enable))
+        self._write_reg(_REG_I80CPCR, int(enable))
 
     def sleep(self):
-        self._send_command(Command.SLEEP)
+        self._send_command(_CMD_SLEEP)
+        self.invalidate_reg_cache()
         
     def standby(self):
-        self._send_command(Command.STANDBY)
+        self._send_command(_CMD_STANDBY)
         
     def system_run(self):
-        self._send_command(Command.SYS_RUN)
+        self._send_command(_CMD_SYS_RUN)
+        self.invalidate_reg_cache()
     
     def get_vcom(self) -> int:
         """
         Reads the VCOM value from the IT8951 in mV. Note that this should always
         be a negative value
         """
-        self._send_command_args(Command.CMD_VCOM, [0])
-        return -self._read_data(1)[0]
+        from it8951_service import get_vcom
+        return get_vcom(self)
 
     def set_vcom(self, vcom_mV: int, store_to_flash: bool = False):
         """
@@ -414,19 +849,18 @@ class it8951:
             vcom_mV: VCOM value in mV. Must be negative!
             store_to_flash: True stores the vcom_mV value in NVM. False by default
         """
-        if vcom_mV >= 0: raise Exception("VCOM must be negative")
-        arg = 2 if store_to_flash else 1
-        # VCOM must be written as -1.58 = 1580 = 0x62C -> [0x06, 0x2C]
-        self._send_command_args(Command.CMD_VCOM, [arg, abs(vcom_mV)])
+        from it8951_service import set_vcom
+        set_vcom(self, vcom_mV, store_to_flash)
     
     def set_power(self, enable: bool):
-        self._send_command_args(Command.POWER_SEQUENCE, [enable])
+        self._send_command_args(_CMD_POWER_SEQUENCE, [enable])
         
     def get_device_info(self) -> DeviceInfo:
-        self._send_command(Command.GET_DEV_INFO)
+        self._send_command(_CMD_GET_DEV_INFO)
         rxdata = self._read_data(int(DeviceInfo.Size/2))
         return DeviceInfo.from_u16_words(rxdata)
     
+    @_traced
     def fill_rect(self, rect: Rectangle, mode: DisplayMode, colour: int):
         """
         Fills the specified rectangle with a uniform color. The rectangle must
@@ -441,15 +875,18 @@ class it8951:
         if colour > 255:
             raise ValueError("Invalid colour for the max allowed pixel depth")
         # Refresh EPD and change image buffer content with the assigned colour
+        self._set_bitmap_mode(False)
+        if self.wake_to_first_pixel_us is None: self._first_pixel()
         arg4 = 0x1100 | mode 
-        self._send_command_args(Command.FILL_RECT, rect.to_list() + [arg4, colour])
+        self._send_command_args(_CMD_FILL_RECT, rect.to_list() + [arg4, colour])
         
     def force_set_temperature(self, temperature_C: int):
         """
         Fixes the IT8951's temperature sensor readings to the specified 
         temperature in C
         """
-        self._send_command_args(Command.CMD_TEMPERATURE, [1, temperature_C])
+        from it8951_service import force_set_temperature
+        force_set_temperature(self, temperature_C)
 
     def get_temperature(self) -> list:
         """
@@ -457,31 +894,37 @@ class it8951:
         IT8951. If the temperature value isn't fixed (forced), the 2nd touple 
         element is meaningless
         """
-        self._send_command_args(Command.CMD_TEMPERATURE, [0])
-        # TODO: The datasheet is ambiguous on the order of the real and forced T
-        return self._read_data(2)
+        from it8951_service import get_temperature
+        return get_temperature(self)
     
     def cancel_force_temperature(self):
         """
         After a forced (fixed) temperature settings this command ensures that
         the IT8951 continues to read the real temperature sensor.
         """
-        self._send_command_args(Command.CMD_TEMPERATURE, [2])
+        from it8951_service import cancel_force_temperature
+        cancel_force_temperature(self)
     
     def set_bpp_mode(self, is_2bpp: bool):
         """
         This command was designed for 2 bpp image display. Without this command,
         2bpp cannot show correct white pixel. Host should call this command
-        before display 2bpp image
+        before display 2bpp image. Repeating the current setting is a no-op.
         """
-        self._send_command_args(Command.BPP_SETTINGS, [is_2bpp])
+        is_2bpp = bool(is_2bpp)
+        if self._cache_hit(self._BPP_KEY, is_2bpp):
+            return
+        self._send_command_args(_CMD_BPP_SETTINGS, [is_2bpp])
+        self._reg_cache[self._BPP_KEY] = is_2bpp
+        # The command changes the update parameters behind the cache's back
+        self._reg_cache.pop(_REG_UP1SR+2, None)
 
     def _load_img_area_start(self, img_info: ImageInfo, rect: Rectangle):
-        self._send_command_args(Command.LD_IMG_AREA, \
+        self._send_command_args(_CMD_LD_IMG_AREA, \
                                 [img_info.pack_to_u16()] + rect.to_list())
 
     def _load_img_end(self):
-        self._send_command(Command.LD_IMG_END)
+        self._send_command(_CMD_LD_IMG_END)
 
     def set_img_buff_base_address(self, base_address: int):
         if base_address & 0x3FF_FFFF != base_address:
@@ -489,63 +932,338 @@ class it8951:
 
         addr_h = (base_address >> 16) & 0xFFFF
         addr_l = (base_address      ) & 0xFFFF
-        self._write_reg(Register.LISAR,   addr_l)
-        self._write_reg(Register.LISAR+2, addr_h)
+        self._write_reg(_REG_LISAR,   addr_l)
+        self._write_reg(_REG_LISAR+2, addr_h)
+
+    @classmethod
+    def packed_size(cls, bpp: ColorDepth, rect: Rectangle) -> int:
+        """
+        Number of bytes that pack_pixels_into produces for the given area,
+        including the alignment padding
+        """
+        ppw = ColorDepth.pixel_per_word(bpp)
+        row_words = (rect.x % ppw + rect.width + ppw - 1) // ppw
+        return 2*row_words*rect.height
+
+    @classmethod
+    def pack_pixels_into(cls, img_info: ImageInfo, rect: Rectangle, colour, out=None):
+        """
+        Packs one pixel value per element of 'colour' into the byte stream
+        expected by LD_IMG_AREA, in a single pass and without modifying the
+        input. The following alignment rules must be met, so every row is
+        padded with 0 pixels on both sides as needed:
+        1bpp -> start_x % 16 = 0, end_x % 16 = 0
+        2bpp -> start_x % 8 = 0, end_x % 8 = 0
+        3bpp -> start_x % 4 = 0, end_x % 4 = 0
+        4bpp -> start_x % 4 = 0, end_x % 4 = 0
+        8bpp -> start_x % 2 = 0, end_x % 2 = 0
+        Args:
+            img_info: Colour depth and endianness to pack the pixels with
+            rect: Area that the pixels are written to
+            colour: Row-major pixel values (list, bytearray, memoryview...).
+                    At 1bpp only bit 0 is used: 1 is the foreground colour
+                    and 0 the background colour of display_1bpp.
+            out: [Optional] Preallocated buffer of at least packed_size bytes
+        Returns:
+            A memoryview onto the packed bytes, in SPI transfer order
+        """
+        bpp = img_info.bpp
+        if len(colour) != rect.area():
+            raise ValueError("The number of pixels must match the area")
+
+        ppw   = ColorDepth.pixel_per_word(bpp)
+        slot  = 16 // ppw
+        # 3bpp pixels sit in the upper 3 bits of a nibble: |P[n] 0|
+        shift = 1 if bpp == _BPP_3BIT else 0
+        vmask = (1 << (slot - shift)) - 1
+        start_pad = rect.x % ppw
+
+        size = cls.packed_size(bpp, rect)
+        if out is None:
+            out = bytearray(size)
+        elif len(out) < size:
+            raise ValueError("Output buffer is too small")
+
+        # Words go on the wire MSB first. Big endian swaps the 2 bytes
+        hi = 1 if img_info.endianness == _ENDIAN_BIG else 0
+        lo = 1 - hi
+
+        width = rect.width
+        # Pixels of the first (partially padded) word of every row
+        head = min(width, (ppw - start_pad) % ppw)
+        # Whole words in the middle of every row, packed ppw pixels at a time
+        body = (width - head) // ppw
+        tail = width - head - body*ppw
+        s1 = slot + shift
+        i = 0
+        o = 0
+        for _ in range(rect.height):
+            if head:
+                word = 0
+                for n in range(start_pad, start_pad + head):
+                    word |= (colour[i] & vmask) << (n*slot + shift)
+                    i += 1
+                out[o+hi] = word >> 8
+                out[o+lo] = word & 0xFF
+                o += 2
+            # The common depths write both bytes straight from the pixels
+            if ppw == 4:
+                for _ in range(body):
+                    out[o+hi] = ((colour[i+3] & vmask) << s1) | ((colour[i+2] & vmask) << shift)
+                    out[o+lo] = ((colour[i+1] & vmask) << s1) | ((colour[i] & vmask) << shift)
+                    i += 4
+                    o += 2
+            elif ppw == 2:
+                for _ in range(body):
+                    out[o+hi] = colour[i+1] & 0xFF
+                    out[o+lo] = colour[i] & 0xFF
+                    i += 2
+                    o += 2
+            else:
+                for _ in range(body):
+                    word = 0
+                    for n in range(ppw):
+                        word |= (colour[i+n] & vmask) << (n*slot)
+                    out[o+hi] = word >> 8
+                    out[o+lo] = word & 0xFF
+                    i += ppw
+                    o += 2
+            if tail:
+                word = 0
+                for n in range(tail):
+                    word |= (colour[i] & vmask) << (n*slot + shift)
+                    i += 1
+                out[o+hi] = word >> 8
+                out[o+lo] = word & 0xFF
+                o += 2
+        return memoryview(out)[:size]
 
     @classmethod
     def pack_pixels(cls, img_info: ImageInfo, rect: Rectangle, colour: list) -> list:
-        # TODO: Generalise it to other bpps
-        # The following alignment rules must be met:
-        # 2bpp -> start_x % 8 = 0, end_x % 8 = 0
-        # 4bpp -> start_x % 4 = 0, end_x % 4 = 0
-        # 8bpp -> start_x % 2 = 0, end_x % 2 = 0
-        pix_per_byte = ColorDepth.pixel_per_byte(img_info.bpp)
-
-        words = []
-        if img_info.bpp == ColorDepth.BPP_4BIT and img_info.endianness == Endianness.LITTLE:
-            start_mod = rect.x % 4
-            end_mod   = (rect.x + rect.width) % 4
-
-            start_padding = start_mod if start_mod != 0 else 0
-            end_padding   = 4 - end_mod if end_mod != 0 else 0
-
-            # Loop backwards on the list to not mess up indices
-            for row in range(rect.height-1, -1, -1):
-                idx = (row+1)*rect.width
-                colour[idx:idx] = [0]*end_padding
-                idx = row*rect.width
-                colour[idx:idx] = [0]*start_padding
-
-        for i in range(0, len(colour), 4):
-            words.append(colour[i] | (colour[i+1] << 4) | (colour[i+2] << 8) | (colour[i+3] << 12))
-        return words
-
-    def write_packed_pixels(self, img_info: ImageInfo, rect: Rectangle, data):
+        """
+        List-of-u16 flavour of pack_pixels_into, for use with _write_data
+        """
+        packed = cls.pack_pixels_into(img_info, rect, colour)
+        return [(packed[i] << 8) | packed[i+1] for i in range(0, len(packed), 2)]
+
+    @_traced
+    def write_packed_pixels(self, img_info: ImageInfo, rect: Rectangle, data,
+                            stride: int = None):
         """
         Writes the specified pixels to the IT8951's internal frame buffer but
         does not render the image on the screen. Call display_area after writing
-        the pixels to display on the EPD
+        the pixels to display on the EPD. The pixels are sent at img_info's
+        depth as given, see ShadowFrameBuffer for automatic depth selection.
         Args:
             rect: Rectangle to colour with the specified pixels. The area of the
                   rectangle must match the number of pixels in the colour list
-            colour: List of pixels to write to the area defined by 'rect'.
+            data: Packed pixels of the area, as a list of u16 words or any
+                  buffer-protocol object (bytearray, bytes, memoryview,
+                  array...) holding the bytes in SPI transfer order
+            stride: [Optional] Bytes between the starts of consecutive rows in
+                    data, if the area is part of a larger packed framebuffer.
+                    data must then start at the area's first word, see
+                    packed_view.
         """
-        if img_info.bpp == ColorDepth.BPP_1BIT: 
-            raise NotImplementedError("The feature is not supported")
         if not rect.is_contained_within(self.panel_area):
             raise ValueError("Area outside the display's limits")
-
-        self._load_img_area_start(img_info, rect)
+        mv = None
         if isinstance(data, list):
+            if stride is not None:
+                raise TypeError("Strided data must be a buffer")
+        else:
+            try:
+                mv = self._byte_view(data)
+            except TypeError:
+                raise TypeError("data argument must be a list or a buffer")
+            row_bytes = self.packed_size(img_info.bpp, Rectangle(rect.x, 0, rect.width, 1))
+            if stride is not None and len(mv) < (rect.height - 1)*stride + row_bytes:
+                raise ValueError("The buffer is smaller than the strided area")
+
+        self._load_img_area_start(*self._load_area(img_info, rect))
+        if mv is None:
             self._write_data(data)
-        elif isinstance(data, bytearray):
-            self._write_bytes(data)
+        elif stride is None:
+            self._write_bytes(mv)
+        elif stride == row_bytes:
+            # The rows are contiguous
+            self._write_bytes(mv[:rect.height*row_bytes])
         else:
-            raise TypeError("data argument must be a list or a bytearray")
+            self._write_rows(mv, row_bytes, stride, rect.height)
         self._load_img_end()
 
-    def load_bmp(self, x: int, y: int, img: str):
-        with open(img, 'rb') as f:
+    @classmethod
+    def packed_view(cls, buf, bpp: ColorDepth, stride: int, rect: Rectangle) -> memoryview:
+        """
+        Returns a memoryview of a packed framebuffer, whose pixel (0, 0) is
+        the panel's, that starts at the first word of rect. Pass it to
+        write_packed_pixels with the same stride to upload the area without
+        copying it. The framebuffer's rows must be packed for LD_IMG_AREA,
+        e.g. ShadowFrameBuffer.buf, or a framebuf.GS8 buffer with big endian
+        ImageInfo. (GS4_HMSB stores pixel 0 in the high nibble, which no
+        4bpp IT8951 layout does.)
+        """
+        offset = rect.y*stride + (rect.x // ColorDepth.pixel_per_word(bpp))*2
+        return cls._byte_view(buf)[offset:]
+
+    @staticmethod
+    def _load_area(img_info: ImageInfo, rect: Rectangle) -> tuple:
+        """
+        Returns the ImageInfo and Rectangle that LD_IMG_AREA loads an area
+        with. 1bpp pixels are loaded 8 at a time as 8bpp pixels, so that
+        x/8 and w/8 address the bytes of the 1bpp bitmap in the image buffer.
+        """
+        if img_info.bpp != _BPP_1BIT:
+            return img_info, rect
+        x = rect.x // 8
+        return ImageInfo(img_info.endianness, _BPP_8BIT, img_info.rotation), \
+               Rectangle(x, rect.y, (rect.x + rect.width + 7) // 8 - x, rect.height)
+
+    def _set_bitmap_mode(self, enable: bool):
+        """
+        Switches the display commands between the grayscale and the 1bpp
+        bitmap interpretation of the image buffer. The mode is read by the
+        running refreshes too, so the LUT engines must be idle first.
+        """
+        if self._bitmap_mode == enable:
+            return
+        self._wait_for_display_ready()
+        up1sr = self._read_reg(_REG_UP1SR+2)
+        if enable:
+            up1sr |= self._BITMAP_MODE_BIT
+        else:
+            up1sr &= ~self._BITMAP_MODE_BIT
+        self._write_reg(_REG_UP1SR+2, up1sr)
+        self._bitmap_mode = enable
+
+    def _chunk_buffer(self, size: int) -> memoryview:
+        """
+        Returns a memoryview of at least 'size' bytes onto the reusable image
+        transfer buffer, growing it only when a larger chunk is requested
+        """
+        if len(self._chunk_buf) < size:
+            self._chunk_buf = bytearray(size)
+        return memoryview(self._chunk_buf)
+
+    @staticmethod
+    def _run_chunks(chunks, buf):
+        """
+        Drives a primed chunk generator (see transfer_pipeline.py) with a
+        single buffer, yielding the number of bytes it put into buf each time
+        """
+        try:
+            while True:
+                yield chunks.send(buf)
+        except StopIteration:
+            return
+
+    def _send_chunks(self, chunks, buf, pipeline):
+        """
+        Sends the chunks of a primed chunk generator, one after the other
+        through buf or overlapped with their production by a pipeline.
+        Yields after every chunk sent without a pipeline.
+        """
+        if pipeline is not None:
+            pipeline.run(chunks, self._write_bytes)
+            return
+        for n in self._run_chunks(chunks, buf):
+            self._write_bytes(buf[:n])
+            yield
+
+    @_traced
+    def load_bmp(self, x: int, y: int, img, chunk_size: int = 4096, pipeline = None):
+        """
+        Streams a BMP image to the IT8951's frame buffer, N rows at a time, in
+        a single image load transaction. Both bottom-up and top-down images are
+        supported and the 4-byte BMP row padding is stripped on the fly. The
+        pixel layout must already match the IT8951's little endian packing,
+        except at 1bpp: such images are loaded as bitmaps for display_1bpp,
+        with the pixels of the palette's darker colour as the foreground.
+        The image is sent at the file's depth: finding a lower one would need
+        a second read of the file, as its palette is only known once all of
+        it was streamed.
+        Args:
+            x, y: Top-left corner of the image on the display. x must be a
+                  multiple of 16 for 1bpp images.
+            img: Path to the BMP file, or a file object opened in binary mode
+            chunk_size: [Optional] Maximum number of bytes held in RAM at once.
+                        At least one row is always buffered.
+            pipeline: [Optional] TransferPipeline that reads the next chunk
+                      while the current one is clocked out. Its chunk size
+                      replaces chunk_size.
+        Returns:
+            The Rectangle that the image was loaded to
+        """
+        chunks = self._load_bmp_chunks(x, y, img, chunk_size, pipeline)
+        rect = next(chunks)
+        for _ in chunks:
+            pass
+        return rect
+
+    @staticmethod
+    def _bmp_rows(f, pix_arr_offset: int, stride: int, row_bytes: int, height: int,
+                  top_down: bool, table: bytes = None):
+        """
+        Chunk generator that reads the BMP's rows top to bottom, as many whole
+        rows per buffer as fit. Every byte read is mapped through table, if
+        one is given.
+        """
+        out = yield
+        pos = -1
+        row = 0
+        while row < height:
+            n = min(len(out) // row_bytes, height - row)
+            if n == 0:
+                raise ValueError("The chunk size must hold at least one row")
+            # Walk the file forwards so that seeks are only needed to skip
+            # the row padding and at chunk boundaries
+            for k in (range(n) if top_down else range(n-1, -1, -1)):
+                file_row = row + k if top_down else height - 1 - row - k
+                offset = pix_arr_offset + file_row*stride
+                if offset != pos:
+                    f.seek(offset)
+                if f.readinto(out[k*row_bytes:(k+1)*row_bytes]) != row_bytes:
+                    raise ValueError("BMP pixel array is truncated")
+                pos = offset + row_bytes
+            if table is not None:
+                for i in range(n*row_bytes):
+                    out[i] = table[out[i]]
+            row += n
+            out = yield n*row_bytes
+
+    @staticmethod
+    def _bmp_1bpp_table(f, dib_size: int) -> bytes:
+        """
+        Byte map from a 1bpp BMP row to the IT8951's bitmap: BMP pixels are
+        MSB first, the IT8951's LSB first. The bits are also inverted if the
+        BMP's palette makes 1 the lighter colour, as the IT8951 shows 1 in
+        display_1bpp's (dark by default) foreground colour.
+        """
+        # The colour table follows the DIB header. BITMAPCOREHEADER (12
+        # bytes) has 3 byte entries, the later headers 4 byte ones
+        entry = 3 if dib_size == 12 else 4
+        f.seek(14 + dib_size)
+        palette = f.read(2*entry)
+        invert = 0
+        if len(palette) == 2*entry and \
+           sum(palette[entry:entry+3]) > sum(palette[0:3]):
+            invert = 0xFF
+        table = bytearray(256)
+        for b in range(256):
+            r = 0
+            for i in range(8):
+                r |= ((b >> i) & 1) << (7 - i)
+            table[b] = r ^ invert
+        return bytes(table)
+
+    def _load_bmp_chunks(self, x: int, y: int, img, chunk_size: int, pipeline = None):
+        """
+        Generator behind load_bmp. It first yields the Rectangle of the image,
+        then once after every chunk it sent, so that it8951_async can hand
+        control back to the event loop.
+        """
+        f = open(img, 'rb') if isinstance(img, str) else img
+        try:
             # Handle lazyness. See https://en.wikipedia.org/wiki/BMP_file_format)
             if f.read(2) != b'BM':
                 raise ValueError("BMP must have Windows (BM) bitmap header")
@@ -555,27 +1273,224 @@ class it8951:
             pix_arr_offset = int.from_bytes(f.read(4), 'little')
 
             # byte [18:21] encodes the bitmap width in pixels
-            # byte [22:25] encodes the bitmap height in pixels
+            # byte [22:25] encodes the bitmap height in pixels. Negative height
+            # means that the rows are stored top-down
             f.seek(18) 
             width = int.from_bytes(f.read(4), 'little')
             height = int.from_bytes(f.read(4), 'little')
+            top_down = height & 0x8000_0000 != 0
+            if top_down:
+                height = (1 << 32) - height
 
             # byte [28:29] encodes the bpp of the image
             f.seek(28)
             bpp = int.from_bytes(f.read(2), 'little')
 
-            buf = bytearray(int(width*height/(8/bpp)))
+            depth = ColorDepth.bpp_to_code(bpp)
+            if depth is None:
+                raise ValueError(f"Unsupported BMP colour depth: {bpp}bpp")
+            rect = Rectangle(x, y, width, height)
+            if not rect.is_contained_within(self.panel_area):
+                raise ValueError("Area outside the display's limits")
+            table = None
+            endianness = _ENDIAN_LITTLE
+            if depth == _BPP_1BIT:
+                # The rows are sent as they are read, so they must start on
+                # a word of the bitmap's x/8 load area
+                if x % 16:
+                    raise ValueError("1bpp BMPs must be loaded to an x that is a multiple of 16")
+                f.seek(14)
+                table = self._bmp_1bpp_table(f, int.from_bytes(f.read(4), 'little'))
+                # Keeps the bytes of every word in file order
+                endianness = _ENDIAN_BIG
+
+            # BMP rows are padded to 4 bytes, the IT8951 expects whole u16 words
+            stride    = ((width*bpp + 31) // 32) * 4
+            row_bytes = ((width*bpp + 15) // 16) * 2
+            buf = None
+            if pipeline is None:
+                rows_per_chunk = max(1, chunk_size // row_bytes)
+                buf = self._chunk_buffer(rows_per_chunk*row_bytes)[:rows_per_chunk*row_bytes]
+            elif pipeline.chunk_size < row_bytes:
+                raise ValueError("The chunk size must hold at least one row")
+            chunks = self._bmp_rows(f, pix_arr_offset, stride, row_bytes, height, top_down, table)
+            next(chunks)
 
-            f.seek(pix_arr_offset)
-            f.readinto(buf)
+            img_info = ImageInfo(endianness, depth, _ROTATE_0)
+            yield rect
+            self._load_img_area_start(*self._load_area(img_info, rect))
+            try:
+                yield from self._send_chunks(chunks, buf, pipeline)
+            finally:
+                chunks.close()
+                self._load_img_end()
+        finally:
+            if f is not img:
+                f.close()
 
-        rect = Rectangle(x, y, width, height)
-        img_info = ImageInfo(Endianness.LITTLE, ColorDepth.bpp_to_code(bpp), RotateMode.ROTATE_0)
-        self.write_packed_pixels(img_info, rect, buf)
+    @_traced
+    def load_asset(self, x: int, y: int, asset, tile: int = 0, chunk_size: int = 4096,
+                   pipeline = None):
+        """
+        Streams a panel asset (see panel_asset.py) to the IT8951's frame
+        buffer. Its pixels are already packed, so they go from the file to
+        the SPI bus without being touched. Compressed tiles are decoded
+        straight into the transfer buffer, chunk_size bytes at a time. The
+        depth is the one asset_convert.py was given when building the asset.
+        Args:
+            x, y: Top-left corner of the tile on the display. x % the
+                  asset's pixels per word must match its x phase.
+            asset: Path to the asset file, or a file object opened in binary
+                   mode
+            tile: [Optional] Index of the tile to load
+            chunk_size: [Optional] Maximum number of bytes held in RAM at once
+            pipeline: [Optional] See load_bmp
+        Returns:
+            The Rectangle that the tile was loaded to
+        """
+        chunks = self._load_asset_chunks(x, y, asset, tile, chunk_size, pipeline)
+        rect = next(chunks)
+        for _ in chunks:
+            pass
+        return rect
 
-    def display_area(self, rect: Rectangle, display_mode: DisplayMode):
+    def _load_asset_chunks(self, x: int, y: int, asset, tile: int, chunk_size: int,
+                           pipeline = None):
+        """
+        Generator behind load_asset, see _load_bmp_chunks
+        """
+        # Only pulled in by the boards that use assets
+        from panel_asset import AssetHeader
+        f = open(asset, 'rb') if isinstance(asset, str) else asset
+        try:
+            header = AssetHeader.from_bytes(f.read(AssetHeader.Size))
+            rect = header.tile_rect(x, y)
+            if not rect.is_contained_within(self.panel_area):
+                raise ValueError("Area outside the display's limits")
+            buf = None
+            if pipeline is None:
+                # Whole u16 words only
+                chunk_size = max(2, chunk_size & ~1)
+                buf = self._chunk_buffer(chunk_size)[:chunk_size]
+            chunks = header.tile_chunks(f, tile)
+            next(chunks)
+            yield rect
+            self._load_img_area_start(*self._load_area(header.img_info(), rect))
+            try:
+                yield from self._send_chunks(chunks, buf, pipeline)
+            finally:
+                chunks.close()
+                self._load_img_end()
+        finally:
+            if f is not asset:
+                f.close()
+
+    @_traced
+    def draw_text(self, x: int, y: int, text: str, atlas, cache = None) -> Rectangle:
+        """
+        Loads a line of text to the IT8951's frame buffer from a glyph atlas
+        (see glyph_atlas.py). The glyphs are copied into the transfer buffer
+        row by row, nothing is rasterised on the device. Text from a 1bpp
+        atlas must be shown with display_1bpp.
+        Args:
+            x, y: Top-left corner of the line on the display. x must be a
+                  multiple of the atlas' pixels per byte.
+            text: Line of text
+            atlas: GlyphAtlas of the font
+            cache: [Optional] GlyphCache that keeps the hot glyphs in RAM
+        Returns:
+            The Rectangle that the text was loaded to
+        """
+        img_info, rect, data = self._render_text(x, y, text, atlas, cache)
+        if data is not None:
+            it8951.write_packed_pixels(self, img_info, rect, data)
+        return rect
+
+    def _render_text(self, x: int, y: int, text: str, atlas, cache):
+        """
+        Renders a line of text into the transfer buffer, see draw_text
+        Returns:
+            The ImageInfo, Rectangle and packed pixels of the line. The pixels
+            are None for an empty line.
+        """
+        # Only pulled in by the boards that draw text
+        from glyph_atlas import render_line, text_width
+        width = text_width(atlas, text)
+        rect = Rectangle(x, y, width, atlas.height)
+        if not rect.is_contained_within(self.panel_area):
+            raise ValueError("Area outside the display's limits")
+        if width == 0:
+            return None, rect, None
+        size = self.packed_size(atlas.bpp, rect)
+        img_info, _, data = render_line(atlas, text, x, cache, self._chunk_buffer(size))
+        return img_info, rect, data
+
+    @_traced
+    def display_area(self, rect: Rectangle, display_mode: DisplayMode, wait: bool = True):
         """
         Displays the pixels loaded to the frame buffer to the specified area
+        Args:
+            rect: Area to refresh
+            display_mode: Waveform to refresh the area with
+            wait: [Optional] False issues the refresh without waiting for the
+            LUT engines to go idle. The caller must then make sure that the
+            area's pixels aren't overwritten while an earlier refresh of it is
+            still running, e.g. with UpdateQueue.
         """
-        self._wait_for_display_ready()
-        self._send_command_args(Command.DPY_AREA, rect.to_list() + [display_mode])
+        if wait:
+            self._wait_for_display_ready()
+        self._set_bitmap_mode(False)
+        if self.wake_to_first_pixel_us is None: self._first_pixel()
+        self._send_command_args(_CMD_DPY_AREA, rect.to_list() + [display_mode])
+
+    @_traced
+    def display_buffer_area(self, rect: Rectangle, display_mode: DisplayMode,
+                            base_address: int, wait: bool = True):
+        """
+        Displays an area from the image buffer at base_address instead of the
+        default one, e.g. a back buffer that was loaded after pointing
+        set_img_buff_base_address at it
+        Args:
+            rect, display_mode, wait: See display_area
+            base_address: SDRAM address of the image buffer to display from
+        """
+        if base_address & 0x3FF_FFFF != base_address:
+            raise ValueError("Base address must be maximum 26 bits")
+        if wait:
+            self._wait_for_display_ready()
+        self._set_bitmap_mode(False)
+        self._display_buffer_area(rect, display_mode, base_address)
+
+    def _display_buffer_area(self, rect: Rectangle, display_mode: DisplayMode, base_address: int):
+        if self.wake_to_first_pixel_us is None: self._first_pixel()
+        self._send_command_args(_CMD_DPY_BUF_AREA, rect.to_list() + \
+            [display_mode, base_address & 0xFFFF, (base_address >> 16) & 0xFFFF])
+
+    @_traced
+    def display_1bpp(self, rect: Rectangle, display_mode: DisplayMode = _MODE_A2,
+                     foreground: int = 0x00, background: int = 0xF0,
+                     base_address: int = None, wait: bool = True):
+        """
+        Displays an area that was loaded with 1bpp pixels. Bitmaps are meant
+        for the black and white waveforms (A2, DU). Switching between bitmap
+        and grayscale refreshes waits for the LUT engines to go idle.
+        Note that the bitmap of an area occupies columns x/8 to (x+w)/8 of
+        the 8bpp image buffer, so it overwrites the grayscale image there.
+        Args:
+            rect: Area to refresh
+            display_mode: [Optional] Waveform to refresh the area with
+            foreground: [Optional] 8bpp grey level of the 1 pixels
+            background: [Optional] 8bpp grey level of the 0 pixels
+            base_address: [Optional] Image buffer to display from, if not the
+            IT8951's default one
+            wait: [Optional] See display_area
+        """
+        if not (0 <= foreground <= 0xFF and 0 <= background <= 0xFF):
+            raise ValueError("Grey levels must be 8 bit values")
+        if base_address is None:
+            base_address = self.device_info.img_buff_addr
+        if wait:
+            self._wait_for_display_ready()
+        self._set_bitmap_mode(True)
+        self._write_reg(_REG_BGVR, (foreground << 8) | background)
+        self._display_buffer_area(rect, display_mode, base_address)
@@ -0,0 +1,237 @@
+import asyncio
+from it8951 import *
+from it8951 import _ticks_us, _ticks_diff
+
+if hasattr(asyncio, "sleep_ms"):
+    _sleep_ms = asyncio.sleep_ms
+else:
+    def _sleep_ms(ms: int):
+        return asyncio.sleep(ms/1000)
+
+class it8951_async(it8951):
+    """
+    asyncio flavour of the driver. The long waits, i.e. HRDY before a
+    transfer, LUTAFSR before a refresh and the gaps between image chunks,
+    hand control back to the event loop instead of spinning, so that e.g. the
+    WiFi calendar sync can run while the panel refreshes.
+
+    The coroutines are named after the it8951 methods they wrap, with an
+    _async suffix. Every it8951 method is inherited unchanged, so helpers
+    such as ShadowFrameBuffer, UpdateQueue or EpdDisplay work with this class
+    too, blocking as they do with it8951. Register accesses and other short
+    commands stay synchronous: HRDY only drops for microseconds around them.
+    The coroutines hold a lock so that concurrent tasks can't interleave
+    their commands with an image load that yielded half way. The synchronous
+    methods don't take it, so they must not be called while a coroutine
+    runs.
+    """
+    # Bounds of the exponential backoff between LUTAFSR polls
+    _LUT_POLL_MIN_MS = 1
+    _LUT_POLL_MAX_MS = 32
+
+    def __init__(self, spi: SPI, ncs: Pin, hrdy: Pin, vcom_mV, timeout_ms: int = 5000,
+                 hrdy_irq: bool = False, **kwargs):
+        """
+        Args:
+            spi, ncs, hrdy, vcom_mV: See it8951
+            timeout_ms: [Optional] Time after which a wait for HRDY or the LUT
+                        engines raises asyncio.TimeoutError. None waits forever
+            hrdy_irq: [Optional] True waits for HRDY's rising edge through a
+                      pin interrupt (MicroPython only). False polls it,
+                      yielding to the event loop between reads.
+            kwargs: Passed to it8951, e.g. strict_hrdy or state_store
+        """
+        self.timeout_ms = timeout_ms
+        self._lock = asyncio.Lock()
+        self._hrdy_flag = None
+        if hrdy_irq:
+            if not hasattr(asyncio, "ThreadSafeFlag"):
+                raise NotImplementedError("HRDY interrupts need MicroPython's asyncio")
+            flag = self._hrdy_flag = asyncio.ThreadSafeFlag()
+            hrdy.irq(trigger=Pin.IRQ_RISING, handler=lambda _: flag.set())
+        super().__init__(spi, ncs, hrdy, vcom_mV, **kwargs)
+
+    def _expired(self, t_start: int, timeout_ms) -> bool:
+        return timeout_ms is not None and \
+               _ticks_diff(_ticks_us(), t_start) >= timeout_ms*1000
+
+    async def wait_ready(self, timeout_ms = -1):
+        """
+        Waits for HRDY without blocking the event loop
+        Args:
+            timeout_ms: [Optional] Overrides the instance's timeout_ms
+        """
+        if self._hrdy.value():
+            return
+        if timeout_ms == -1:
+            timeout_ms = self.timeout_ms
+        t_start = _ticks_us()
+        while not self._hrdy.value():
+            if self._expired(t_start, timeout_ms):
+                raise asyncio.TimeoutError
+            if self._hrdy_flag is not None:
+                # The flag may be left over from an earlier edge, hence the loop
+                if timeout_ms is None:
+                    await self._hrdy_flag.wait()
+                else:
+                    try:
+                        await asyncio.wait_for_ms(self._hrdy_flag.wait(), timeout_ms)
+                    except asyncio.TimeoutError:
+                        pass
+            else:
+                await _sleep_ms(0)
+
+    async def wait_display_ready(self, timeout_ms = -1):
+        """
+        Waits for every LUT engine to go idle, polling LUTAFSR with an
+        exponential backoff
+        Args:
+            timeout_ms: [Optional] Overrides the instance's timeout_ms
+        """
+        if timeout_ms == -1:
+            timeout_ms = self.timeout_ms
+        t_start = _ticks_us()
+        delay_ms = self._LUT_POLL_MIN_MS
+        while True:
+            await self.wait_ready(timeout_ms)
+            if self.lut_status() == 0:
+                return
+            if self._expired(t_start, timeout_ms):
+                raise asyncio.TimeoutError
+            await _sleep_ms(delay_ms)
+            delay_ms = min(2*delay_ms, self._LUT_POLL_MAX_MS)
+
+    async def display_area_async(self, rect: Rectangle, display_mode: DisplayMode,
+                                 wait: bool = True):
+        """
+        See it8951.display_area
+        """
+        async with self._lock:
+            # Leaving the bitmap mode waits for the LUT engines as well
+            if wait or self._bitmap_mode is not False:
+                await self.wait_display_ready()
+            await self.wait_ready()
+            self.display_area(rect, display_mode, wait=False)
+
+    async def display_buffer_area_async(self, rect: Rectangle, display_mode: DisplayMode,
+                                        base_address: int, wait: bool = True):
+        """
+        See it8951.display_buffer_area
+        """
+        async with self._lock:
+            if wait or self._bitmap_mode is not False:
+                await self.wait_display_ready()
+            await self.wait_ready()
+            self.display_buffer_area(rect, display_mode, base_address, wait=False)
+
+    async def display_1bpp_async(self, rect: Rectangle, display_mode: DisplayMode = DisplayMode.A2,
+                                 foreground: int = 0x00, background: int = 0xF0,
+                                 base_address: int = None, wait: bool = True):
+        """
+        See it8951.display_1bpp
+        """
+        async with self._lock:
+            if wait or self._bitmap_mode is not True:
+                await self.wait_display_ready()
+            await self.wait_ready()
+            self.display_1bpp(rect, display_mode, foreground, background, base_address, wait=False)
+
+    async def fill_rect_async(self, rect: Rectangle, mode: DisplayMode, colour: int):
+        """
+        See it8951.fill_rect
+        """
+        async with self._lock:
+            if self._bitmap_mode is not False:
+                await self.wait_display_ready()
+            await self.wait_ready()
+            self.fill_rect(rect, mode, colour)
+
+    async def write_packed_pixels_async(self, img_info: ImageInfo, rect: Rectangle, data,
+                                        chunk_size: int = 4096, stride: int = None):
+        """
+        See it8951.write_packed_pixels. Buffers are sent chunk_size bytes (or
+        with a stride, one row) at a time, yielding to the event loop in
+        between. chunk_size must be even as the IT8951 takes whole u16 words.
+        """
+        if chunk_size <= 0 or chunk_size % 2:
+            raise ValueError("The chunk size must be a positive even number")
+        async with self._lock:
+            await self.wait_ready()
+            if isinstance(data, list):
+                self.write_packed_pixels(img_info, rect, data, stride)
+                return
+            await self._write_chunks(img_info, rect, data, chunk_size, stride)
+
+    async def _write_chunks(self, img_info: ImageInfo, rect: Rectangle, data,
+                            chunk_size: int, stride: int):
+        """
+        Body of write_packed_pixels_async for buffers. The caller holds the lock.
+        """
+        if not rect.is_contained_within(self.panel_area):
+            raise ValueError("Area outside the display's limits")
+        mv = self._byte_view(data)
+        if stride is None:
+            step, length = chunk_size, len(mv)
+        else:
+            step = stride
+            length = rect.height*stride
+            chunk_size = self.packed_size(img_info.bpp, Rectangle(rect.x, 0, rect.width, 1))
+            if len(mv) < length - stride + chunk_size:
+                raise ValueError("The buffer is smaller than the strided area")
+        self._load_img_area_start(*self._load_area(img_info, rect))
+        try:
+            for i in range(0, length, step):
+                await self.wait_ready()
+                self._write_bytes(mv[i:i + chunk_size])
+                await _sleep_ms(0)
+        finally:
+            self._load_img_end()
+
+    async def draw_text_async(self, x: int, y: int, text: str, atlas, cache = None,
+                              chunk_size: int = 4096) -> Rectangle:
+        """
+        See it8951.draw_text. The line is rendered and sent under the lock, as
+        it is rendered into the transfer buffer that the other loads share.
+        Yields to the event loop after every chunk.
+        """
+        if chunk_size <= 0 or chunk_size % 2:
+            raise ValueError("The chunk size must be a positive even number")
+        async with self._lock:
+            await self.wait_ready()
+            img_info, rect, data = self._render_text(x, y, text, atlas, cache)
+            if data is not None:
+                await self._write_chunks(img_info, rect, data, chunk_size, None)
+            return rect
+
+    async def load_bmp_async(self, x: int, y: int, img: str, chunk_size: int = 4096):
+        """
+        See it8951.load_bmp. Yields to the event loop after every chunk.
+        """
+        async with self._lock:
+            await self.wait_ready()
+            chunks = self._load_bmp_chunks(x, y, img, chunk_size)
+            try:
+                rect = next(chunks)
+                for _ in chunks:
+                    await _sleep_ms(0)
+                    await self.wait_ready()
+            finally:
+                # Ends the image load if the task was cancelled
+                chunks.close()
+            return rect
+
+    async def load_asset_async(self, x: int, y: int, asset: str, tile: int = 0, chunk_size: int = 4096):
+        """
+        See it8951.load_asset. Yields to the event loop after every chunk.
+        """
+        async with self._lock:
+            await self.wait_ready()
+            chunks = self._load_asset_chunks(x, y, asset, tile, chunk_size)
+            try:
+                rect = next(chunks)
+                for _ in chunks:
+                    await _sleep_ms(0)
+                    await self.wait_ready()
+            finally:
+                chunks.close()
+            return rect
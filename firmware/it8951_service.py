@@ -0,0 +1,67 @@
+# Rarely used parts of the it8951 driver: the VCOM and temperature commands
+# and the cold start report. The driver imports this module on their first
+# use, so that waking from deep sleep only loads the code of the image and
+# refresh paths, and prints nothing.
+from it8951 import Command, DeviceInfo, it8951
+
+def describe(device_info: DeviceInfo) -> str:
+    return f"Panel width: {device_info.panel_width}\n" + \
+           f"Panel height: {device_info.panel_height}\n" + \
+           f"Image buffer address: {hex(device_info.img_buff_addr)}\n" + \
+           f"Firmware version: {device_info.firmware_version}\n" + \
+           f"LUT version: {device_info.lut_version}"
+
+def get_vcom(tcon: it8951) -> int:
+    vcom_mV = tcon._reg_cache.get(tcon._VCOM_KEY)
+    if vcom_mV is not None:
+        tcon.reg_cache_stats["read_hits"] += 1
+        return vcom_mV
+    tcon._send_command_args(Command.CMD_VCOM, [0])
+    vcom_mV = -tcon._read_words(1)[0]
+    tcon._reg_cache[tcon._VCOM_KEY] = vcom_mV
+    return vcom_mV
+
+def set_vcom(tcon: it8951, vcom_mV: int, store_to_flash: bool):
+    if vcom_mV >= 0: raise Exception("VCOM must be negative")
+    if not store_to_flash and tcon._cache_hit(tcon._VCOM_KEY, vcom_mV):
+        return
+    arg = 2 if store_to_flash else 1
+    # VCOM must be written as -1.58 = 1580 = 0x62C -> [0x06, 0x2C]
+    tcon._send_command_args(Command.CMD_VCOM, [arg, abs(vcom_mV)])
+    tcon._reg_cache[tcon._VCOM_KEY] = vcom_mV
+
+def cold_start_vcom(tcon: it8951, vcom_mV) -> int:
+    """
+    Prints the panel's parameters and VCOM after a cold start, and sets
+    vcom_mV if it is given and differs
+    Returns:
+        The VCOM read back from the IT8951 in mV
+    """
+    print("Initialised IT8951 (cold start)")
+    print(describe(tcon.device_info))
+    rxvcom_mV = get_vcom(tcon)
+    print(f"Current VCOM = {rxvcom_mV/1000}")
+
+    if vcom_mV is not None and vcom_mV != rxvcom_mV:
+        print(f"Settig VCOM to the new value: {vcom_mV/1000}... ", end='')
+        set_vcom(tcon, vcom_mV, False)
+        # Read back from the IT8951 rather than the cache
+        tcon._reg_cache.pop(tcon._VCOM_KEY, None)
+        rxvcom_mV = get_vcom(tcon)
+        print("Success" if rxvcom_mV == vcom_mV else "Failed")
+    return rxvcom_mV
+
+def force_set_temperature(tcon: it8951, temperature_C: int):
+    if tcon._cache_hit(tcon._TEMP_KEY, temperature_C):
+        return
+    tcon._send_command_args(Command.CMD_TEMPERATURE, [1, temperature_C])
+    tcon._reg_cache[tcon._TEMP_KEY] = temperature_C
+
+def get_temperature(tcon: it8951) -> list:
+    tcon._send_command_args(Command.CMD_TEMPERATURE, [0])
+    # TODO: The datasheet is ambiguous on the order of the real and forced T
+    return tcon._read_data(2)
+
+def cancel_force_temperature(tcon: it8951):
+    tcon._send_command_args(Command.CMD_TEMPERATURE, [2])
+    tcon._reg_cache.pop(tcon._TEMP_KEY, None)
@@ -0,0 +1,214 @@
+from it8951 import *
+
+def rgb332_lut() -> bytearray:
+    """
+    Maps the 256 colours of LVGL's 8 bit colour depth (RGB332: red in bits
+    7-5, green in bits 4-2, blue in bits 1-0) to 4 bit grey levels with the
+    BT.601 luma weights
+    """
+    lut = bytearray(256)
+    for c in range(256):
+        r = (c >> 5)*255 // 7
+        g = ((c >> 2) & 7)*255 // 7
+        b = (c & 3)*255 // 3
+        luma = (299*r + 587*g + 114*b) // 1000
+        lut[c] = (luma + 8) // 17
+    return lut
+
+def convert(pixels, rect: Rectangle, lut, out) -> int:
+    """
+    Converts 8 bit pixels to grey levels and packs them for LD_IMG_AREA at
+    4bpp big endian, where byte k of a row holds pixel 2k in its low nibble
+    and pixel 2k+1 in its high nibble. The bytes that pad the rows to whole
+    words are left as they are, as the IT8951 doesn't load them.
+    Args:
+        pixels: Row-major 8 bit pixels of rect
+        rect: Area that the pixels are written to
+        lut: 256 byte table of the grey level (0-15) of every pixel value
+        out: Buffer of at least it8951.packed_size bytes
+    Returns:
+        Number of packed bytes
+    """
+    width = rect.width
+    pad = rect.x % 4
+    row_bytes = it8951.packed_size(ColorDepth.BPP_4BIT, Rectangle(rect.x, 0, width, 1))
+    size = row_bytes*rect.height
+    if len(out) < size:
+        raise ValueError("Output buffer is too small")
+    i = 0
+    for row in range(rect.height):
+        o = row*row_bytes + pad // 2
+        n = width
+        if pad & 1 and n:
+            out[o] = lut[pixels[i]] << 4
+            i += 1
+            o += 1
+            n -= 1
+        for _ in range(n >> 1):
+            out[o] = lut[pixels[i]] | (lut[pixels[i+1]] << 4)
+            i += 2
+            o += 1
+        if n & 1:
+            out[o] = lut[pixels[i]]
+            i += 1
+    return size
+
+def round_area(x1: int, x2: int, max_x: int) -> tuple:
+    """
+    Widens an inclusive LVGL area's x range to whole 4bpp words (4 pixels),
+    so that its rows are packed without padding
+    """
+    return x1 & ~3, min(x2 | 3, max_x)
+
+def merge(a: Rectangle, b: Rectangle) -> Rectangle:
+    """
+    Returns the union of two areas if it is a rectangle itself, i.e. they
+    are touching bands of the same width or height, otherwise None
+    """
+    if a.x == b.x and a.width == b.width and \
+       a.y <= b.y + b.height and b.y <= a.y + a.height:
+        y = min(a.y, b.y)
+        return Rectangle(a.x, y, a.width, max(a.y + a.height, b.y + b.height) - y)
+    if a.y == b.y and a.height == b.height and \
+       a.x <= b.x + b.width and b.x <= a.x + a.width:
+        x = min(a.x, b.x)
+        return Rectangle(x, a.y, max(a.x + a.width, b.x + b.width) - x, a.height)
+    return None
+
+class EpdDisplay:
+    """
+    LVGL display driver on top of it8951, for lv_micropython built with
+    LV_COLOR_DEPTH=8. LVGL renders the invalidated areas into a partial draw
+    buffer of a few lines and flushes it band by band. Every band is
+    converted to 4bpp grey and uploaded to the image buffer straight away,
+    so no full frame is held in RAM, while the refreshes are held back until
+    the last flush of the render cycle. The bands of an area are then merged
+    back and each merged area is refreshed with one display_area.
+    """
+    def __init__(self, tcon: it8951, mode: DisplayMode = DisplayMode.GL16, queue = None,
+                 lut = None):
+        """
+        Args:
+            tcon: Initialised IT8951 driver
+            mode: [Optional] Waveform that the flushed areas are refreshed with
+            queue: [Optional] UpdateQueue that the uploads and refreshes go
+                   through, so that the next render cycle's uploads overlap
+                   with this cycle's refreshes
+            lut: [Optional] 256 byte table of the grey level of every LVGL
+                 colour. Defaults to rgb332_lut().
+        """
+        self._tcon = tcon
+        self.mode  = mode
+        self.queue = queue
+        self.lut   = lut if lut is not None else rgb332_lut()
+        if len(self.lut) != 256:
+            raise ValueError("The colour table must have 256 entries")
+        self.img_info = ImageInfo(Endianness.BIG, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+        self._out = bytearray(0)
+        # Areas uploaded in this render cycle and not refreshed yet
+        self._pending = []
+        self.stats = {"flushes": 0, "bytes": 0, "refreshes": 0}
+
+    def flush(self, x1: int, y1: int, x2: int, y2: int, pixels, last: bool = True) -> list:
+        """
+        Uploads one band of LVGL's draw buffer
+        Args:
+            x1, y1, x2, y2: Inclusive corners of the area, as in lv_area_t
+            pixels: Row-major 8 bit pixels of the area
+            last: [Optional] True on the last flush of the render cycle,
+                  which refreshes the areas uploaded since the previous one
+        Returns:
+            The areas refreshed by this flush
+        """
+        rect = Rectangle(x1, y1, x2 - x1 + 1, y2 - y1 + 1)
+        if len(pixels) < rect.area():
+            raise ValueError("The number of pixels must match the area")
+        size = it8951.packed_size(ColorDepth.BPP_4BIT, rect)
+        if len(self._out) < size:
+            self._out = bytearray(size)
+        convert(pixels, rect, self.lut, self._out)
+        data = memoryview(self._out)[:size]
+        if self.queue is not None:
+            self.queue.upload(self.img_info, rect, data)
+        else:
+            self._tcon.write_packed_pixels(self.img_info, rect, data)
+        self.stats["flushes"] += 1
+        self.stats["bytes"] += size
+        self._add(rect)
+        if not last:
+            return []
+        return self.refresh()
+
+    def _add(self, rect: Rectangle):
+        # Merges the new band into the pending areas, repeating while each
+        # merge makes a larger area that touches another one
+        pending = self._pending
+        i = 0
+        while i < len(pending):
+            union = merge(pending[i], rect)
+            if union is None:
+                i += 1
+            else:
+                rect = union
+                pending.pop(i)
+                i = 0
+        pending.append(rect)
+
+    def refresh(self) -> list:
+        """
+        Refreshes the areas uploaded since the last refresh
+        Returns:
+            The refreshed areas
+        """
+        areas = self._pending
+        self._pending = []
+        for rect in areas:
+            if self.queue is not None:
+                self.queue.display(rect, self.mode)
+            else:
+                self._tcon.display_area(rect, self.mode)
+        self.stats["refreshes"] += len(areas)
+        return areas
+
+    def flush_cb(self, disp_drv, area, color_p):
+        """
+        LVGL flush callback
+        """
+        size = (area.x2 - area.x1 + 1)*(area.y2 - area.y1 + 1)
+        self.flush(area.x1, area.y1, area.x2, area.y2, color_p.__dereference__(size),
+                   disp_drv.flush_is_last())
+        disp_drv.flush_ready()
+
+    def rounder_cb(self, disp_drv, area):
+        """
+        LVGL rounder callback, see round_area
+        """
+        area.x1, area.x2 = round_area(area.x1, area.x2, self._tcon.panel_area.width - 1)
+
+    def register(self, buf_lines: int = 32):
+        """
+        Registers the panel as LVGL's display. The draw buffer holds
+        buf_lines full-width lines of 8 bit pixels, e.g. 60kB at 1872x32
+        instead of 2.6MB for a full frame.
+        Args:
+            buf_lines: [Optional] Lines of the partial draw buffer
+        Returns:
+            The registered lv.disp_t
+        """
+        import lvgl as lv
+        if lv.color_t.__SIZE__ != 1:
+            raise ValueError("LVGL must be built with LV_COLOR_DEPTH=8")
+        width  = self._tcon.panel_area.width
+        height = self._tcon.panel_area.height
+        # Kept referenced, LVGL only holds pointers to them
+        self._buf = bytearray(width*buf_lines)
+        self._draw_buf = lv.disp_draw_buf_t()
+        self._draw_buf.init(self._buf, None, len(self._buf))
+        self._drv = lv.disp_drv_t()
+        self._drv.init()
+        self._drv.draw_buf   = self._draw_buf
+        self._drv.flush_cb   = self.flush_cb
+        self._drv.rounder_cb = self.rounder_cb
+        self._drv.hor_res    = width
+        self._drv.ver_res    = height
+        return self._drv.register()
@@ -0,0 +1,237 @@
+import struct
+from it8951 import ColorDepth, Endianness, ImageInfo, Rectangle, RotateMode, it8951
+
+# Coding of the tiles' packed rows
+class Compression:
+    NONE = 0
+    # Byte-wise run-length coding, see rle_encode
+    RLE  = 1
+
+# A control byte c < 0x80 is followed by c+1 literal bytes, c >= 0x80 by a
+# byte that repeats c-0x80+_MIN_RUN times. Shorter repeats stay literal.
+_MAX_LITERAL = 0x80
+_MIN_RUN     = 3
+_MAX_RUN     = 0x7F + _MIN_RUN
+
+def rle_encode(data) -> bytes:
+    """
+    Run-length codes packed pixels. Flat white or black areas collapse to 2
+    bytes per 130 bytes of pixels, noisy ones grow by 1 byte per 128.
+    """
+    out = bytearray()
+    n = len(data)
+    literal = 0
+    i = 0
+    while i < n:
+        j = i + 1
+        while j < n and j - i < _MAX_RUN and data[j] == data[i]:
+            j += 1
+        if j - i >= _MIN_RUN:
+            for k in range(literal, i, _MAX_LITERAL):
+                end = min(k + _MAX_LITERAL, i)
+                out.append(end - k - 1)
+                out += data[k:end]
+            out.append(0x80 + j - i - _MIN_RUN)
+            out.append(data[i])
+            literal = j
+        i = j
+    for k in range(literal, n, _MAX_LITERAL):
+        end = min(k + _MAX_LITERAL, n)
+        out.append(end - k - 1)
+        out += data[k:end]
+    return bytes(out)
+
+def read_chunks(f, size: int):
+    """
+    Chunk generator (see transfer_pipeline.py) that reads size bytes from the
+    file f, one buffer-full at a time
+    """
+    out = yield
+    while size > 0:
+        n = f.readinto(out[:min(size, len(out))])
+        if not n:
+            raise ValueError("Panel asset is truncated")
+        size -= n
+        out = yield n
+
+def rle_decode(f, size: int, length: int):
+    """
+    Chunk generator (see transfer_pipeline.py) that decodes size run-length
+    coded bytes from the file f without holding more than one buffer-full of
+    the result. Literals are read straight into the buffer.
+    Args:
+        f: File positioned at the coded data
+        size: Number of coded bytes
+        length: Number of decoded bytes that the data must produce
+    Yields:
+        The number of decoded bytes in the buffer last sent, whenever it is
+        full and once at the end. Buffer lengths must be even.
+    """
+    out = yield
+    cap = len(out)
+    ctrl = bytearray(1)
+    run = bytearray(_MAX_RUN)
+    run_mv = memoryview(run)
+    run_value = 0
+    o = 0
+    while size > 0:
+        if f.readinto(ctrl) != 1:
+            raise ValueError("Panel asset is truncated")
+        c = ctrl[0]
+        size -= 1
+        literal = c < 0x80
+        if literal:
+            n = c + 1
+            size -= n
+        else:
+            if f.readinto(ctrl) != 1:
+                raise ValueError("Panel asset is truncated")
+            size -= 1
+            n = c - 0x80 + _MIN_RUN
+            if ctrl[0] != run_value:
+                run_value = ctrl[0]
+                for k in range(_MAX_RUN):
+                    run[k] = run_value
+        length -= n
+        if size < 0 or length < 0:
+            raise ValueError("Panel asset is corrupt")
+        while n > 0:
+            k = min(n, cap - o)
+            if literal:
+                if f.readinto(out[o:o + k]) != k:
+                    raise ValueError("Panel asset is truncated")
+            else:
+                out[o:o + k] = run_mv[:k]
+            o += k
+            n -= k
+            if o == cap:
+                out = yield o
+                cap = len(out)
+                o = 0
+    if length:
+        raise ValueError("Panel asset is corrupt")
+    if o:
+        yield o
+
+class AssetHeader:
+    """
+    Header of a panel asset: an image whose pixels the host converter
+    (host/asset_convert.py) already packed and aligned for LD_IMG_AREA, so
+    that it8951.load_asset streams them from flash without per-pixel work.
+
+    The header is followed by an index of ntiles+1 u32 offsets, relative to
+    the end of the index, and the packed rows of every tile, optionally
+    compressed. Images without a tile grid are a single tile. Tiles are
+    numbered row-major.
+    """
+    _MAGIC   = b'IT8A'
+    _VERSION = 2
+    # magic, version, compression, colour depth, endianness, x phase, width,
+    # height, tile width, tile height
+    _FORMAT  = '<4sBBBBBHHHH'
+    Size     = struct.calcsize(_FORMAT)
+
+    def __init__(self, bpp: ColorDepth, endianness: Endianness, width: int, height: int,
+                 tile_width: int = None, tile_height: int = None, x_phase: int = 0,
+                 compression: int = Compression.NONE):
+        """
+        Args:
+            bpp, endianness: Packing of the pixel data
+            width, height: Size of the whole image in pixels
+            tile_width, tile_height: [Optional] Tile grid. Defaults to a
+                                     single tile
+            x_phase: [Optional] x % pixel_per_word(bpp) of the positions that
+                     the rows were aligned for
+            compression: [Optional] Coding of the tiles' data
+        """
+        self.bpp         = bpp
+        self.endianness  = endianness
+        self.width       = width
+        self.height      = height
+        self.tile_width  = width if tile_width is None else tile_width
+        self.tile_height = height if tile_height is None else tile_height
+        self.x_phase     = x_phase
+        self.compression = compression
+        if self.tile_width <= 0 or self.tile_height <= 0 or \
+           width % self.tile_width or height % self.tile_height:
+            raise ValueError("The tiles must divide the image")
+        if not 0 <= x_phase < ColorDepth.pixel_per_word(bpp):
+            raise ValueError("The x phase must be within a word")
+        if compression not in (Compression.NONE, Compression.RLE):
+            raise ValueError("Unsupported panel asset compression")
+
+    @property
+    def ntiles(self) -> int:
+        return (self.width // self.tile_width)*(self.height // self.tile_height)
+
+    @property
+    def index_size(self) -> int:
+        return 4*(self.ntiles + 1)
+
+    @property
+    def tile_size(self) -> int:
+        """
+        Number of packed bytes of every tile, once decoded
+        """
+        return it8951.packed_size(self.bpp, Rectangle(self.x_phase, 0, self.tile_width,
+                                                      self.tile_height))
+
+    def img_info(self) -> ImageInfo:
+        return ImageInfo(self.endianness, self.bpp, RotateMode.ROTATE_0)
+
+    def tile_rect(self, x: int, y: int) -> Rectangle:
+        """
+        Area that a tile covers when it is loaded to (x, y)
+        """
+        if x % ColorDepth.pixel_per_word(self.bpp) != self.x_phase:
+            raise ValueError("The asset isn't aligned for this x position")
+        return Rectangle(x, y, self.tile_width, self.tile_height)
+
+    def to_bytes(self) -> bytes:
+        return struct.pack(self._FORMAT, self._MAGIC, self._VERSION, self.compression,
+                           self.bpp, self.endianness, self.x_phase, self.width,
+                           self.height, self.tile_width, self.tile_height)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'AssetHeader':
+        if len(data) < cls.Size:
+            raise ValueError("Panel asset header is truncated")
+        magic, version, compression, bpp, endianness, x_phase, width, height, \
+            tile_width, tile_height = struct.unpack(cls._FORMAT, bytes(data[:cls.Size]))
+        if magic != cls._MAGIC or version != cls._VERSION:
+            raise ValueError("Not a panel asset of the current version")
+        return cls(bpp, endianness, width, height, tile_width, tile_height, x_phase,
+                   compression)
+
+    @staticmethod
+    def pack_index(sizes: list) -> bytes:
+        """
+        Builds the offset index from the packed size of every tile
+        """
+        offsets = [0]
+        for size in sizes:
+            offsets.append(offsets[-1] + size)
+        return struct.pack('<%dI' % len(offsets), *offsets)
+
+    def read_tile_range(self, f, tile: int) -> tuple:
+        """
+        Reads a tile's entry of the index of an open asset file
+        Returns:
+            (file offset, size in bytes) of the tile's data
+        """
+        if not 0 <= tile < self.ntiles:
+            raise ValueError("Tile index out of range")
+        f.seek(self.Size + 4*tile)
+        start, end = struct.unpack('<II', f.read(8))
+        return self.Size + self.index_size + start, end - start
+
+    def tile_chunks(self, f, tile: int):
+        """
+        Chunk generator (see transfer_pipeline.py) that decodes a tile of an
+        open asset file, one buffer-full at a time
+        """
+        offset, size = self.read_tile_range(f, tile)
+        f.seek(offset)
+        if self.compression == Compression.RLE:
+            return rle_decode(f, size, self.tile_size)
+        return read_chunks(f, size)
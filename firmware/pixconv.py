@@ -0,0 +1,310 @@
+from array import array
+from it8951 import ColorDepth, Endianness, ImageInfo, Rectangle, RotateMode, it8951
+
+# 4x4 Bayer threshold matrix
+_BAYER = (0, 8, 2, 10,
+          12, 4, 14, 6,
+          3, 11, 1, 9,
+          15, 7, 13, 5)
+
+def _bits(bpp: ColorDepth) -> int:
+    if bpp not in (ColorDepth.BPP_1BIT, ColorDepth.BPP_2BIT, ColorDepth.BPP_4BIT):
+        raise ValueError("Pixels can only be converted to 1, 2 or 4bpp")
+    return 8 // ColorDepth.pixel_per_byte(bpp)
+
+def _level(bits: int, grey: int, offset: int = 0) -> int:
+    """
+    Pixel value of an 8 bit grey level, rounded after adding offset/32 of a
+    step. At 1bpp, 1 marks the dark pixels, i.e. display_1bpp's default
+    foreground, as in host/asset_convert.quantise.
+    """
+    top = (1 << bits) - 1
+    level = (32*grey*top + 16*255 + offset*255) // (32*255)
+    level = min(max(level, 0), top)
+    return top - level if bits == 1 else level
+
+def grey_lut(bpp: ColorDepth) -> bytearray:
+    """
+    256 entry table of the pixel value of every 8 bit grey level
+    """
+    bits = _bits(bpp)
+    return bytearray(_level(bits, v) for v in range(256))
+
+def grey_values(bpp: ColorDepth) -> bytearray:
+    """
+    8 bit grey level of every pixel value, the inverse of grey_lut
+    """
+    bits = _bits(bpp)
+    top = (1 << bits) - 1
+    values = bytearray(256)
+    for level in range(top + 1):
+        values[level] = (top - level if bits == 1 else level)*255 // top
+    return values
+
+# Pair tables are 64kB, so they are built once per colour depth
+_pair_luts = {}
+
+def pair_lut(bpp: ColorDepth) -> bytearray:
+    """
+    65536 entry table that quantises and packs 2 pixels in one lookup. The
+    entry of the pixels a, b (index a | b << 8, i.e. the pair read as a
+    little endian u16) holds their values a | b << bits, in the order of the
+    IT8951's big endian packing.
+    """
+    table = _pair_luts.get(bpp)
+    if table is None:
+        bits = _bits(bpp)
+        lut = grey_lut(bpp)
+        table = bytearray(65536)
+        for b in range(256):
+            hi = lut[b] << bits
+            base = b << 8
+            for a in range(256):
+                table[base | a] = lut[a] | hi
+        _pair_luts[bpp] = table
+    return table
+
+def bayer_lut(bpp: ColorDepth) -> bytearray:
+    """
+    4kB table of the ordered dithered pixel value of every grey level at
+    every position of the 4x4 Bayer matrix, indexed by
+    (y % 4) << 10 | (x % 4) << 8 | grey
+    """
+    bits = _bits(bpp)
+    table = bytearray(16*256)
+    for m in range(16):
+        # Thresholds spread evenly across one step, centred on 0
+        offset = 2*_BAYER[m] - 15
+        for v in range(256):
+            table[(m << 8) | v] = _level(bits, v, offset)
+    return table
+
+# Pure Python kernels. Every kernel converts one row of 8 bit grey pixels to
+# packed pixels, with state an array('i') that starts with the width and the
+# bits per pixel. A row starts on a whole byte of out and its last byte is
+# padded with 0 pixels.
+
+def pack_row(src, out, tab, state):
+    """
+    Quantises and packs a row with a pair_lut
+    """
+    width = state[0]
+    bits = state[1]
+    ppb = 8 // bits
+    full = width // ppb
+    if bits == 4:
+        i = 0
+        for o in range(full):
+            out[o] = tab[src[i] | (src[i+1] << 8)]
+            i += 2
+    else:
+        shift = 2*bits
+        pairs = ppb // 2
+        i = 0
+        for o in range(full):
+            b = 0
+            for k in range(pairs):
+                b |= tab[src[i] | (src[i+1] << 8)] << (shift*k)
+                i += 2
+            out[o] = b
+    if full*ppb < width:
+        mask = (1 << bits) - 1
+        b = 0
+        n = 0
+        for i in range(full*ppb, width):
+            b |= (tab[src[i]] & mask) << n
+            n += bits
+        out[full] = b
+
+def bayer_row(src, out, tab, state):
+    """
+    Ordered dithering of a row with a bayer_lut. state holds the panel x and
+    y of the row's first pixel after the width and bits per pixel.
+    """
+    width, bits, x, y = state[0], state[1], state[2], state[3]
+    row = (y & 3) << 10
+    b = 0
+    n = 0
+    o = 0
+    for i in range(width):
+        b |= tab[row | (((x + i) & 3) << 8) | src[i]] << n
+        n += bits
+        if n == 8:
+            out[o] = b
+            o += 1
+            b = 0
+            n = 0
+    if n:
+        out[o] = b
+
+def diffuse_row(src, out, tab, state):
+    """
+    Floyd-Steinberg error diffusion of a row. tab is a grey_lut followed by
+    grey_values. state holds the errors diffused to the next row after the
+    width and bits per pixel: 16 times the error of pixel x at 3 + x, which
+    is overwritten once the pixel is read.
+    """
+    width = state[0]
+    bits = state[1]
+    # Errors for the next pixel of the row, and for the 2 pixels of the next
+    # row that are not final yet
+    carry = 0
+    b0 = 0
+    b1 = 0
+    b = 0
+    n = 0
+    o = 0
+    for x in range(width):
+        v = src[x] + ((carry + state[3 + x]) >> 4)
+        if v < 0:
+            v = 0
+        elif v > 255:
+            v = 255
+        q = tab[v]
+        e = v - tab[256 + q]
+        state[2 + x] = b0 + 3*e
+        b0 = b1 + 5*e
+        b1 = e
+        carry = 7*e
+        b |= q << n
+        n += bits
+        if n == 8:
+            out[o] = b
+            o += 1
+            b = 0
+            n = 0
+    state[2 + width] = b0
+    if n:
+        out[o] = b
+
+try:
+    from pixconv_viper import pack_row, bayer_row, diffuse_row
+    NATIVE = True
+except (ImportError, SyntaxError):
+    # CPython, or a port without the native emitter
+    NATIVE = False
+
+class Quantiser:
+    """
+    Converts rows of 8 bit grey pixels to 1, 2 or 4bpp with the IT8951's
+    big endian packing, by rounding every pixel to the nearest level
+    """
+    def __init__(self, bpp: ColorDepth):
+        """
+        Args:
+            bpp: Colour depth to convert to: 1, 2 or 4bpp
+        """
+        self.bpp  = bpp
+        self.bits = _bits(bpp)
+        self._state = array('i', [0, self.bits])
+        self._tab = self._table()
+
+    def _table(self) -> bytearray:
+        return pair_lut(self.bpp)
+
+    def row(self, src, out, x: int = 0, y: int = 0):
+        """
+        Converts one row
+        Args:
+            src: 8 bit grey pixels of the row
+            out: Buffer of at least the row's packed bytes
+            x: [Optional] Panel x of the row's first pixel
+            y: [Optional] Panel y of the row
+        """
+        state = self._state
+        state[0] = len(src)
+        pack_row(src, out, self._tab, state)
+
+    def reset(self):
+        """
+        Starts a new image. Only the dithering quantisers carry state.
+        """
+        pass
+
+class OrderedDither(Quantiser):
+    """
+    Quantiser with 4x4 Bayer dithering. The thresholds follow the panel
+    position of the pixels, so that areas converted separately tile
+    seamlessly.
+    """
+    def __init__(self, bpp: ColorDepth):
+        super().__init__(bpp)
+        self._state = array('i', [0, self.bits, 0, 0])
+
+    def _table(self) -> bytearray:
+        return bayer_lut(self.bpp)
+
+    def row(self, src, out, x: int = 0, y: int = 0):
+        state = self._state
+        state[0] = len(src)
+        state[2] = x
+        state[3] = y
+        bayer_row(src, out, self._tab, state)
+
+class ErrorDiffusion(Quantiser):
+    """
+    Quantiser with Floyd-Steinberg error diffusion. Rows must be converted
+    from top to bottom, and only one row of errors is kept.
+    """
+    def __init__(self, bpp: ColorDepth, width: int):
+        """
+        Args:
+            bpp: Colour depth to convert to: 1, 2 or 4bpp
+            width: Width of the rows in pixels
+        """
+        super().__init__(bpp)
+        self.width = width
+        self._state = array('i', [0]*(width + 3))
+        self._state[0] = width
+        self._state[1] = self.bits
+
+    def _table(self) -> bytearray:
+        return grey_lut(self.bpp) + grey_values(self.bpp)
+
+    def row(self, src, out, x: int = 0, y: int = 0):
+        if len(src) != self.width:
+            raise ValueError("The row must be as wide as the quantiser")
+        diffuse_row(src, out, self._tab, self._state)
+
+    def reset(self):
+        state = self._state
+        for i in range(2, len(state)):
+            state[i] = 0
+
+def convert(pixels, rect: Rectangle, quantiser: Quantiser, out = None) -> tuple:
+    """
+    Converts an area of 8 bit grey pixels for write_packed_pixels, one row
+    at a time
+    Args:
+        pixels: Row-major 8 bit grey pixels of rect
+        rect: Area that the pixels are written to. x must fall on a byte of
+              the packed rows, i.e. be a multiple of the pixels per byte.
+        quantiser: Quantiser, OrderedDither or ErrorDiffusion
+        out: [Optional] Preallocated buffer of at least it8951.packed_size
+             bytes. The bytes padding the rows to whole words are left as
+             they are.
+    Returns:
+        (ImageInfo, packed pixels)
+    """
+    bpp = quantiser.bpp
+    ppb = ColorDepth.pixel_per_byte(bpp)
+    if rect.x % ppb:
+        raise ValueError("The area must start on a whole byte of pixels")
+    if len(pixels) != rect.area():
+        raise ValueError("The number of pixels must match the area")
+    row_bytes = it8951.packed_size(bpp, Rectangle(rect.x, 0, rect.width, 1))
+    size = row_bytes*rect.height
+    if out is None:
+        out = bytearray(size)
+    elif len(out) < size:
+        raise ValueError("Output buffer is too small")
+    src = memoryview(pixels)
+    dst = memoryview(out)
+    lead = (rect.x % ColorDepth.pixel_per_word(bpp)) // ppb
+    quantiser.reset()
+    width = rect.width
+    for row in range(rect.height):
+        o = row*row_bytes + lead
+        quantiser.row(src[row*width:(row + 1)*width], dst[o:(row + 1)*row_bytes],
+                      rect.x, rect.y + row)
+    return ImageInfo(Endianness.BIG, bpp, RotateMode.ROTATE_0), dst[:size]
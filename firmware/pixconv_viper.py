@@ -0,0 +1,104 @@
+# Viper builds of the pixconv kernels, imported by pixconv.py on MicroPython
+# ports with the native emitter. Every kernel mirrors the pure Python one of
+# the same name in pixconv.py, which documents its tables and state, and
+# takes at most the 4 arguments that viper functions allow.
+import micropython
+
+@micropython.viper
+def pack_row(src, out, tab, state):
+    s = ptr8(src)
+    d = ptr8(out)
+    t = ptr8(tab)
+    p = ptr32(state)
+    width = p[0]
+    bpp = p[1]
+    # 8, 4 or 2 pixels per byte, i.e. 4, 2 or 1 pairs
+    lg = 3 - (bpp >> 1)
+    pairs = 1 << (lg - 1)
+    shift = bpp << 1
+    full = width >> lg
+    i = 0
+    o = 0
+    while o < full:
+        b = 0
+        k = 0
+        while k < pairs:
+            b |= t[s[i] | (s[i+1] << 8)] << (shift*k)
+            i += 2
+            k += 1
+        d[o] = b
+        o += 1
+    if i < width:
+        mask = (1 << bpp) - 1
+        b = 0
+        n = 0
+        while i < width:
+            b |= (t[s[i]] & mask) << n
+            n += bpp
+            i += 1
+        d[o] = b
+
+@micropython.viper
+def bayer_row(src, out, tab, state):
+    s = ptr8(src)
+    d = ptr8(out)
+    t = ptr8(tab)
+    p = ptr32(state)
+    width = p[0]
+    bpp = p[1]
+    x = p[2]
+    row = (p[3] & 3) << 10
+    b = 0
+    n = 0
+    o = 0
+    i = 0
+    while i < width:
+        b |= t[row | (((x + i) & 3) << 8) | s[i]] << n
+        n += bpp
+        if n == 8:
+            d[o] = b
+            o += 1
+            b = 0
+            n = 0
+        i += 1
+    if n:
+        d[o] = b
+
+@micropython.viper
+def diffuse_row(src, out, tab, state):
+    s = ptr8(src)
+    d = ptr8(out)
+    t = ptr8(tab)
+    p = ptr32(state)
+    width = p[0]
+    bpp = p[1]
+    carry = 0
+    b0 = 0
+    b1 = 0
+    b = 0
+    n = 0
+    o = 0
+    x = 0
+    while x < width:
+        v = s[x] + ((carry + p[3 + x]) >> 4)
+        if v < 0:
+            v = 0
+        elif v > 255:
+            v = 255
+        q = t[v]
+        e = v - t[256 + q]
+        p[2 + x] = b0 + 3*e
+        b0 = b1 + 5*e
+        b1 = e
+        carry = 7*e
+        b |= q << n
+        n += bpp
+        if n == 8:
+            d[o] = b
+            o += 1
+            b = 0
+            n = 0
+        x += 1
+    p[2 + width] = b0
+    if n:
+        d[o] = b
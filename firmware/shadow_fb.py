@@ -0,0 +1,412 @@
+from it8951 import *
+
+# Tile flags
+_CLEAN  = 0
+# Drawn into since the last flush, compared against the committed frame
+_DIRTY  = 1
+# Uploaded on the next flush regardless of its content
+_FORCED = 2
+
+# 4bpp byte (even pixel in the low nibble) -> the two pixels as a 2bpp nibble,
+# or 0xFF if either grey level isn't one of 0, 5, 10 and 15. After
+# BPP_SETTINGS the IT8951 expands 2bpp pixels to 0x00, 0x55, 0xAA and 0xFF,
+# the image buffer values of those 4bpp levels, so the conversion is exact.
+_TO_2BPP = bytes(0xFF if (b & 0xF) % 5 or (b >> 4) % 5 else
+                 (b & 0xF) // 5 | ((b >> 4) // 5) << 2 for b in range(256))
+
+class ShadowFrameBuffer:
+    """
+    Host-side copy of the panel, packed at 4bpp. Callers draw into it and
+    flush() uploads and refreshes only the tiles that differ from the frame
+    that was last committed to the display. Areas whose pixels only use the
+    grey levels 0, 5, 10 and 15 (e.g. black and white) are uploaded at 2bpp,
+    halving their transfer, unless auto_bpp is False. This is the only upload
+    path that picks the depth by itself: it owns the pixels and scans the
+    changed tiles anyway, whereas it8951.write_packed_pixels sends callers'
+    buffers as they were packed and load_bmp/load_asset stream files whose
+    palette isn't known up front.
+
+    Pixels are stored in the IT8951's big endian 4bpp layout: pixel x of a
+    row lives in byte x//2, even pixels in the low nibble. A row of pixels is
+    therefore a contiguous byte range and uploads need no repacking.
+    """
+    def __init__(self, tcon: it8951, tile_width: int = 32, tile_height: int = 32,
+                 background: int = 0xF, scheduler = None, queue = None,
+                 double_buffer = None, auto_bpp: bool = True):
+        """
+        Args:
+            tcon: Initialised IT8951 driver
+            tile_width: Width of a diff tile in pixels. Must be a multiple of
+                        4 to meet the 4bpp load alignment.
+            tile_height: Height of a diff tile in pixels
+            background: Colour the panel is assumed to show initially. Call
+                        invalidate() if the panel content is unknown.
+            scheduler: [Optional] WaveformScheduler that picks the waveform of
+                       every area when flush() isn't given one
+            queue: [Optional] UpdateQueue that flush() submits the areas to,
+                   so that uploads overlap with the previous areas' refreshes
+            double_buffer: [Optional] DoubleBuffer that flush() uploads to and
+                   flips. Its stale areas are re-uploaded from this buffer.
+                   Takes precedence over queue.
+            auto_bpp: [Optional] False always uploads at 4bpp
+        """
+        if tile_width % 4 != 0 or tile_width <= 0 or tile_height <= 0:
+            raise ValueError("Tile width must be a positive multiple of 4")
+        self._tcon = tcon
+        self.scheduler = scheduler
+        self.queue = queue
+        self.double_buffer = double_buffer
+        self.auto_bpp = auto_bpp
+        self.width  = tcon.panel_area.width
+        self.height = tcon.panel_area.height
+        # Rows are padded to whole u16 words
+        self.stride = ((self.width + 3) // 4) * 2
+        self.tile_width  = tile_width
+        self.tile_height = tile_height
+        self._tiles_x = (self.width + tile_width - 1) // tile_width
+        self._tiles_y = (self.height + tile_height - 1) // tile_height
+        self._tiles = bytearray(self._tiles_x*self._tiles_y)
+
+        fill = (background & 0xF)*0x11
+        self.buf = bytearray([fill])*(self.stride*self.height)
+        self._committed = bytearray(self.buf)
+        self.img_info = ImageInfo(Endianness.BIG, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+        self._img_info_2bpp = ImageInfo(Endianness.BIG, ColorDepth.BPP_2BIT, RotateMode.ROTATE_0)
+
+    # --- Drawing -------------------------------------------------------------
+
+    def _mark(self, x: int, y: int, w: int, h: int, flag: int = _DIRTY):
+        tx0, tx1 = x // self.tile_width, (x + w - 1) // self.tile_width
+        ty0, ty1 = y // self.tile_height, (y + h - 1) // self.tile_height
+        tiles = self._tiles
+        for ty in range(ty0, ty1 + 1):
+            row = ty*self._tiles_x
+            for tx in range(tx0, tx1 + 1):
+                if tiles[row + tx] < flag:
+                    tiles[row + tx] = flag
+
+    def _clip(self, rect: Rectangle) -> tuple:
+        x0 = max(rect.x, 0)
+        y0 = max(rect.y, 0)
+        x1 = min(rect.x + rect.width, self.width)
+        y1 = min(rect.y + rect.height, self.height)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def pixel(self, x: int, y: int, colour: int):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return
+        i = y*self.stride + (x >> 1)
+        if x & 1:
+            self.buf[i] = (self.buf[i] & 0x0F) | ((colour & 0xF) << 4)
+        else:
+            self.buf[i] = (self.buf[i] & 0xF0) | (colour & 0xF)
+        self._mark(x, y, 1, 1)
+
+    def get_pixel(self, x: int, y: int) -> int:
+        b = self.buf[y*self.stride + (x >> 1)]
+        return b >> 4 if x & 1 else b & 0xF
+
+    def fill_rect(self, rect: Rectangle, colour: int):
+        """
+        Fills the rectangle (clipped to the panel) with a uniform colour
+        """
+        x, y, w, h = self._clip(rect)
+        if w <= 0 or h <= 0:
+            return
+        colour &= 0xF
+        buf = self.buf
+        # Whole bytes in the middle of every row, odd pixels on either side
+        first = (x + 1) >> 1
+        last  = (x + w) >> 1
+        fill  = bytes([colour*0x11])*(last - first) if last > first else b''
+        for row in range(y, y + h):
+            base = row*self.stride
+            if x & 1:
+                buf[base + (x >> 1)] = (buf[base + (x >> 1)] & 0x0F) | (colour << 4)
+            if fill:
+                buf[base + first:base + last] = fill
+            if (x + w) & 1:
+                i = base + ((x + w) >> 1)
+                buf[i] = (buf[i] & 0xF0) | colour
+        self._mark(x, y, w, h)
+
+    def clear(self, colour: int = 0xF):
+        self.fill_rect(Rectangle(0, 0, self.width, self.height), colour)
+
+    def blit(self, rect: Rectangle, colour):
+        """
+        Copies row-major pixel values (one per element) into the rectangle
+        """
+        if len(colour) != rect.area():
+            raise ValueError("The number of pixels must match the area")
+        i = 0
+        for y in range(rect.y, rect.y + rect.height):
+            for x in range(rect.x, rect.x + rect.width):
+                c = colour[i] & 0xF
+                i += 1
+                if 0 <= x < self.width and 0 <= y < self.height:
+                    j = y*self.stride + (x >> 1)
+                    if x & 1:
+                        self.buf[j] = (self.buf[j] & 0x0F) | (c << 4)
+                    else:
+                        self.buf[j] = (self.buf[j] & 0xF0) | c
+        x, y, w, h = self._clip(rect)
+        if w > 0 and h > 0:
+            self._mark(x, y, w, h)
+
+    def blit_packed(self, x: int, y: int, data, width: int, height: int, stride: int = None):
+        """
+        Copies pixels that are already packed in this buffer's layout, one
+        byte range per row. x must be even so that rows stay byte aligned.
+        Args:
+            x, y: Destination of the top-left pixel
+            data: Packed source rows
+            width, height: Size of the source in pixels
+            stride: [Optional] Bytes per source row. Defaults to (width+1)//2
+        """
+        if x & 1:
+            raise ValueError("Packed blits must start on an even x")
+        if stride is None:
+            stride = (width + 1) // 2
+        x0, y0, w, h = self._clip(Rectangle(x, y, width, height))
+        if w <= 0 or h <= 0:
+            return
+        nbytes = (w + 1) // 2
+        src = memoryview(data)
+        for row in range(y0, y0 + h):
+            s = (row - y)*stride + (x0 - x) // 2
+            d = row*self.stride + x0 // 2
+            if w & 1:
+                # Keep the neighbour's nibble of the last, half-covered byte
+                self.buf[d:d + nbytes - 1] = src[s:s + nbytes - 1]
+                self.buf[d + nbytes - 1] = (self.buf[d + nbytes - 1] & 0xF0) | (src[s + nbytes - 1] & 0x0F)
+            else:
+                self.buf[d:d + nbytes] = src[s:s + nbytes]
+        self._mark(x0, y0, w, h)
+
+    def invalidate(self, rect: Rectangle = None):
+        """
+        Forces the area (default: whole panel) to be uploaded on the next
+        flush, e.g. when the panel content is unknown
+        """
+        if rect is None:
+            rect = Rectangle(0, 0, self.width, self.height)
+        x, y, w, h = self._clip(rect)
+        if w > 0 and h > 0:
+            self._mark(x, y, w, h, _FORCED)
+
+    # --- Flushing ------------------------------------------------------------
+
+    def _tile_changed(self, tx: int, ty: int) -> bool:
+        a = tx*self.tile_width // 2
+        b = min((tx + 1)*self.tile_width, self.width)
+        b = (b + 1) // 2
+        cur, old = self.buf, self._committed
+        for row in range(ty*self.tile_height, min((ty + 1)*self.tile_height, self.height)):
+            base = row*self.stride
+            if cur[base + a:base + b] != old[base + a:base + b]:
+                return True
+        return False
+
+    def _forced(self, rect: Rectangle) -> bool:
+        """
+        True if rect covers a tile that invalidate() forced
+        """
+        tx0, tx1 = rect.x // self.tile_width, (rect.x + rect.width - 1) // self.tile_width
+        ty0, ty1 = rect.y // self.tile_height, (rect.y + rect.height - 1) // self.tile_height
+        for ty in range(ty0, ty1 + 1):
+            row = ty*self._tiles_x
+            for tx in range(tx0, tx1 + 1):
+                if self._tiles[row + tx] == _FORCED:
+                    return True
+        return False
+
+    def changed_areas(self) -> list:
+        """
+        Returns the areas that differ from the committed frame as a list of
+        Rectangles. Horizontal runs of changed tiles are merged, then runs
+        spanning the same columns on consecutive tile rows.
+        """
+        runs = []
+        open_runs = {}
+        for ty in range(self._tiles_y):
+            row_runs = {}
+            tx = 0
+            while tx < self._tiles_x:
+                flag = self._tiles[ty*self._tiles_x + tx]
+                if flag == _FORCED or (flag == _DIRTY and self._tile_changed(tx, ty)):
+                    start = tx
+                    while tx + 1 < self._tiles_x:
+                        nxt = self._tiles[ty*self._tiles_x + tx + 1]
+                        if nxt == _FORCED or (nxt == _DIRTY and self._tile_changed(tx + 1, ty)):
+                            tx += 1
+                        else:
+                            break
+                    span = (start, tx)
+                    run = open_runs.get(span)
+                    if run is None:
+                        run = [start, ty, tx, ty]
+                        runs.append(run)
+                    else:
+                        run[3] = ty
+                    row_runs[span] = run
+                tx += 1
+            open_runs = row_runs
+
+        areas = []
+        for tx0, ty0, tx1, ty1 in runs:
+            x = tx0*self.tile_width
+            y = ty0*self.tile_height
+            w = min((tx1 + 1)*self.tile_width, self.width) - x
+            h = min((ty1 + 1)*self.tile_height, self.height) - y
+            areas.append(Rectangle(x, y, w, h))
+        return areas
+
+    def packed_area(self, rect: Rectangle) -> bytearray:
+        """
+        Copies the packed rows of an area with x % 4 == 0 into a new buffer
+        """
+        row_bytes = ((rect.width + 3) // 4) * 2
+        out = bytearray(row_bytes*rect.height)
+        a = rect.x // 2
+        for i in range(rect.height):
+            base = (rect.y + i)*self.stride + a
+            out[i*row_bytes:(i + 1)*row_bytes] = self.buf[base:base + row_bytes]
+        return out
+
+    def packed_area_2bpp(self, rect: Rectangle):
+        """
+        Packs an area with an even x at 2bpp, in the IT8951's big endian
+        layout, if every pixel's grey level is one of 0, 5, 10 and 15
+        Returns:
+            The packed rows in a new buffer, or None if a pixel has another
+            grey level
+        """
+        # Rows are padded to whole words on the left, 2 pixels per nibble
+        pad = (rect.x % 8) // 2
+        row_bytes = ((rect.x % 8 + rect.width + 7) // 8) * 2
+        pairs = rect.width // 2
+        out = bytearray(row_bytes*rect.height)
+        buf = self.buf
+        table = _TO_2BPP
+        for i in range(rect.height):
+            src = (rect.y + i)*self.stride + rect.x // 2
+            o = i*row_bytes
+            for k in range(pad, pad + pairs):
+                v = table[buf[src]]
+                if v == 0xFF:
+                    return None
+                out[o + (k >> 1)] |= v << ((k & 1) << 2)
+                src += 1
+            if rect.width & 1:
+                # The odd pixel beyond the area is padding
+                v = table[buf[src] & 0x0F]
+                if v == 0xFF:
+                    return None
+                k = pad + pairs
+                out[o + (k >> 1)] |= v << ((k & 1) << 2)
+        return out
+
+    def _pack(self, rect: Rectangle) -> tuple:
+        """
+        Packs an area at the lowest colour depth that represents it exactly.
+        4bpp areas aren't copied: they are uploaded straight from the buffer.
+        Returns:
+            (ImageInfo, packed bytes, stride) for write_packed_pixels
+        """
+        if self.auto_bpp:
+            data = self.packed_area_2bpp(rect)
+            if data is not None:
+                # A no-op unless something else turned 2bpp white off
+                self._tcon.set_bpp_mode(True)
+                return self._img_info_2bpp, data, None
+        view = it8951.packed_view(self.buf, ColorDepth.BPP_4BIT, self.stride, rect)
+        return self.img_info, view, self.stride
+
+    def _commit(self, rect: Rectangle):
+        a = rect.x // 2
+        b = min((rect.x + rect.width + 1) // 2, self.stride)
+        for row in range(rect.y, rect.y + rect.height):
+            base = row*self.stride
+            self._committed[base + a:base + b] = self.buf[base + a:base + b]
+
+    def change_levels(self, rect: Rectangle) -> tuple:
+        """
+        Describes how the pixels of an area with an even x change against the
+        committed frame
+        Returns:
+            (old_levels, new_levels, grey_to_grey): bit masks of the grey
+            levels the changed pixels had and get, and whether a pixel changed
+            with neither level being white
+        """
+        old_levels = 0
+        new_levels = 0
+        grey_to_grey = False
+        a = rect.x // 2
+        b = min((rect.x + rect.width + 1) // 2, self.stride)
+        cur, old = self.buf, self._committed
+        for row in range(rect.y, rect.y + rect.height):
+            base = row*self.stride
+            if cur[base + a:base + b] == old[base + a:base + b]:
+                continue
+            for i in range(base + a, base + b):
+                c = cur[i]
+                o = old[i]
+                if c == o:
+                    continue
+                for shift in (0, 4):
+                    cn = (c >> shift) & 0xF
+                    on = (o >> shift) & 0xF
+                    if cn != on:
+                        old_levels |= 1 << on
+                        new_levels |= 1 << cn
+                        if cn != 0xF and on != 0xF:
+                            grey_to_grey = True
+        return old_levels, new_levels, grey_to_grey
+
+    def flush(self, mode: DisplayMode = None) -> list:
+        """
+        Uploads and refreshes every area that changed since the last flush
+        Args:
+            mode: [Optional] Waveform used to refresh the changed areas. By
+                  default the scheduler picks one per area, or GC16 without
+                  a scheduler. Areas forced by invalidate() are refreshed
+                  with GC16, as the panel content is unknown.
+        Returns:
+            The list of refreshed (Rectangle, DisplayMode) pairs
+        """
+        scheduler = self.scheduler
+        db = self.double_buffer
+        refreshed = []
+        areas = self.changed_areas()
+        if db is not None and areas:
+            for rect in db.stale_areas():
+                img_info, data, stride = self._pack(rect)
+                db.resync(img_info, rect, data, stride)
+        for rect in areas:
+            area_mode = mode
+            if area_mode is None:
+                if scheduler is None or self._forced(rect):
+                    area_mode = DisplayMode.GC16
+                else:
+                    area_mode = scheduler.choose(rect, *self.change_levels(rect))
+            img_info, data, stride = self._pack(rect)
+            if db is not None:
+                db.write_packed_pixels(img_info, rect, data, stride)
+                db.display(rect, area_mode)
+            elif self.queue is not None:
+                self.queue.submit(img_info, rect, data, area_mode, stride=stride)
+            else:
+                self._tcon.write_packed_pixels(img_info, rect, data, stride)
+                self._tcon.display_area(rect, area_mode)
+            if scheduler is not None:
+                scheduler.commit(rect, area_mode)
+            self._commit(rect)
+            refreshed.append((rect, area_mode))
+        if db is not None and areas:
+            db.swap()
+        for i in range(len(self._tiles)):
+            self._tiles[i] = _CLEAN
+        if scheduler is not None and scheduler.needs_cleanup():
+            scheduler.cleanup(self._tcon, None if db is None else db.front)
+        return refreshed
@@ -0,0 +1,89 @@
+import unittest
+from parameterized import parameterized
+import sys
+import os
+import tempfile
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+# The converter runs on the build host only
+try:
+    import numpy as np
+    from PIL import Image
+    from host import asset_convert
+except ImportError:
+    asset_convert = None
+
+@unittest.skipIf(asset_convert is None, "The asset converter needs NumPy and Pillow")
+class test_asset_convert(unittest.TestCase):
+    print("==[Running asset converter tests]==")
+
+    @parameterized.expand([
+        (ColorDepth.BPP_1BIT, Endianness.LITTLE, 0),
+        (ColorDepth.BPP_1BIT, Endianness.BIG,    5),
+        (ColorDepth.BPP_2BIT, Endianness.BIG,    3),
+        (ColorDepth.BPP_3BIT, Endianness.LITTLE, 1),
+        (ColorDepth.BPP_4BIT, Endianness.LITTLE, 0),
+        (ColorDepth.BPP_4BIT, Endianness.BIG,    2),
+        (ColorDepth.BPP_8BIT, Endianness.LITTLE, 1),
+    ])
+    def test_pack_matches_driver(self, bpp: ColorDepth, endian: Endianness, x_phase: int):
+        values = (np.arange(7*29) % 256).astype(np.uint8).reshape(7, 29)
+        img_info = ImageInfo(endian, bpp, RotateMode.ROTATE_0)
+        expected = it8951.pack_pixels_into(img_info, Rectangle(x_phase, 0, 29, 7), values.flatten().tolist())
+        self.assertEqual(asset_convert.pack(values, bpp, endian, x_phase), bytes(expected))
+
+    def test_quantise(self):
+        grey = np.array([[0, 16, 127, 128, 255]], dtype=np.uint8)
+        self.assertEqual(asset_convert.quantise(grey, 4).tolist(), [[0, 1, 7, 8, 15]])
+        self.assertEqual(asset_convert.quantise(grey, 2).tolist(), [[0, 0, 1, 2, 3]])
+        self.assertEqual(asset_convert.quantise(grey, 1).tolist(), [[1, 1, 1, 0, 0]])
+
+    def test_cli_round_trip(self):
+        sim = SimulatedIT8951(width=64, height=32)
+        tcon = make_tcon(sim)
+        grey = np.tile(np.arange(16, dtype=np.uint8)*0x11, (4, 2))
+        with tempfile.TemporaryDirectory() as tmp:
+            png = os.path.join(tmp, 'icons.png')
+            asset = os.path.join(tmp, 'icons.ita')
+            Image.fromarray(grey, 'L').save(png)
+            asset_convert.main([png, asset, '--tile', '16x2'])
+            for tile in range(4):
+                tcon.load_asset(16*tile, 0, asset, tile)
+        tcon.display_area(tcon.panel_area, DisplayMode.GC16)
+        self.assertEqual(sim.panel_rect(0, 0, 64, 1), list(range(16))*4)
+        self.assertEqual(sim.panel_rect(0, 1, 16, 1), list(range(16)))
+        self.assertEqual(sim.errors, [])
+
+    def test_rle(self):
+        grey = np.full((32, 64), 255, dtype=np.uint8)
+        grey[8:10, :] = 0
+        raw = asset_convert.convert(grey)
+        coded = asset_convert.convert(grey, compression=asset_convert.Compression.RLE)
+        self.assertLess(len(coded), len(raw) // 10)
+        sim = SimulatedIT8951(width=64, height=32)
+        tcon = make_tcon(sim)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'background.ita')
+            with open(path, 'wb') as f:
+                f.write(coded)
+            tcon.load_asset(0, 0, path, chunk_size=64)
+        tcon.display_area(tcon.panel_area, DisplayMode.GC16)
+        self.assertEqual(sim.panel_rect(0, 7, 1, 4), [15, 0, 0, 15])
+        self.assertEqual(sim.errors, [])
+
+    def test_transparent_png(self):
+        rgba = np.zeros((2, 4, 4), dtype=np.uint8)
+        rgba[0, :2] = (0, 0, 0, 255)
+        with tempfile.TemporaryDirectory() as tmp:
+            png = os.path.join(tmp, 'glyph.png')
+            Image.fromarray(rgba, 'RGBA').save(png)
+            grey = asset_convert.load_grey(png)
+        self.assertEqual(grey.tolist(), [[0, 0, 255, 255], [255, 255, 255, 255]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+import sys
+import os
+import tempfile
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from host import build_mpy
+
+class test_build_mpy(unittest.TestCase):
+    print("==[Running .mpy build tests]==")
+    def test_modules(self):
+        modules = build_mpy.modules()
+        self.assertIn("it8951.py", modules)
+        self.assertIn("it8951_service.py", modules)
+        self.assertNotIn("main.py", modules)
+        # Host tools, tests and benchmarks stay off the board
+        self.assertNotIn("it8951_sim.py", modules)
+        self.assertNotIn("harness.py", modules)
+
+    def test_command(self):
+        cmd = build_mpy.command(["mpy-cross"], "/fw/it8951.py", "/out/it8951.mpy")
+        self.assertEqual(cmd, ["mpy-cross", "-march=xtensawin", "-O1", "-s", "it8951.py",
+                               "-o", "/out/it8951.mpy", "/fw/it8951.py"])
+
+    @unittest.skipIf(build_mpy.find_mpy_cross() is None, "The .mpy build needs mpy-cross")
+    def test_build(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            written = build_mpy.build(tmp)
+            names = sorted(os.listdir(tmp))
+            self.assertIn("it8951.mpy", names)
+            self.assertIn("main.py", names)
+            self.assertEqual(len(written), len(names))
+            with open(os.path.join(tmp, "it8951.mpy"), 'rb') as f:
+                self.assertEqual(f.read(1), b'M')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import sys
+import os
+import tempfile
+import io
+from contextlib import redirect_stdout
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from controller_state import ControllerState, FileStore, RtcStore
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+class FakeRTC:
+    def __init__(self):
+        self._mem = b''
+    def memory(self, data = None):
+        if data is None:
+            return self._mem
+        self._mem = bytes(data)
+
+class test_controller_state(unittest.TestCase):
+    print("==[Running controller state tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=64, height=32)
+        self.store = RtcStore(FakeRTC())
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    def test_round_trip(self):
+        info = DeviceInfo(1872, 1404, 0x001236E0, "SWv_0.1.1", "M841_TFA2812")
+        state = ControllerState.from_bytes(ControllerState(info, -1580, 1).to_bytes())
+        self.assertEqual(state.device_info.panel_width, 1872)
+        self.assertEqual(state.device_info.panel_height, 1404)
+        self.assertEqual(state.device_info.img_buff_addr, 0x001236E0)
+        self.assertTrue(state.device_info.firmware_version.startswith("SWv_0.1.1"))
+        self.assertTrue(state.device_info.lut_version.startswith("M841_TFA2812"))
+        self.assertEqual(state.vcom_mV, -1580)
+        self.assertEqual(state.i80cpcr, 1)
+
+    def test_invalid_records(self):
+        info = DeviceInfo(64, 32, 0x1000, "fw", "lut")
+        data = bytearray(ControllerState(info, -1580, 1).to_bytes())
+        self.assertIsNone(ControllerState.from_bytes(None))
+        self.assertIsNone(ControllerState.from_bytes(b''))
+        self.assertIsNone(ControllerState.from_bytes(data[:-1]))
+        data[8] ^= 0xFF
+        self.assertIsNone(ControllerState.from_bytes(data))
+
+    def test_file_store(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = FileStore(os.path.join(tmp, 'it8951.state'))
+            self.assertIsNone(store.load())
+            store.save(b'abc')
+            self.assertEqual(store.load(), b'abc')
+
+    def test_cold_start_saves_state(self):
+        tcon = make_tcon(self.sim, state_store=self.store)
+        self.assertFalse(tcon.warm_started)
+        state = ControllerState.from_bytes(self.store.load())
+        self.assertEqual(state.device_info.img_buff_addr, self.sim.img_buff_addr)
+        self.assertEqual(state.vcom_mV, self.sim.vcom_mV)
+        self.assertEqual(state.i80cpcr, 1)
+
+    def test_warm_start_skips_queries(self):
+        make_tcon(self.sim, state_store=self.store)
+        self.sim.reset_stats()
+        out = io.StringIO()
+        with redirect_stdout(out):
+            tcon = make_tcon(self.sim, state_store=self.store)
+        self.assertTrue(tcon.warm_started)
+        self.assertEqual(out.getvalue(), "")
+        self.assertEqual(tcon.panel_area.width, 64)
+        self.assertEqual(tcon.panel_area.height, 32)
+        self.assertNotIn(Command.GET_DEV_INFO, self.sim.stats["commands"])
+        self.assertNotIn(Command.REG_WR, self.sim.stats["commands"])
+        self.assertIn(Command.REG_RD, self.sim.stats["commands"])
+        self.assertIsNotNone(tcon.init_time_us)
+        # The restored driver works as usual
+        tcon.fill_rect(Rectangle(0, 0, 8, 8), DisplayMode.DU, 0x5)
+        self.assertEqual(self.sim.panel_rect(0, 0, 8, 1), [5]*8)
+        self.assertIsNotNone(tcon.wake_to_first_pixel_us)
+
+    def test_reset_controller_falls_back_to_cold_start(self):
+        make_tcon(self.sim, state_store=self.store)
+        # A power cycled IT8951 loses its register configuration
+        self.sim.registers.clear()
+        self.sim.reset_stats()
+        tcon = make_tcon(self.sim, state_store=self.store)
+        self.assertFalse(tcon.warm_started)
+        self.assertIn(Command.GET_DEV_INFO, self.sim.stats["commands"])
+        self.assertEqual(tcon._read_reg(Register.I80CPCR), 1)
+
+    def test_corrupt_store_falls_back_to_cold_start(self):
+        self.store.save(b'\xff'*ControllerState.Size)
+        tcon = make_tcon(self.sim, state_store=self.store)
+        self.assertFalse(tcon.warm_started)
+        self.assertIsNotNone(ControllerState.from_bytes(self.store.load()))
+
+    def test_warm_start_applies_new_vcom(self):
+        make_tcon(self.sim, state_store=self.store)
+        tcon = make_tcon(self.sim, -1750, state_store=self.store)
+        self.assertTrue(tcon.warm_started)
+        self.assertEqual(self.sim.vcom_mV, -1750)
+        self.assertEqual(ControllerState.from_bytes(self.store.load()).vcom_mV, -1750)
+
+if __name__ == '__main__':
+    unittest.main()
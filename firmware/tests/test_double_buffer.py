@@ -0,0 +1,115 @@
+import unittest
+import sys
+import os
+import tempfile
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from double_buffer import DoubleBuffer
+from shadow_fb import ShadowFrameBuffer
+from waveform import WaveformScheduler
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+import test_it8951
+
+class test_double_buffer(unittest.TestCase):
+    print("==[Running double buffer tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=64, height=32)
+        self.tcon = make_tcon(self.sim)
+        self.img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.assertEqual(self.sim.errors, [])
+        self.assertEqual(self.sim.hazards, [])
+        return super().tearDown()
+
+    def packed(self, rect: Rectangle, colour: int) -> bytearray:
+        return bytearray(it8951.pack_pixels_into(self.img_info, rect, [colour]*rect.area()))
+
+    def test_display_buffer_area(self):
+        addr = self.sim.img_buff_addr + 64*32
+        rect = Rectangle(8, 4, 16, 8)
+        self.tcon.set_img_buff_base_address(addr)
+        self.tcon.write_packed_pixels(self.img_info, rect, self.packed(rect, 0x9))
+        self.tcon.display_buffer_area(rect, DisplayMode.GC16, addr)
+        self.assertEqual(self.sim.panel_rect(8, 4, 16, 1), [0x9]*16)
+        self.assertEqual(self.sim.refreshes[-1][5], addr)
+        # The default buffer is untouched
+        self.assertEqual(self.sim.image_buffer()[4*64 + 8], 0)
+        with self.assertRaises(ValueError):
+            self.tcon.display_buffer_area(rect, DisplayMode.GC16, 1 << 26)
+
+    def test_flip(self):
+        db = DoubleBuffer(self.tcon)
+        self.assertEqual(db.back, self.sim.img_buff_addr + 64*32)
+        self.assertEqual(db.stale_areas(), [self.tcon.panel_area])
+        rect = Rectangle(0, 0, 32, 16)
+        for colour in (0x3, 0x7, 0xB):
+            back = db.back
+            # Redrawing the area right away is safe: the refresh that is
+            # still running reads the other buffer
+            db.write_packed_pixels(self.img_info, rect, self.packed(rect, colour))
+            db.flip(DisplayMode.GC16)
+            self.assertEqual(db.front, back)
+            self.assertEqual(self.sim.refreshes[-1][5], back)
+            self.assertEqual(self.sim.panel_rect(0, 0, 32, 1), [colour]*32)
+            self.assertEqual(db.stale_areas(), [rect])
+        self.assertEqual(db.queue.stats["stalls"], 1)
+
+    def test_resync(self):
+        db = DoubleBuffer(self.tcon)
+        rect = Rectangle(0, 0, 64, 32)
+        db.resync(self.img_info, rect, self.packed(rect, 0xF))
+        self.assertEqual(db.stale_areas(), [])
+        db.flip(DisplayMode.GC16)
+        self.assertEqual(len(self.sim.refreshes), 0)
+
+    def test_resync_off_diagonal(self):
+        db = DoubleBuffer(self.tcon)
+        # Areas with x != y, whose containment must compare y against y
+        below = Rectangle(4, 20, 8, 8)
+        right = Rectangle(40, 2, 16, 4)
+        for rect in (below, right):
+            db.write_packed_pixels(self.img_info, rect, self.packed(rect, 0x5))
+        db.flip(DisplayMode.GC16)
+        self.assertEqual(db.stale_areas(), [below, right])
+        # Covers the top 2 rows of right only
+        partial = Rectangle(40, 0, 16, 4)
+        db.resync(self.img_info, partial, self.packed(partial, 0x5))
+        self.assertEqual(db.stale_areas(), [below, right])
+        db.resync(self.img_info, below, self.packed(below, 0x5))
+        self.assertEqual(db.stale_areas(), [right])
+
+    def test_load_bmp(self):
+        db = DoubleBuffer(self.tcon)
+        rows = [bytes(((2*i) << 4 | (2*i + 1)) & 0xFF for i in range(4)) for _ in range(5)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'img.bmp')
+            test_it8951.test_it8951.make_bmp(path, 8, rows)
+            rect = db.load_bmp(8, 4, path)
+        self.assertEqual(rect.to_list(), [8, 4, 8, 5])
+        db.flip(DisplayMode.GC16)
+        self.assertEqual(self.sim.panel_rect(8, 4, 8, 1), [3, 2, 1, 0, 7, 6, 5, 4])
+
+    def test_shadow_flush(self):
+        scheduler = WaveformScheduler(self.tcon.panel_area, 16, panel_threshold=4)
+        db = DoubleBuffer(self.tcon)
+        # The simulated panel and image buffers start black
+        fb = ShadowFrameBuffer(self.tcon, 16, 16, background=0x0, scheduler=scheduler, double_buffer=db)
+        for i in range(4):
+            fb.fill_rect(Rectangle(4*i, 2*i, 20, 10), 0xF if i % 2 else 0x5)
+            fb.flush()
+            expected = [fb.get_pixel(x, y) for y in range(32) for x in range(64)]
+            self.assertTrue(self.sim.panel_rect(0, 0, 64, 32) == expected)
+            # The front buffer holds the whole frame, not just the last areas
+            front = self.sim.image_buffer(db.front)
+            self.assertTrue(list(front) == [v*0x11 for v in expected])
+        # The cleanup refreshes the whole panel from the front buffer
+        self.assertEqual(self.sim.refreshes[-1][:3], (0, 0, 64))
+        self.assertEqual(self.sim.refreshes[-1][5], db.front)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from parameterized import parameterized
+import sys
+import os
+import tempfile
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from glyph_atlas import GlyphAtlas, GlyphCache
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+# The converter runs on the build host only
+try:
+    import numpy as np
+    from PIL import ImageFont
+    from host import font_convert, asset_convert
+    # Pillow's built-in scalable font, which needs FreeType
+    FONT = ImageFont.load_default(size=14)
+    if not isinstance(FONT, ImageFont.FreeTypeFont):
+        font_convert = None
+except (ImportError, TypeError):
+    font_convert = None
+
+@unittest.skipIf(font_convert is None, "The font converter needs NumPy and Pillow with FreeType")
+class test_font_convert(unittest.TestCase):
+    print("==[Running font converter tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=256, height=32)
+        self.tcon = make_tcon(self.sim)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'font.itg')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    def expected(self, text: str, bpp: int) -> list:
+        ascent, descent = FONT.getmetrics()
+        ppb = ColorDepth.pixel_per_byte(ColorDepth.bpp_to_code(bpp))
+        cells = [asset_convert.quantise(font_convert.rasterise(FONT, c, ascent + descent, ascent, ppb), bpp)
+                 for c in text]
+        return np.hstack(cells)
+
+    @parameterized.expand([(4,), (2,)])
+    def test_round_trip(self, bpp: int):
+        with open(self.path, 'wb') as f:
+            f.write(font_convert.convert(FONT, "default", 14, bpp))
+        atlas = GlyphAtlas(self.path)
+        text = "Dentist 9:30"
+        # White must be 0xFF at 2bpp
+        self.tcon.set_bpp_mode(bpp == 2)
+        rect = self.tcon.draw_text(4, 2, text, atlas, GlyphCache())
+        atlas.close()
+        self.tcon.display_area(rect, DisplayMode.GC16)
+        expected = self.expected(text, bpp)
+        self.assertEqual((rect.height, rect.width), expected.shape)
+        if bpp == 2:
+            expected = expected*5
+        self.assertTrue(self.sim.panel_rect(4, 2, rect.width, rect.height) == expected.flatten().tolist())
+        # Text is dark on white
+        self.assertIn(0, expected)
+
+    def test_cli_1bpp(self):
+        font_path = FONT.path
+        if not isinstance(font_path, str):
+            # The default font is embedded in Pillow
+            font_path = os.path.join(self.tmp.name, 'default.ttf')
+            with open(font_path, 'wb') as f:
+                f.write(FONT.path.getvalue())
+        font_convert.main([font_path, '14', self.path, '--bpp', '1', '--chars', '0123456789:'])
+        atlas = GlyphAtlas(self.path)
+        self.assertEqual(atlas.bpp, ColorDepth.BPP_1BIT)
+        rect = self.tcon.draw_text(16, 0, "12:45", atlas)
+        self.tcon.display_1bpp(rect)
+        expected = [0x0 if p else 0xF for p in self.expected("12:45", 1).flatten().tolist()]
+        self.assertTrue(self.sim.panel_rect(16, 0, rect.width, rect.height) == expected)
+        # Letters aren't in the atlas and fall back to '?'
+        self.assertEqual(atlas.width(ord('x')), atlas.width(ord('?')))
+        atlas.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+from parameterized import parameterized
+import sys
+import os
+import io
+import struct
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from glyph_atlas import GlyphAtlas, GlyphCache, render_line, text_width
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+HEIGHT = 3
+
+def glyph_pixels(cp: int, width: int) -> list:
+    """
+    Distinct pixel values of every glyph, one per element in row-major order
+    """
+    return [(cp + x + 3*y) % 15 for y in range(HEIGHT) for x in range(width)]
+
+def make_atlas(bpp: ColorDepth, widths: dict, name: str = "test", size: int = 12) -> bytes:
+    """
+    Builds an atlas with pure Python packing. widths maps codepoints to
+    glyph widths in pixels.
+    """
+    img_info = ImageInfo(Endianness.BIG, bpp, RotateMode.ROTATE_0)
+    ppb = ColorDepth.pixel_per_byte(bpp)
+    index = b''
+    data = b''
+    for cp in sorted(widths):
+        width = widths[cp]
+        pixels = glyph_pixels(cp, width)
+        if bpp == ColorDepth.BPP_1BIT:
+            pixels = [p & 1 for p in pixels]
+        packed = bytes(it8951.pack_pixels_into(img_info, Rectangle(0, 0, width, HEIGHT), pixels))
+        row_words = len(packed) // HEIGHT
+        rows = b''.join(packed[r*row_words:r*row_words + width // ppb] for r in range(HEIGHT))
+        index += struct.pack(GlyphAtlas._ENTRY, cp, len(data), width)
+        data += rows
+    header = struct.pack(GlyphAtlas._FORMAT, GlyphAtlas._MAGIC, GlyphAtlas._VERSION, bpp,
+                         size, HEIGHT, 2, len(widths), name.encode())
+    return header + index + data
+
+class test_glyph_atlas(unittest.TestCase):
+    print("==[Running glyph atlas tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=64, height=32)
+        self.tcon = make_tcon(self.sim)
+        self.widths = {ord('?'): 4, ord('a'): 6, ord('b'): 2, ord('c'): 8}
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    def atlas(self, bpp: ColorDepth = ColorDepth.BPP_4BIT, **kwargs) -> GlyphAtlas:
+        return GlyphAtlas(io.BytesIO(make_atlas(bpp, self.widths, **kwargs)))
+
+    def expected(self, text: str) -> list:
+        rows = [[] for _ in range(HEIGHT)]
+        for c in text:
+            cp = ord(c) if ord(c) in self.widths else ord('?')
+            pixels = glyph_pixels(cp, self.widths[cp])
+            for y in range(HEIGHT):
+                rows[y] += pixels[y*self.widths[cp]:(y + 1)*self.widths[cp]]
+        return [p for row in rows for p in row]
+
+    def test_header(self):
+        atlas = self.atlas(name="Inter", size=28)
+        self.assertEqual((atlas.font, atlas.size, atlas.height, atlas.baseline),
+                         ("Inter", 28, HEIGHT, 2))
+        self.assertEqual(atlas.width(ord('c')), 8)
+        # Missing glyphs fall back to '?'
+        self.assertEqual(atlas.width(ord('z')), 4)
+        self.assertEqual(text_width(atlas, "abcz"), 20)
+        with self.assertRaises(ValueError):
+            GlyphAtlas(io.BytesIO(b'IT8A' + bytes(GlyphAtlas.Size)))
+
+    def test_missing_fallback(self):
+        del self.widths[ord('?')]
+        atlas = self.atlas()
+        with self.assertRaises(ValueError):
+            atlas.width(ord('z'))
+
+    def test_cache(self):
+        atlas = self.atlas()
+        other = self.atlas(size=16)
+        cache = GlyphCache(capacity=2)
+        self.assertEqual(cache.get(atlas, ord('a')), atlas.read_glyph(ord('a')))
+        cache.get(atlas, ord('b'))
+        cache.get(atlas, ord('a'))
+        # Same codepoint at another size is another glyph. 'b' is evicted.
+        cache.get(other, ord('a'))
+        self.assertEqual(cache.stats, {"hits": 1, "misses": 3, "evictions": 1})
+        cache.get(atlas, ord('a'))
+        cache.get(atlas, ord('b'))
+        self.assertEqual(cache.stats, {"hits": 2, "misses": 4, "evictions": 2})
+        self.assertEqual(len(cache), 2)
+        with self.assertRaises(ValueError):
+            GlyphCache(0)
+
+    def test_cache_mixed_depths(self):
+        cache = GlyphCache()
+        grey = self.atlas(ColorDepth.BPP_4BIT)
+        mono = self.atlas(ColorDepth.BPP_1BIT)
+        # Same font and size, but the glyphs are packed at different depths
+        self.assertEqual(cache.get(grey, ord('a')), grey.read_glyph(ord('a')))
+        self.assertEqual(cache.get(mono, ord('a')), mono.read_glyph(ord('a')))
+        self.assertEqual(cache.get(grey, ord('a')), grey.read_glyph(ord('a')))
+        self.assertEqual(cache.stats, {"hits": 1, "misses": 2, "evictions": 0})
+
+    @parameterized.expand([(0,), (2,), (6,)])
+    def test_draw_text(self, x: int):
+        atlas = self.atlas()
+        cache = GlyphCache()
+        rect = self.tcon.draw_text(x, 5, "abc?z", atlas, cache)
+        self.assertEqual(rect.to_list(), [x, 5, 24, HEIGHT])
+        self.tcon.display_area(rect, DisplayMode.GC16)
+        self.assertEqual(self.sim.panel_rect(x, 5, 24, HEIGHT), self.expected("abc?z"))
+        # The pixels around the line are untouched
+        self.assertEqual(self.sim.panel_rect(x + 24, 5, 1, HEIGHT), [0]*HEIGHT)
+        self.assertEqual(cache.stats["misses"], 5)
+
+    def test_draw_text_1bpp(self):
+        self.widths = {ord('?'): 8, ord('a'): 16, ord('b'): 8}
+        atlas = self.atlas(ColorDepth.BPP_1BIT)
+        rect = self.tcon.draw_text(8, 0, "aba", atlas)
+        self.tcon.display_1bpp(rect)
+        expected = [0x0 if p & 1 else 0xF for p in self.expected("aba")]
+        self.assertEqual(self.sim.panel_rect(8, 0, 40, HEIGHT), expected)
+
+    def test_alignment(self):
+        atlas = self.atlas()
+        with self.assertRaises(ValueError):
+            self.tcon.draw_text(1, 0, "a", atlas)
+        with self.assertRaises(ValueError):
+            self.tcon.draw_text(60, 0, "a", atlas)
+        self.assertEqual(self.tcon.draw_text(4, 0, "", atlas).width, 0)
+
+    def test_render_line_reuses_buffer(self):
+        atlas = self.atlas()
+        out = bytearray(64)
+        img_info, width, data = render_line(atlas, "ab", 0, out=out)
+        self.assertEqual((img_info.endianness, width, len(data)), (Endianness.BIG, 8, 3*4))
+        self.assertIs(data.obj, out)
+        with self.assertRaises(ValueError):
+            render_line(atlas, "cccccc", 0, out=out)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,8 @@ from parameterized import parameterized
 from unittest.mock import Mock, patch
 import sys
 import os
+import tempfile
+from array import array
 # Ensure that the parent directory is visible from this module
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, project_root)
@@ -18,7 +20,7 @@ class test_it8951(unittest.TestCase):
         (Command.GET_DEV_INFO, [0x60, 0x00, 0x03, 0x02]),
     ])
     def test_send_command(self, command: Command, expected_bytes: list):
-        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580)
+        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, initialise=False)
         self.assertEqual(self.ncs, 1)
         tcon._send_command(command)
         self.assertEqual(self.ncs, 1)
@@ -31,12 +33,80 @@ class test_it8951(unittest.TestCase):
         ([],                       [])
     ])
     def test_write_data(self, data: list, expected_bytes: list):
-        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580)
+        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, initialise=False)
         self.assertEqual(self.ncs, 1)
         tcon._write_data(data)
         self.assertEqual(self.ncs, 1)
         self.assertEqual(self.txed_bytes, expected_bytes)
     
+    @parameterized.expand([
+        ([0x0000, 0x0203, 0x4567], [0x00, 0x00, 0x00, 0x00, 0x02, 0x03, 0x45, 0x67]),
+        ([0xFFFF],                 [0x00, 0x00, 0xFF, 0xFF]),
+        ([],                       [])
+    ])
+    def test_write_data_strict_hrdy(self, data: list, expected_bytes: list):
+        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, strict_hrdy=True,
+                      initialise=False)
+        self.mock_spi.write.reset_mock()
+        tcon._write_data(data)
+        self.assertEqual(self.ncs, 1)
+        self.assertEqual(self.txed_bytes, expected_bytes)
+        # One SPI transaction per u16 word in strict mode
+        self.assertEqual(self.mock_spi.write.call_count, len(expected_bytes)//2)
+
+    @parameterized.expand([
+        (1,  1),
+        (31, 1),
+        (32, 2),
+        (70, 3)
+    ])
+    def test_write_data_bursts(self, nwords: int, expected_writes: int):
+        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, initialise=False)
+        self.mock_spi.write.reset_mock()
+        data = list(range(0x100, 0x100 + nwords))
+        tcon._write_data(data)
+        self.assertEqual(self.ncs, 1)
+        self.assertEqual(self.mock_spi.write.call_count, expected_writes)
+        self.assertEqual(self.txed_bytes, [0x00, 0x00] + list(b''.join(struct.pack('>H', w) for w in data)))
+
+    @parameterized.expand([
+        (bytes(range(16)),),
+        (bytearray(range(16)),),
+        (memoryview(bytearray(range(32)))[8:24],),
+        (array('H', [0x0100, 0x0302]),),
+        (bytes(10000),),
+    ])
+    def test_write_bytes(self, data):
+        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, initialise=False)
+        self.mock_spi.write.reset_mock()
+        tcon._write_bytes(data)
+        self.assertEqual(self.ncs, 1)
+        self.assertEqual(self.txed_bytes, [0x00, 0x00] + list(bytes(data)))
+        # The preamble, then chunks of at most _SPI_CHUNK bytes
+        nbytes = len(bytes(data))
+        self.assertEqual(self.mock_spi.write.call_count, 1 + -(-nbytes // it8951._SPI_CHUNK))
+
+    def test_write_packed_pixels_strided(self):
+        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, initialise=False)
+        tcon.panel_area = Rectangle(0, 0, 16, 4)
+        img_info = ImageInfo(Endianness.BIG, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+        fb = bytes(range(32))
+        rect = Rectangle(4, 1, 8, 2)
+        tcon.write_packed_pixels(img_info, rect, it8951.packed_view(fb, ColorDepth.BPP_4BIT, 8, rect), 8)
+        # LD_IMG_AREA + args, then one data frame holding the 2 rows
+        data = self.txed_bytes[2 + 2 + 2 + 5*2:-4]
+        self.assertEqual(data, [0, 0] + list(fb[10:14]) + list(fb[18:22]))
+        # Strides and offsets count bytes whatever the buffer's item size
+        words = array('H')
+        words.frombytes(fb)
+        self.txed_bytes.clear()
+        tcon.write_packed_pixels(img_info, rect, it8951.packed_view(words, ColorDepth.BPP_4BIT, 8, rect), 8)
+        self.assertEqual(self.txed_bytes[2 + 2 + 2 + 5*2:-4], data)
+        with self.assertRaises(ValueError):
+            tcon.write_packed_pixels(img_info, rect, fb[24:], 16)
+        with self.assertRaises(TypeError):
+            tcon.write_packed_pixels(img_info, rect, "pixels")
+
     @parameterized.expand([
         (0, [],                               []),
         (1, [0x1234],                         [0x10,0,0,0,0,0]),
@@ -51,13 +121,67 @@ class test_it8951(unittest.TestCase):
             return ret
 
         self.mock_spi.read = spi_read
-        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580)
+        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, strict_hrdy=True,
+                      initialise=False)
         self.assertEqual(self.ncs, 1)
         rxed_words = tcon._read_data(len)
         self.assertEqual(self.ncs, 1)
         self.assertEqual(rxed_words, expected_words)
         self.assertEqual(self.txed_bytes, expected_tx)
 
+    @parameterized.expand([
+        (0, [],                               [],                                      False),
+        (1, [0x1234],                         [0x10,0,0,0,0,0],                        False),
+        (4, [0x0000, 0x7FFF, 0x8000, 0xFFFF], [0x10,0,0,0,0,0,0,0,0,0,0,0],            False),
+        (1, [0x1234],                         [0x10,0,0,0,0,0],                        True),
+        (4, [0x0000, 0x7FFF, 0x8000, 0xFFFF], [0x10,0,0,0,0,0,0,0,0,0,0,0],            True),
+    ])
+    def test_read_data_bulk(self, nwords: int, expected_words: list, expected_tx: list, read_burst: bool):
+        expected_bytes = b''.join(struct.pack('>H', word) for word in [0, 0] + expected_words)
+        events = []
+        def spi_write(data):
+            self.txed_bytes.extend(bytes(data))
+            events.append("write")
+        def spi_write_readinto(txdata, rxdata):
+            assert self.ncs == 0, "nCS must be set low during SPI TxR"
+            start = len(self.txed_bytes)
+            self.txed_bytes.extend(txdata)
+            rxdata[:] = expected_bytes[start:len(self.txed_bytes)]
+            self.rxcounter += 1
+            events.append("read")
+        def hrdy_value():
+            events.append("hrdy")
+            return 1
+
+        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, initialise=False,
+                      read_burst=read_burst)
+        with patch.object(self.mock_spi, "write", spi_write), \
+             patch.object(self.mock_spi, "write_readinto", spi_write_readinto), \
+             patch.object(self.mock_hrdy, "value", hrdy_value):
+            rxed_words = tcon._read_data(nwords)
+        self.assertEqual(self.ncs, 1)
+        self.assertEqual(rxed_words, expected_words)
+        self.assertEqual(self.txed_bytes, expected_tx)
+        if not nwords:
+            self.assertEqual(events, [])
+        elif read_burst:
+            # The whole read is a single full-duplex transaction
+            self.assertEqual(events, ["hrdy", "read"])
+        else:
+            # HRDY is polled after the preamble and after the dummy word
+            self.assertEqual(events, ["hrdy", "write", "hrdy", "read", "hrdy", "read"])
+
+    def test_read_words_reuses_buffer(self):
+        def spi_write_readinto(txdata, rxdata):
+            rxdata[:] = bytes([0, 0, 0, 0, 0x12, 0x34])
+        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, initialise=False,
+                      read_burst=True)
+        with patch.object(self.mock_spi, "write_readinto", spi_write_readinto):
+            first = tcon._read_words(1)
+            second = tcon._read_words(1)
+        self.assertEqual(second[0], 0x1234)
+        self.assertIs(first.obj, second.obj)
+
     @parameterized.expand([
         (-1580, False, [0x60, 0x00, 0x00, 0x39, 0x00, 0x00, 0x00, 0x01, 0x06, 0x2C]),
         (-1580, True,  [0x60, 0x00, 0x00, 0x39, 0x00, 0x00, 0x00, 0x02, 0x06, 0x2C]),
@@ -65,7 +189,7 @@ class test_it8951(unittest.TestCase):
         (0,     False, [])
     ])
     def test_set_vcom(self, vcom_mV: int, write_to_flash: bool, expected_tx: list):
-        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580)
+        tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, initialise=False)
         self.assertEqual(self.ncs, 1)
         if vcom_mV >= 0:
             with self.assertRaises(Exception): tcon.set_vcom(vcom_mV, write_to_flash)
@@ -101,12 +225,107 @@ class test_it8951(unittest.TestCase):
         img_info = ImageInfo(Endianness.LITTLE, bpp, RotateMode.ROTATE_0)
         self.assertEqual(it8951.pack_pixels(img_info, rect, [0xF]*rect.area()), expected_words)
     
+    @parameterized.expand([
+        (ColorDepth.BPP_2BIT, Endianness.LITTLE, Rectangle(0, 0, 8, 1), [3, 0, 0, 0, 0, 0, 0, 1], [0x40, 0x03]),
+        (ColorDepth.BPP_2BIT, Endianness.BIG,    Rectangle(0, 0, 8, 1), [3, 0, 0, 0, 0, 0, 0, 1], [0x03, 0x40]),
+        (ColorDepth.BPP_2BIT, Endianness.LITTLE, Rectangle(6, 0, 3, 1), [1, 2, 3],                [0x90, 0x00, 0x00, 0x03]),
+        (ColorDepth.BPP_3BIT, Endianness.LITTLE, Rectangle(0, 0, 4, 1), [7, 1, 0, 0],             [0x00, 0x2E]),
+        (ColorDepth.BPP_4BIT, Endianness.BIG,    Rectangle(0, 0, 4, 1), [1, 2, 3, 4],             [0x21, 0x43]),
+        (ColorDepth.BPP_4BIT, Endianness.LITTLE, Rectangle(0, 0, 4, 2), [1, 2, 3, 4, 5, 6, 7, 8], [0x43, 0x21, 0x87, 0x65]),
+        (ColorDepth.BPP_8BIT, Endianness.LITTLE, Rectangle(1, 0, 1, 1), [0xAB],                   [0xAB, 0x00]),
+        (ColorDepth.BPP_8BIT, Endianness.BIG,    Rectangle(0, 0, 2, 1), [0x12, 0x34],             [0x12, 0x34]),
+        (ColorDepth.BPP_1BIT, Endianness.LITTLE, Rectangle(0, 0, 16, 1), [1] + [0]*13 + [1, 1],   [0xC0, 0x01]),
+        (ColorDepth.BPP_1BIT, Endianness.BIG,    Rectangle(0, 0, 16, 1), [1] + [0]*13 + [1, 1],   [0x01, 0xC0]),
+        (ColorDepth.BPP_1BIT, Endianness.LITTLE, Rectangle(13, 0, 4, 1), [1, 1, 1, 0xF],          [0xE0, 0x00, 0x00, 0x01]),
+    ])
+    def test_pack_pixels_into(self, bpp: ColorDepth, endian: Endianness, rect: Rectangle, colour: list, expected_bytes: list):
+        img_info = ImageInfo(endian, bpp, RotateMode.ROTATE_0)
+        original = list(colour)
+        packed = it8951.pack_pixels_into(img_info, rect, colour)
+        self.assertEqual(list(packed), expected_bytes)
+        self.assertEqual(len(packed), it8951.packed_size(bpp, rect))
+        # The input must never be modified
+        self.assertEqual(colour, original)
+
+    def test_pack_pixels_into_preallocated(self):
+        img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+        rect = Rectangle(3, 0, 2, 2)
+        out = bytearray(16)
+        packed = it8951.pack_pixels_into(img_info, rect, bytearray([0xF]*4), out)
+        self.assertIs(packed.obj, out)
+        self.assertEqual(list(packed), [0xF0, 0x00, 0x00, 0x0F]*2)
+        with self.assertRaises(ValueError):
+            it8951.pack_pixels_into(img_info, rect, [0xF]*4, bytearray(7))
+        with self.assertRaises(ValueError):
+            it8951.pack_pixels_into(img_info, rect, [0xF]*3)
+
+    @staticmethod
+    def make_bmp(path: str, width: int, rows: list, bpp: int = 4, top_down: bool = False,
+                 palette: bytes = None):
+        """
+        Writes a minimal BMP file. 'rows' holds the packed bytes of each image
+        row in display (top-down) order, without the 4-byte row padding
+        """
+        stride = ((width*bpp + 31) // 32) * 4
+        if palette is None:
+            palette = bytes(4*(1 << bpp))
+        pixels = b''.join(bytes(r) + bytes(stride - len(r)) for r in (rows if top_down else rows[::-1]))
+        offset = 14 + 40 + len(palette)
+        height = -len(rows) if top_down else len(rows)
+        header = b'BM' + struct.pack('<IHHI', offset + len(pixels), 0, 0, offset)
+        dib = struct.pack('<IiiHHIIiiII', 40, width, height, 1, bpp, 0, len(pixels), 0, 0, 0, 0)
+        with open(path, 'wb') as f:
+            f.write(header + dib + palette + pixels)
+
+    @parameterized.expand([
+        # width, nrows, chunk_size, top_down
+        (4, 3, 4096, False),
+        (4, 3, 4096, True),
+        (6, 5, 4,    False),
+        (6, 5, 8,    True),
+        (8, 7, 1,    False),
+    ])
+    def test_load_bmp(self, width: int, nrows: int, chunk_size: int, top_down: bool):
+        row_bytes = ((width*4 + 15) // 16) * 2
+        rows = [bytes((r*16 + i) & 0xFF for i in range((width+1)//2)) for r in range(nrows)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'img.bmp')
+            self.make_bmp(path, width, rows, 4, top_down)
+            tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, initialise=False)
+            tcon.panel_area = Rectangle(0, 0, 1872, 1404)
+            tcon.load_bmp(4, 8, path, chunk_size)
+        self.assertEqual(self.ncs, 1)
+
+        rows_per_chunk = max(1, chunk_size // row_bytes)
+        info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0).pack_to_u16()
+        expected = [0x60, 0x00, 0x00, 0x21, 0x00, 0x00]
+        expected += list(b''.join(struct.pack('>H', w) for w in [info, 4, 8, width, nrows]))
+        padded = [r + bytes(row_bytes - len(r)) for r in rows]
+        for i in range(0, nrows, rows_per_chunk):
+            expected += [0x00, 0x00] + list(b''.join(padded[i:i+rows_per_chunk]))
+        expected += [0x60, 0x00, 0x00, 0x22]
+        self.assertEqual(self.txed_bytes, expected)
+
+    def test_load_bmp_truncated(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'img.bmp')
+            self.make_bmp(path, 8, [bytes(4)]*4)
+            with open(path, 'r+b') as f:
+                f.truncate(os.path.getsize(path) - 4)
+            tcon = it8951(self.mock_spi, self.mock_ncs, self.mock_hrdy, -1580, initialise=False)
+            tcon.panel_area = Rectangle(0, 0, 1872, 1404)
+            with self.assertRaises(ValueError): tcon.load_bmp(0, 0, path)
+        self.assertEqual(self.ncs, 1)
+        # The load transaction must still be closed
+        self.assertEqual(self.txed_bytes[-4:], [0x60, 0x00, 0x00, 0x22])
+
     # This method is called before any tests are run 
     @classmethod
     def setUpClass(cls):
         def spi_write(data: bytearray):
             assert cls.ncs == 0, "nCS must be set low during SPI TxR"
-            cls.txed_bytes.extend(data)
+            # The SPI peripheral sends the raw bytes of any buffer
+            cls.txed_bytes.extend(bytes(data))
 
         def gpio_set_ncs(val: int):
             cls.ncs = val
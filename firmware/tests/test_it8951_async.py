@@ -0,0 +1,195 @@
+import unittest
+import sys
+import os
+import io
+import asyncio
+import tempfile
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from it8951_async import it8951_async
+from host.it8951_sim import SimulatedIT8951
+from panel_asset import AssetHeader
+from glyph_atlas import GlyphAtlas
+from shadow_fb import ShadowFrameBuffer
+import test_it8951
+import test_panel_asset
+import test_glyph_atlas
+
+class test_it8951_async(unittest.TestCase):
+    print("==[Running it8951 async tests]==")
+    def setUp(self) -> None:
+        # The async driver sleeps, so the simulator has to follow the wall clock
+        self.sim = SimulatedIT8951(width=64, height=32, realtime=True,
+                                   waveform_times={DisplayMode.GC16: 0.05, DisplayMode.INIT: 1.0})
+        self.tcon = it8951_async(self.sim.spi, self.sim.ncs, self.sim.hrdy, None, timeout_ms=500)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    async def ticker(self, ticks: list, stop: asyncio.Event):
+        while not stop.is_set():
+            ticks[0] += 1
+            await asyncio.sleep(0)
+
+    def run_with_ticker(self, coro) -> int:
+        """
+        Runs coro next to a task that counts how often it got to run
+        """
+        ticks = [0]
+        async def main():
+            stop = asyncio.Event()
+            task = asyncio.create_task(self.ticker(ticks, stop))
+            try:
+                await coro
+            finally:
+                stop.set()
+                await task
+        asyncio.run(main())
+        return ticks[0]
+
+    def test_display_area_yields_during_refresh(self):
+        rect = Rectangle(0, 0, 64, 32)
+        async def refresh_twice():
+            await self.tcon.display_area_async(rect, DisplayMode.GC16)
+            await self.tcon.display_area_async(rect, DisplayMode.GC16)
+        ticks = self.run_with_ticker(refresh_twice())
+        self.assertGreater(ticks, 1)
+        first, second = self.sim.refreshes[-2:]
+        self.assertGreaterEqual(second[6], first[7])
+        # The backoff keeps the LUTAFSR polls well below a busy loop's count
+        self.assertLess(self.sim.stats["lutafsr_reads"], 20)
+
+    def test_lut_timeout(self):
+        async def refresh():
+            await self.tcon.fill_rect_async(self.tcon.panel_area, DisplayMode.INIT, 0xF)
+            await self.tcon.wait_display_ready(timeout_ms=20)
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(refresh())
+
+    def test_hrdy_wait_yields(self):
+        self.sim.hrdy_busy_s = 0.01
+        async def read():
+            self.sim._busy(self.sim.hrdy_busy_s)
+            await self.tcon.wait_ready()
+        self.assertGreater(self.run_with_ticker(read()), 1)
+
+    def test_hrdy_timeout(self):
+        self.sim._busy(1.0)
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(self.tcon.wait_ready(timeout_ms=10))
+        self.sim.advance(1.0)
+
+    def test_hrdy_irq_needs_micropython(self):
+        with self.assertRaises(NotImplementedError):
+            it8951_async(self.sim.spi, self.sim.ncs, self.sim.hrdy, None, hrdy_irq=True)
+
+    def test_write_packed_pixels_in_chunks(self):
+        rect = Rectangle(4, 2, 40, 10)
+        img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+        colour = [i % 16 for i in range(rect.area())]
+        data = bytearray(it8951.pack_pixels_into(img_info, rect, colour))
+        async def draw():
+            await self.tcon.write_packed_pixels_async(img_info, rect, data, chunk_size=32)
+            await self.tcon.display_area_async(rect, DisplayMode.GC16)
+        self.assertGreater(self.run_with_ticker(draw()), len(data) // 32)
+        self.assertEqual(self.sim.panel_rect(rect.x, rect.y, rect.width, rect.height), colour)
+        with self.assertRaises(ValueError):
+            asyncio.run(self.tcon.write_packed_pixels_async(img_info, rect, data, chunk_size=31))
+
+    def test_write_packed_pixels_strided(self):
+        img_info = ImageInfo(Endianness.BIG, ColorDepth.BPP_8BIT, RotateMode.ROTATE_0)
+        # An 8bpp framebuffer of the whole panel, e.g. a framebuf.GS8 one
+        fb = bytes(range(256))*8
+        rect = Rectangle(6, 3, 10, 4)
+        view = it8951.packed_view(fb, ColorDepth.BPP_8BIT, 64, rect)
+        async def draw():
+            await self.tcon.write_packed_pixels_async(img_info, rect, view, stride=64)
+            await self.tcon.display_area_async(rect, DisplayMode.GC16)
+        self.assertGreaterEqual(self.run_with_ticker(draw()), rect.height)
+        expected = [fb[(rect.y + y)*64 + rect.x + x] >> 4 for y in range(4) for x in range(10)]
+        self.assertEqual(self.sim.panel_rect(rect.x, rect.y, rect.width, rect.height), expected)
+
+    def test_load_bmp(self):
+        rows = [bytes(((2*i) << 4 | (2*i + 1)) & 0xFF for i in range(4)) for _ in range(5)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'img.bmp')
+            test_it8951.test_it8951.make_bmp(path, 8, rows)
+            async def draw():
+                await self.tcon.load_bmp_async(8, 4, path, chunk_size=8)
+                await self.tcon.display_area_async(Rectangle(8, 4, 8, 5), DisplayMode.GC16)
+            self.assertGreater(self.run_with_ticker(draw()), 2)
+        self.assertEqual(self.sim.panel_rect(8, 4, 8, 1), [3, 2, 1, 0, 7, 6, 5, 4])
+
+    def test_load_asset(self):
+        header = AssetHeader(ColorDepth.BPP_4BIT, Endianness.LITTLE, 16, 4)
+        colour = [i % 16 for i in range(64)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'img.ita')
+            test_panel_asset.make_asset(path, header, colour)
+            async def draw():
+                rect = await self.tcon.load_asset_async(4, 2, path, chunk_size=8)
+                await self.tcon.display_area_async(rect, DisplayMode.GC16)
+            self.assertGreater(self.run_with_ticker(draw()), 2)
+        self.assertEqual(self.sim.panel_rect(4, 2, 16, 4), colour)
+
+    def test_draw_text(self):
+        widths = {ord('a'): 6, ord('b'): 2, ord('c'): 8}
+        atlas = GlyphAtlas(io.BytesIO(test_glyph_atlas.make_atlas(ColorDepth.BPP_4BIT, widths)))
+        async def draw():
+            rect = await self.tcon.draw_text_async(2, 5, "abca", atlas, chunk_size=8)
+            await self.tcon.display_area_async(rect, DisplayMode.GC16)
+            return rect
+        rect = asyncio.run(draw())
+        self.assertEqual(rect.to_list(), [2, 5, 22, test_glyph_atlas.HEIGHT])
+        self.assertIn(Command.LD_IMG_AREA, self.sim.stats["commands"])
+        self.assertEqual(self.sim.panel_rect(2, 5, 6, 1), test_glyph_atlas.glyph_pixels(ord('a'), 6)[:6])
+        self.assertEqual(self.sim.panel_rect(8, 5, 2, 1), test_glyph_atlas.glyph_pixels(ord('b'), 2)[:2])
+
+    def test_display_buffer_area_yields_during_refresh(self):
+        addr = self.sim.img_buff_addr + 64*32
+        rect = Rectangle(8, 4, 16, 8)
+        img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+        self.tcon.set_img_buff_base_address(addr)
+        self.tcon.write_packed_pixels(img_info, rect, bytearray(
+            it8951.pack_pixels_into(img_info, rect, [0x9]*rect.area())))
+        async def refresh_twice():
+            await self.tcon.display_buffer_area_async(rect, DisplayMode.GC16, addr)
+            await self.tcon.display_buffer_area_async(rect, DisplayMode.GC16, addr)
+        self.assertGreater(self.run_with_ticker(refresh_twice()), 1)
+        first, second = self.sim.refreshes[-2:]
+        self.assertEqual(second[5], addr)
+        self.assertGreaterEqual(second[6], first[7])
+        self.assertEqual(self.sim.panel_rect(8, 4, 16, 1), [0x9]*16)
+
+    def test_sync_helpers(self):
+        # The inherited methods keep it8951's contract, so the helpers draw
+        shadow = ShadowFrameBuffer(self.tcon)
+        shadow.fill_rect(Rectangle(0, 0, 16, 8), 0x5)
+        self.assertEqual(len(shadow.flush()), 1)
+        self.tcon._wait_for_display_ready()
+        self.assertEqual(self.sim.panel_rect(0, 0, 16, 1), [0x5]*16)
+
+    def test_cancelled_load_ends_image_load(self):
+        rows = [bytes(4) for _ in range(32)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'img.bmp')
+            test_it8951.test_it8951.make_bmp(path, 8, rows)
+            async def cancel():
+                task = asyncio.create_task(self.tcon.load_bmp_async(0, 0, path, chunk_size=8))
+                await asyncio.sleep(0)
+                await asyncio.sleep(0)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+            asyncio.run(cancel())
+        # The load was closed, even though it was short of rows
+        self.assertEqual(self.sim.errors, ["Image load ended before the area was filled"])
+        self.sim.errors.clear()
+        self.assertIsNone(self.sim._load)
+
+if __name__ == '__main__':
+    unittest.main()
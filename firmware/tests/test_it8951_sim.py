@@ -0,0 +1,233 @@
+import unittest
+from parameterized import parameterized
+import sys
+import os
+import tempfile
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from host.it8951_sim import SimulatedIT8951
+import test_it8951
+
+def make_tcon(sim: SimulatedIT8951, vcom_mV = None, **kwargs) -> it8951:
+    return it8951(sim.spi, sim.ncs, sim.hrdy, vcom_mV, **kwargs)
+
+class test_it8951_sim(unittest.TestCase):
+    print("==[Running it8951 simulator tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=64, height=32)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    @parameterized.expand([(False,), (True,)])
+    def test_initialise(self, strict_hrdy: bool):
+        tcon = make_tcon(self.sim, strict_hrdy=strict_hrdy)
+        self.assertEqual(tcon.device_info.panel_width, 64)
+        self.assertEqual(tcon.device_info.panel_height, 32)
+        self.assertEqual(tcon.device_info.img_buff_addr, self.sim.img_buff_addr)
+        self.assertTrue(tcon.device_info.firmware_version.startswith(self.sim.firmware_version))
+        self.assertEqual(tcon._read_reg(Register.I80CPCR), 1)
+        self.assertEqual(tcon._read_reg(Register.LISAR), self.sim.img_buff_addr & 0xFFFF)
+        self.assertEqual(tcon._read_reg(Register.LISAR+2), self.sim.img_buff_addr >> 16)
+
+    def test_vcom_and_temperature(self):
+        tcon = make_tcon(self.sim)
+        self.assertEqual(tcon.get_vcom(), -1580)
+        tcon.set_vcom(-1750)
+        self.assertEqual(tcon.get_vcom(), -1750)
+        tcon.force_set_temperature(30)
+        self.assertEqual(tcon.get_temperature(), [25, 30])
+        tcon.cancel_force_temperature()
+        self.assertIsNone(self.sim.forced_temperature_C)
+
+    def test_fill_rect(self):
+        tcon = make_tcon(self.sim)
+        tcon.fill_rect(Rectangle(4, 2, 8, 3), DisplayMode.DU, 0xA)
+        self.assertEqual(self.sim.panel_rect(4, 2, 8, 3), [0xA]*24)
+        self.assertEqual(self.sim.panel_rect(0, 0, 4, 1), [0]*4)
+        self.assertEqual(self.sim.refreshes[-1][4], DisplayMode.DU)
+
+    @parameterized.expand([
+        (ColorDepth.BPP_2BIT, Endianness.LITTLE, Rectangle(8, 1, 16, 2)),
+        (ColorDepth.BPP_2BIT, Endianness.BIG,    Rectangle(3, 1, 13, 3)),
+        (ColorDepth.BPP_3BIT, Endianness.LITTLE, Rectangle(1, 0, 6, 2)),
+        (ColorDepth.BPP_4BIT, Endianness.LITTLE, Rectangle(3, 5, 9, 4)),
+        (ColorDepth.BPP_4BIT, Endianness.BIG,    Rectangle(0, 0, 64, 32)),
+        (ColorDepth.BPP_8BIT, Endianness.LITTLE, Rectangle(7, 2, 5, 3)),
+    ])
+    def test_write_and_display(self, bpp: ColorDepth, endian: Endianness, rect: Rectangle):
+        # Number of levels and the 4bpp panel value each level is shown as
+        levels, to_panel = {
+            ColorDepth.BPP_2BIT: (4,   lambda v: v*5),
+            ColorDepth.BPP_3BIT: (8,   lambda v: v*2),
+            ColorDepth.BPP_4BIT: (16,  lambda v: v),
+            ColorDepth.BPP_8BIT: (256, lambda v: v >> 4),
+        }[bpp]
+        tcon = make_tcon(self.sim)
+        if bpp == ColorDepth.BPP_2BIT:
+            tcon.set_bpp_mode(True)
+        img_info = ImageInfo(endian, bpp, RotateMode.ROTATE_0)
+        colour = [(3*i + 1) % levels for i in range(rect.area())]
+        tcon.write_packed_pixels(img_info, rect, bytearray(it8951.pack_pixels_into(img_info, rect, colour)))
+        tcon.display_area(rect, DisplayMode.GC16)
+        expected = [to_panel(v) for v in colour]
+        self.assertEqual(self.sim.panel_rect(rect.x, rect.y, rect.width, rect.height), expected)
+
+    @parameterized.expand([
+        (Endianness.LITTLE, Rectangle(16, 2, 32, 3)),
+        (Endianness.BIG,    Rectangle(8, 0, 24, 2)),
+        (Endianness.LITTLE, Rectangle(21, 5, 10, 4)),
+    ])
+    def test_1bpp(self, endian: Endianness, rect: Rectangle):
+        tcon = make_tcon(self.sim)
+        img_info = ImageInfo(endian, ColorDepth.BPP_1BIT, RotateMode.ROTATE_0)
+        colour = [(i // 3) & 1 for i in range(rect.area())]
+        tcon.write_packed_pixels(img_info, rect, bytearray(it8951.pack_pixels_into(img_info, rect, colour)))
+        tcon.display_1bpp(rect, DisplayMode.A2, foreground=0x00, background=0xF0)
+        expected = [0x0 if c else 0xF for c in colour]
+        self.assertEqual(self.sim.panel_rect(rect.x, rect.y, rect.width, rect.height), expected)
+        self.assertEqual(self.sim.refreshes[-1][4], DisplayMode.A2)
+
+    def test_1bpp_mode_switching(self):
+        tcon = make_tcon(self.sim)
+        rect = Rectangle(0, 0, 16, 1)
+        img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_1BIT, RotateMode.ROTATE_0)
+        tcon.write_packed_pixels(img_info, rect, bytearray(it8951.pack_pixels_into(img_info, rect, [1]*16)))
+        tcon.display_1bpp(rect, foreground=0x50, background=0xF0, wait=False)
+        tcon.display_1bpp(rect, foreground=0x70, background=0xF0, wait=False)
+        self.assertEqual(self.sim.panel_rect(0, 0, 16, 1), [0x7]*16)
+        self.sim.reset_stats()
+        # Back to grayscale: the bitmap flag is only cleared once the LUT
+        # engines are idle, which the simulator checks
+        tcon.display_area(Rectangle(32, 0, 16, 16), DisplayMode.DU, wait=False)
+        self.assertGreater(self.sim.stats["lutafsr_reads"], 1)
+        tcon.fill_rect(Rectangle(32, 0, 16, 16), DisplayMode.DU, 0x3)
+        self.assertEqual(self.sim.panel_rect(32, 0, 1, 1), [0x3])
+        with self.assertRaises(ValueError):
+            tcon.display_1bpp(rect, foreground=0x100)
+
+    def test_1bpp_upload_size(self):
+        tcon = make_tcon(self.sim)
+        rect = Rectangle(0, 0, 64, 32)
+        sent = {}
+        for bpp in (ColorDepth.BPP_1BIT, ColorDepth.BPP_4BIT):
+            img_info = ImageInfo(Endianness.LITTLE, bpp, RotateMode.ROTATE_0)
+            data = bytearray(it8951.pack_pixels_into(img_info, rect, [1]*rect.area()))
+            self.sim.reset_stats()
+            tcon.write_packed_pixels(img_info, rect, data)
+            sent[bpp] = self.sim.stats["bytes_tx"]
+        # The command overhead is the same for both
+        self.assertLess(3*sent[ColorDepth.BPP_1BIT], sent[ColorDepth.BPP_4BIT])
+
+    def test_2bpp_white_needs_bpp_settings(self):
+        tcon = make_tcon(self.sim)
+        img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_2BIT, RotateMode.ROTATE_0)
+        rect = Rectangle(0, 0, 8, 1)
+        tcon.write_packed_pixels(img_info, rect, tcon.pack_pixels(img_info, rect, [3]*8))
+        tcon.display_area(rect, DisplayMode.GC16)
+        self.assertEqual(self.sim.panel_rect(0, 0, 8, 1), [12]*8)
+
+    def test_load_bmp(self):
+        tcon = make_tcon(self.sim)
+        rows = [bytes(((2*i) << 4 | (2*i + 1)) & 0xFF for i in range(4)) for _ in range(5)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'img.bmp')
+            test_it8951.test_it8951.make_bmp(path, 8, rows)
+            tcon.load_bmp(8, 4, path, chunk_size=8)
+        tcon.display_area(Rectangle(8, 4, 8, 5), DisplayMode.GC16)
+        # BMP bytes go out verbatim: 0x01 0x23 -> word 0x0123 -> P0=3, P1=2...
+        self.assertEqual(self.sim.panel_rect(8, 4, 8, 1), [3, 2, 1, 0, 7, 6, 5, 4])
+
+    @parameterized.expand([
+        # width, palette (BGRA of colours 0 and 1), top_down
+        (20, bytes([0xFF]*4 + [0]*4), False),
+        (16, bytes([0]*4 + [0xFF]*4), True),
+    ])
+    def test_load_bmp_1bpp(self, width: int, palette: bytes, top_down: bool):
+        tcon = make_tcon(self.sim)
+        rows = [bytes((0xB4 + 17*r + 3*i) & 0xFF for i in range((width + 7)//8)) for r in range(5)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'img.bmp')
+            test_it8951.test_it8951.make_bmp(path, width, rows, 1, top_down, palette)
+            rect = tcon.load_bmp(16, 3, path, chunk_size=4)
+            with self.assertRaises(ValueError): tcon.load_bmp(8, 3, path)
+        self.assertEqual(rect.to_list(), [16, 3, width, 5])
+        tcon.display_1bpp(rect, DisplayMode.A2, foreground=0x00, background=0xF0)
+        # BMP rows are MSB first. The darker palette colour is the foreground
+        dark = 1 if sum(palette[4:7]) < sum(palette[0:3]) else 0
+        expected = [0x0 if (row[x // 8] >> (7 - x % 8)) & 1 == dark else 0xF
+                    for row in rows for x in range(width)]
+        self.assertEqual(self.sim.panel_rect(16, 3, width, 5), expected)
+
+    def test_display_waits_for_lut(self):
+        tcon = make_tcon(self.sim)
+        rect = Rectangle(0, 0, 64, 32)
+        tcon.display_area(rect, DisplayMode.GC16)
+        self.sim.reset_stats()
+        t = self.sim.now
+        tcon.display_area(rect, DisplayMode.A2)
+        self.assertGreater(self.sim.stats["lutafsr_reads"], 1)
+        self.assertGreaterEqual(self.sim.refreshes[-1][6] - t, 0.9*self.sim.waveform_times[DisplayMode.GC16])
+
+    def test_hrdy_is_polled(self):
+        self.sim.hrdy_busy_s = 50e-6
+        tcon = make_tcon(self.sim)
+        self.sim.reset_stats()
+        tcon.get_temperature()
+        self.assertGreater(self.sim.stats["hrdy_polls"], 3)
+
+    def test_register_cache(self):
+        tcon = make_tcon(self.sim)
+        self.sim.reset_stats()
+        tcon.set_img_buff_base_address(self.sim.img_buff_addr)
+        tcon.set_i80_packed_mode(True)
+        self.assertEqual(tcon._read_reg(Register.LISAR), self.sim.img_buff_addr & 0xFFFF)
+        self.assertEqual(tcon.get_vcom(), -1580)
+        self.assertEqual(self.sim.stats["transactions"], 0)
+        self.assertEqual(tcon.reg_cache_stats, {"read_hits": 2, "write_skips": 3})
+        # Changed values and volatile registers still hit the bus
+        tcon.set_vcom(-1750)
+        tcon.force_set_temperature(30)
+        tcon.force_set_temperature(30)
+        tcon._wait_for_display_ready()
+        tcon._wait_for_display_ready()
+        self.assertEqual(self.sim.stats["commands"][Command.CMD_VCOM], 1)
+        self.assertEqual(self.sim.stats["commands"][Command.CMD_TEMPERATURE], 1)
+        self.assertEqual(self.sim.stats["lutafsr_reads"], 2)
+        self.assertEqual(self.sim.vcom_mV, -1750)
+
+    def test_register_cache_cleared_by_sleep(self):
+        tcon = make_tcon(self.sim)
+        tcon.sleep()
+        self.sim.registers.clear()
+        tcon.system_run()
+        self.assertEqual(tcon._read_reg(Register.I80CPCR), 0)
+        tcon.set_i80_packed_mode(True)
+        self.assertEqual(self.sim.registers[Register.I80CPCR], 1)
+
+    def test_bitmap_mode_cleared_by_sleep(self):
+        tcon = make_tcon(self.sim)
+        rect = Rectangle(0, 0, 16, 1)
+        img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_1BIT, RotateMode.ROTATE_0)
+        data = bytearray(it8951.pack_pixels_into(img_info, rect, [1]*16))
+        tcon.write_packed_pixels(img_info, rect, data)
+        tcon.display_1bpp(rect, foreground=0x50, background=0xF0)
+        tcon.sleep()
+        self.sim.registers.clear()
+        tcon.system_run()
+        tcon.write_packed_pixels(img_info, rect, data)
+        tcon.display_1bpp(rect, foreground=0x70, background=0xF0)
+        self.assertEqual(self.sim.panel_rect(0, 0, 16, 1), [0x7]*16)
+
+    def test_protocol_errors_are_recorded(self):
+        tcon = make_tcon(self.sim)
+        tcon._send_command(0x0999)
+        self.assertEqual(len(self.sim.errors), 1)
+        self.sim.errors.clear()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+from parameterized import parameterized
+import sys
+import os
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from lvgl_display import rgb332_lut, convert, round_area, merge, EpdDisplay
+from update_queue import UpdateQueue
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+class Area:
+    """
+    Fields of lv_area_t that the callbacks use
+    """
+    def __init__(self, x1: int, y1: int, x2: int, y2: int):
+        self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
+
+class Pixels:
+    """
+    The lv_color_t pointer passed to the flush callback
+    """
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __dereference__(self, size: int) -> memoryview:
+        return memoryview(self.data)[:size]
+
+class DispDrv:
+    """
+    The lv_disp_drv_t methods that the flush callback calls
+    """
+    def __init__(self, last: bool):
+        self.last = last
+        self.ready = 0
+
+    def flush_is_last(self) -> bool:
+        return self.last
+
+    def flush_ready(self):
+        self.ready += 1
+
+# Colour table of pixels that are grey levels in their low nibble
+GREYS = bytes(c & 0xF for c in range(256))
+
+class test_lvgl_display(unittest.TestCase):
+    print("==[Running LVGL display tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=64, height=32)
+        self.tcon = make_tcon(self.sim)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    def band(self, rect: Rectangle) -> bytes:
+        """
+        Pixels of a band, a greyscale ramp by x, for the GREYS table
+        """
+        return bytes((rect.x + x) % 16 for _ in range(rect.height) for x in range(rect.width))
+
+    def test_lut(self):
+        lut = rgb332_lut()
+        self.assertEqual((lut[0x00], lut[0xFF], lut[0xE0], lut[0x1C], lut[0x03]), (0, 15, 4, 9, 2))
+        self.assertTrue(all(lut[i] <= 15 for i in range(256)))
+
+    @parameterized.expand([(0, 8), (1, 6), (2, 5), (3, 1), (4, 7)])
+    def test_convert(self, x: int, width: int):
+        lut = rgb332_lut()
+        rect = Rectangle(x, 0, width, 3)
+        pixels = bytes((17*i + 5) & 0xFF for i in range(rect.area()))
+        out = bytearray(it8951.packed_size(ColorDepth.BPP_4BIT, rect))
+        expected = it8951.pack_pixels_into(
+            ImageInfo(Endianness.BIG, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0), rect,
+            [lut[p] for p in pixels])
+        self.assertEqual(convert(pixels, rect, lut, out), len(expected))
+        # Only the padding may differ
+        pad = x % 4
+        row_bytes = len(out) // rect.height
+        for row in range(rect.height):
+            for px in range(pad, pad + width):
+                o = row*row_bytes + px // 2
+                shift = 4*(px & 1)
+                self.assertEqual((out[o] >> shift) & 0xF, (expected[o] >> shift) & 0xF)
+        with self.assertRaises(ValueError):
+            convert(pixels, rect, lut, bytearray(len(out) - 1))
+
+    def test_round_area(self):
+        self.assertEqual(round_area(5, 9, 63), (4, 11))
+        self.assertEqual(round_area(8, 11, 63), (8, 11))
+        self.assertEqual(round_area(61, 62, 63), (60, 63))
+        area = Area(13, 2, 14, 3)
+        EpdDisplay(self.tcon).rounder_cb(None, area)
+        self.assertEqual((area.x1, area.x2), (12, 15))
+
+    def test_merge(self):
+        self.assertEqual(merge(Rectangle(8, 0, 16, 4), Rectangle(8, 4, 16, 4)).to_list(),
+                         [8, 0, 16, 8])
+        self.assertEqual(merge(Rectangle(8, 0, 8, 4), Rectangle(16, 0, 8, 4)).to_list(),
+                         [8, 0, 16, 4])
+        self.assertIsNone(merge(Rectangle(8, 0, 16, 4), Rectangle(8, 5, 16, 4)))
+        self.assertIsNone(merge(Rectangle(8, 0, 16, 4), Rectangle(12, 4, 16, 4)))
+
+    def test_bands_are_refreshed_once(self):
+        disp = EpdDisplay(self.tcon, DisplayMode.GC16, lut=GREYS)
+        # A 40x16 area flushed through a 40x4 draw buffer, and a separate one
+        bands = [Rectangle(8, y, 40, 4) for y in range(4, 20, 4)] + [Rectangle(0, 24, 8, 2)]
+        for i, rect in enumerate(bands):
+            refreshed = disp.flush(rect.x, rect.y, rect.x + rect.width - 1,
+                                   rect.y + rect.height - 1, self.band(rect),
+                                   last=i == len(bands) - 1)
+        self.assertEqual([r.to_list() for r in refreshed], [[8, 4, 40, 16], [0, 24, 8, 2]])
+        self.assertEqual([r[:5] for r in self.sim.refreshes],
+                         [(8, 4, 40, 16, DisplayMode.GC16), (0, 24, 8, 2, DisplayMode.GC16)])
+        self.assertEqual(disp.stats, {"flushes": 5, "bytes": 4*80 + 8, "refreshes": 2})
+        self.assertEqual(self.sim.panel_rect(8, 10, 40, 1), [(8 + x) % 16 for x in range(40)])
+        self.assertEqual(self.sim.panel_rect(0, 25, 9, 1), list(range(8)) + [0])
+        # Nothing is pending after the last flush
+        self.assertEqual(disp.refresh(), [])
+
+    def test_unaligned_flush(self):
+        disp = EpdDisplay(self.tcon, DisplayMode.GC16, lut=GREYS)
+        rect = Rectangle(5, 1, 7, 2)
+        disp.flush(5, 1, 11, 2, self.band(rect))
+        self.assertEqual(self.sim.panel_rect(4, 1, 9, 1), [0] + [(5 + x) % 16 for x in range(7)] + [0])
+        with self.assertRaises(ValueError):
+            disp.flush(0, 0, 3, 0, bytes(3))
+        with self.assertRaises(ValueError):
+            EpdDisplay(self.tcon, lut=bytes(16))
+
+    def test_flush_cb(self):
+        disp = EpdDisplay(self.tcon, DisplayMode.GC16)
+        drv = DispDrv(last=False)
+        disp.flush_cb(drv, Area(0, 0, 15, 1), Pixels(bytes([0xFF])*64))
+        self.assertEqual((drv.ready, self.sim.refreshes), (1, []))
+        drv.last = True
+        disp.flush_cb(drv, Area(0, 2, 15, 3), Pixels(bytes([0xFF])*64))
+        self.assertEqual(drv.ready, 2)
+        self.assertEqual([r[:4] for r in self.sim.refreshes], [(0, 0, 16, 4)])
+        self.assertEqual(self.sim.panel_rect(0, 0, 16, 4), [0xF]*64)
+
+    def test_queue(self):
+        disp = EpdDisplay(self.tcon, DisplayMode.DU, queue=UpdateQueue(self.tcon))
+        for cycle in range(2):
+            for y in range(0, 8, 2):
+                disp.flush(0, y, 15, y + 1, bytes([0xFF*cycle])*32, last=y == 6)
+        disp.queue.wait_idle()
+        self.assertEqual(len(self.sim.refreshes), 2)
+        self.assertEqual(self.sim.panel_rect(0, 0, 16, 8), [0xF]*128)
+        self.assertEqual(self.sim.hazards, [])
+
+if __name__ == '__main__':
+    unittest.main()
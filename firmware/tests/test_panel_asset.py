@@ -0,0 +1,151 @@
+import unittest
+from parameterized import parameterized
+import sys
+import os
+import io
+import tempfile
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from panel_asset import AssetHeader, Compression, rle_encode, rle_decode
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+def make_asset(path: str, header: AssetHeader, colour: list):
+    """
+    Writes an asset with pure Python packing. colour holds the pixels of
+    the whole image in row-major order.
+    """
+    img_info = header.img_info()
+    tiles = []
+    for ty in range(0, header.height, header.tile_height):
+        for tx in range(0, header.width, header.tile_width):
+            pixels = [colour[(ty + y)*header.width + tx + x]
+                      for y in range(header.tile_height) for x in range(header.tile_width)]
+            rect = Rectangle(header.x_phase, 0, header.tile_width, header.tile_height)
+            tile = bytes(it8951.pack_pixels_into(img_info, rect, pixels))
+            tiles.append(rle_encode(tile) if header.compression == Compression.RLE else tile)
+    with open(path, 'wb') as f:
+        f.write(header.to_bytes() + AssetHeader.pack_index([len(t) for t in tiles]) + b''.join(tiles))
+
+def decode(coded: bytes, length: int, cap: int = 64, size: int = None) -> bytes:
+    chunks = rle_decode(io.BytesIO(coded), len(coded) if size is None else size, length)
+    next(chunks)
+    out = memoryview(bytearray(cap))
+    decoded = bytearray()
+    for n in it8951._run_chunks(chunks, out):
+        decoded += out[:n]
+    return bytes(decoded)
+
+class test_panel_asset(unittest.TestCase):
+    print("==[Running panel asset tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=64, height=32)
+        self.tcon = make_tcon(self.sim)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'img.ita')
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    def test_header(self):
+        header = AssetHeader(ColorDepth.BPP_2BIT, Endianness.BIG, 64, 16, 16, 8, x_phase=4)
+        parsed = AssetHeader.from_bytes(header.to_bytes())
+        self.assertEqual(vars(parsed), vars(header))
+        self.assertEqual(parsed.ntiles, 8)
+        # 4 pad pixels + 16 pixels -> 3 words per row
+        self.assertEqual(parsed.tile_size, 8*3*2)
+        with self.assertRaises(ValueError):
+            AssetHeader.from_bytes(b'BM' + header.to_bytes()[2:])
+        with self.assertRaises(ValueError):
+            AssetHeader(ColorDepth.BPP_4BIT, Endianness.BIG, 64, 16, 24, 8)
+        with self.assertRaises(ValueError):
+            AssetHeader(ColorDepth.BPP_4BIT, Endianness.BIG, 64, 16, x_phase=4)
+
+    @parameterized.expand([
+        (ColorDepth.BPP_4BIT, Endianness.LITTLE, 8,  0),
+        (ColorDepth.BPP_4BIT, Endianness.BIG,    13, 1),
+        (ColorDepth.BPP_8BIT, Endianness.LITTLE, 2,  0),
+        (ColorDepth.BPP_2BIT, Endianness.BIG,    4,  4),
+    ])
+    def test_load_asset(self, bpp: ColorDepth, endian: Endianness, x: int, x_phase: int):
+        header = AssetHeader(bpp, endian, 12, 5, x_phase=x_phase)
+        levels = {ColorDepth.BPP_2BIT: 4, ColorDepth.BPP_4BIT: 16, ColorDepth.BPP_8BIT: 256}[bpp]
+        colour = [(3*i) % levels for i in range(12*5)]
+        make_asset(self.path, header, colour)
+        self.tcon.set_bpp_mode(True)
+        rect = self.tcon.load_asset(x, 3, self.path, chunk_size=7)
+        self.assertEqual(rect.to_list(), [x, 3, 12, 5])
+        to_panel = {ColorDepth.BPP_2BIT: lambda c: 5*c, ColorDepth.BPP_4BIT: lambda c: c,
+                    ColorDepth.BPP_8BIT: lambda c: c >> 4}[bpp]
+        self.tcon.display_area(rect, DisplayMode.GC16)
+        self.assertEqual(self.sim.panel_rect(x, 3, 12, 5), [to_panel(c) for c in colour])
+
+    def test_load_tile(self):
+        header = AssetHeader(ColorDepth.BPP_4BIT, Endianness.LITTLE, 16, 8, 8, 4)
+        colour = [(x // 8) + 2*(y // 4) for y in range(8) for x in range(16)]
+        make_asset(self.path, header, colour)
+        for tile in range(4):
+            rect = self.tcon.load_asset(8*tile, 0, self.path, tile)
+            self.assertEqual(rect.to_list(), [8*tile, 0, 8, 4])
+        self.tcon.display_area(self.tcon.panel_area, DisplayMode.GC16)
+        self.assertEqual(self.sim.panel_rect(0, 0, 32, 1), [0]*8 + [1]*8 + [2]*8 + [3]*8)
+        with self.assertRaises(ValueError):
+            self.tcon.load_asset(0, 0, self.path, 4)
+        # x must match the phase the rows were aligned for
+        with self.assertRaises(ValueError):
+            self.tcon.load_asset(2, 0, self.path)
+
+    @parameterized.expand([
+        (b'',),
+        (b'\x12',),
+        (b'\xFF'*1000,),
+        (b'\x00\x00\x01\x01\x01\x02',),
+        (bytes(range(256))*2,),
+        (bytes(range(200)) + b'\xF0'*3 + b'\x0F'*300 + bytes(range(5)),),
+    ])
+    def test_rle_round_trip(self, data: bytes):
+        coded = rle_encode(data)
+        if len(data) > 10 and data[0] == data[-1]:
+            self.assertLess(len(coded), len(data) // 50)
+        for cap in (2, 8, 130, 4096):
+            self.assertEqual(decode(coded, len(data), cap), data)
+
+    def test_rle_corrupt(self):
+        coded = rle_encode(b'\xFF'*300)
+        with self.assertRaises(ValueError):
+            decode(coded, 200)
+        with self.assertRaises(ValueError):
+            decode(coded, 400)
+        with self.assertRaises(ValueError):
+            decode(coded[:-1], 300, size=len(coded))
+
+    @parameterized.expand([(2,), (6,), (4096,)])
+    def test_load_compressed_asset(self, chunk_size: int):
+        header = AssetHeader(ColorDepth.BPP_4BIT, Endianness.LITTLE, 32, 16, 16, 16,
+                             compression=Compression.RLE)
+        # Sparse ink on white
+        colour = [0x0 if x == y or y == 12 else 0xF for y in range(16) for x in range(32)]
+        make_asset(self.path, header, colour)
+        self.assertLess(os.path.getsize(self.path), 2*header.tile_size)
+        for tile in range(2):
+            self.tcon.load_asset(16*tile, 8, self.path, tile, chunk_size=chunk_size)
+        self.tcon.display_area(self.tcon.panel_area, DisplayMode.GC16)
+        self.assertEqual(self.sim.panel_rect(0, 8, 32, 16), colour)
+
+    def test_truncated_asset(self):
+        header = AssetHeader(ColorDepth.BPP_4BIT, Endianness.LITTLE, 16, 8)
+        make_asset(self.path, header, [0]*128)
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 8)
+        with self.assertRaises(ValueError):
+            self.tcon.load_asset(0, 0, self.path)
+        self.assertEqual(self.sim.errors, ["Image load ended before the area was filled"])
+        self.sim.errors.clear()
+
+if __name__ == '__main__':
+    unittest.main()
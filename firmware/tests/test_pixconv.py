@@ -0,0 +1,127 @@
+import unittest
+from parameterized import parameterized
+import sys
+import os
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from pixconv import grey_lut, grey_values, pair_lut, bayer_lut, convert, \
+    Quantiser, OrderedDither, ErrorDiffusion
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+DEPTHS = [(ColorDepth.BPP_1BIT,), (ColorDepth.BPP_2BIT,), (ColorDepth.BPP_4BIT,)]
+
+def unpack(data, bpp: ColorDepth, width: int) -> list:
+    """
+    Pixel values of a row in the IT8951's big endian packing
+    """
+    bits = 8 // ColorDepth.pixel_per_byte(bpp)
+    mask = (1 << bits) - 1
+    return [(data[i*bits // 8] >> (i*bits % 8)) & mask for i in range(width)]
+
+class test_pixconv(unittest.TestCase):
+    print("==[Running pixel conversion tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=64, height=32)
+        self.tcon = make_tcon(self.sim)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    def test_tables(self):
+        lut = grey_lut(ColorDepth.BPP_4BIT)
+        self.assertEqual((lut[0], lut[8], lut[9], lut[128], lut[255]), (0, 0, 1, 8, 15))
+        # 1 marks the dark pixels at 1bpp
+        lut = grey_lut(ColorDepth.BPP_1BIT)
+        self.assertEqual((lut[0], lut[127], lut[128], lut[255]), (1, 1, 0, 0))
+        self.assertEqual(list(grey_values(ColorDepth.BPP_2BIT)[:4]), [0, 85, 170, 255])
+        self.assertEqual(list(grey_values(ColorDepth.BPP_1BIT)[:2]), [255, 0])
+        pairs = pair_lut(ColorDepth.BPP_4BIT)
+        self.assertEqual(pairs[0xFF00], 0xF0)
+        self.assertIs(pair_lut(ColorDepth.BPP_4BIT), pairs)
+        self.assertEqual(len(bayer_lut(ColorDepth.BPP_2BIT)), 4096)
+        with self.assertRaises(ValueError):
+            grey_lut(ColorDepth.BPP_8BIT)
+
+    @parameterized.expand(DEPTHS)
+    def test_quantiser(self, bpp: ColorDepth):
+        lut = grey_lut(bpp)
+        for width in (16, 13, 3):
+            src = bytes((37*i + 11) & 0xFF for i in range(width))
+            out = bytearray(width)
+            Quantiser(bpp).row(src, out)
+            self.assertEqual(unpack(out, bpp, width), [lut[v] for v in src])
+
+    @parameterized.expand([(ColorDepth.BPP_1BIT, 8), (ColorDepth.BPP_2BIT, 4),
+                           (ColorDepth.BPP_4BIT, 2), (ColorDepth.BPP_4BIT, 4)])
+    def test_convert_matches_pack_pixels(self, bpp: ColorDepth, x: int):
+        lut = grey_lut(bpp)
+        rect = Rectangle(x, 3, 21, 4)
+        pixels = bytes((29*i + 3) & 0xFF for i in range(rect.area()))
+        img_info, data = convert(pixels, rect, Quantiser(bpp))
+        expected = it8951.pack_pixels_into(img_info, rect, [lut[v] for v in pixels])
+        self.assertEqual(bytes(data), bytes(expected))
+        with self.assertRaises(ValueError):
+            convert(pixels, Rectangle(x + 1, 3, 21, 4), Quantiser(bpp))
+        with self.assertRaises(ValueError):
+            convert(pixels, rect, Quantiser(bpp), bytearray(len(data) - 1))
+
+    @parameterized.expand(DEPTHS)
+    def test_ordered_dither(self, bpp: ColorDepth):
+        values = grey_values(bpp)
+        top = (1 << (8 // ColorDepth.pixel_per_byte(bpp))) - 1
+        rect = Rectangle(0, 0, 8, 8)
+        for grey in (0, 50, 128, 200, 255):
+            _, data = convert(bytes([grey])*64, rect, OrderedDither(bpp))
+            row_bytes = len(data) // 8
+            levels = []
+            for row in range(8):
+                levels += unpack(data[row*row_bytes:], bpp, 8)
+            # The mean grey level is kept within half a step
+            mean = sum(values[v] for v in levels) / 64
+            self.assertLessEqual(abs(mean - grey), 255 / top / 2, grey)
+            if grey in (0, 255):
+                self.assertEqual(len(set(levels)), 1)
+
+    def test_ordered_dither_tiles(self):
+        # Converting an area in 2 parts gives the same pixels as in one
+        bpp = ColorDepth.BPP_2BIT
+        pixels = bytes((7*i) & 0xFF for i in range(32*4))
+        _, whole = convert(pixels, Rectangle(0, 0, 32, 4), OrderedDither(bpp))
+        top = bytes(convert(pixels[:64], Rectangle(0, 0, 32, 2), OrderedDither(bpp))[1])
+        bottom = bytes(convert(pixels[64:], Rectangle(0, 2, 32, 2), OrderedDither(bpp))[1])
+        self.assertEqual(bytes(whole), top + bottom)
+
+    @parameterized.expand(DEPTHS)
+    def test_error_diffusion(self, bpp: ColorDepth):
+        values = grey_values(bpp)
+        rect = Rectangle(0, 0, 32, 32)
+        quantiser = ErrorDiffusion(bpp, 32)
+        for grey in (0, 30, 128, 230, 255):
+            _, data = convert(bytes([grey])*rect.area(), rect, quantiser)
+            row_bytes = len(data) // rect.height
+            levels = []
+            for row in range(rect.height):
+                levels += unpack(data[row*row_bytes:], bpp, rect.width)
+            mean = sum(values[v] for v in levels) / rect.area()
+            self.assertLess(abs(mean - grey), 4, grey)
+            if grey in (0, 255):
+                self.assertEqual(len(set(levels)), 1)
+        with self.assertRaises(ValueError):
+            quantiser.row(bytes(31), bytearray(32))
+
+    def test_upload(self):
+        bpp = ColorDepth.BPP_4BIT
+        rect = Rectangle(6, 2, 20, 3)
+        pixels = bytes(17*(i % 16) for i in range(rect.area()))
+        img_info, data = convert(pixels, rect, Quantiser(bpp))
+        self.tcon.write_packed_pixels(img_info, rect, data)
+        self.tcon.display_area(rect, DisplayMode.GC16)
+        self.assertEqual(self.sim.panel_rect(6, 2, 20, 3), [i % 16 for i in range(rect.area())])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+from parameterized import parameterized
+import sys
+import os
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from shadow_fb import ShadowFrameBuffer
+from waveform import WaveformScheduler
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+class test_shadow_fb(unittest.TestCase):
+    print("==[Running shadow framebuffer tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=64, height=48)
+        self.tcon = make_tcon(self.sim)
+        # The panel starts white, as the shadow framebuffer assumes
+        self.tcon.fill_rect(self.tcon.panel_area, DisplayMode.INIT, 0xF)
+        self.sim.advance(self.sim.waveform_times[DisplayMode.INIT])
+        self.fb = ShadowFrameBuffer(self.tcon, 16, 16)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    def assertPanelMatches(self):
+        expected = [self.fb.get_pixel(x, y) for y in range(self.fb.height) for x in range(self.fb.width)]
+        self.assertEqual(self.sim.panel_rect(0, 0, 64, 48), expected)
+
+    @parameterized.expand([
+        (Rectangle(0, 0, 1, 1),),
+        (Rectangle(3, 5, 10, 7),),
+        (Rectangle(4, 4, 9, 3),),
+        (Rectangle(60, 40, 10, 10),),
+    ])
+    def test_fill_rect(self, rect: Rectangle):
+        self.fb.fill_rect(rect, 0x3)
+        for y in range(self.fb.height):
+            for x in range(self.fb.width):
+                inside = rect.x <= x < rect.x + rect.width and rect.y <= y < rect.y + rect.height
+                self.assertEqual(self.fb.get_pixel(x, y), 0x3 if inside else 0xF, (x, y))
+
+    def test_flush_uploads_changed_tiles_only(self):
+        self.fb.fill_rect(Rectangle(18, 20, 4, 4), 0x0)
+        self.sim.reset_stats()
+        areas = self.fb.flush(DisplayMode.DU)
+        self.assertEqual([a.to_list() for a, _ in areas], [[16, 16, 16, 16]])
+        self.assertPanelMatches()
+        # A 16x16 4bpp tile is 128 bytes of pixel data
+        self.assertLess(self.sim.stats["bytes_tx"], 128 + 100)
+        self.assertEqual(self.sim.refreshes[-1][:5], (16, 16, 16, 16, DisplayMode.DU))
+
+    def test_flush_merges_tiles(self):
+        self.fb.fill_rect(Rectangle(2, 2, 40, 20), 0x5)
+        areas = self.fb.flush()
+        self.assertEqual([a.to_list() for a, _ in areas], [[0, 0, 48, 32]])
+        self.assertPanelMatches()
+
+    @parameterized.expand([
+        (Rectangle(0, 0, 16, 2),),
+        (Rectangle(4, 3, 7, 2),),
+        (Rectangle(12, 1, 21, 3),),
+    ])
+    def test_packed_area_2bpp(self, rect: Rectangle):
+        colour = [5*(i % 4) for i in range(rect.area())]
+        self.fb.blit(rect, colour)
+        img_info = ImageInfo(Endianness.BIG, ColorDepth.BPP_2BIT, RotateMode.ROTATE_0)
+        expected = it8951.pack_pixels_into(img_info, rect, [c // 5 for c in colour])
+        self.assertEqual(self.fb.packed_area_2bpp(rect), bytearray(expected))
+        self.fb.pixel(rect.x + rect.width - 1, rect.y, 0x7)
+        self.assertIsNone(self.fb.packed_area_2bpp(rect))
+
+    def test_flush_picks_2bpp(self):
+        self.fb.fill_rect(Rectangle(0, 0, 32, 16), 0x0)
+        self.fb.fill_rect(Rectangle(8, 4, 8, 8), 0xA)
+        self.sim.reset_stats()
+        self.fb.flush(DisplayMode.GC16)
+        self.assertPanelMatches()
+        self.assertTrue(self.sim.bpp2_white)
+        # 32x16 pixels are 128 bytes at 2bpp, 256 at 4bpp
+        self.assertLess(self.sim.stats["bytes_tx"], 128 + 100)
+        self.assertEqual(self.sim.stats["commands"].get(Command.BPP_SETTINGS), 1)
+        # BPP_SETTINGS is only sent once
+        self.fb.fill_rect(Rectangle(40, 20, 4, 4), 0x5)
+        self.sim.reset_stats()
+        self.fb.flush(DisplayMode.GC16)
+        self.assertIsNone(self.sim.stats["commands"].get(Command.BPP_SETTINGS))
+        self.assertPanelMatches()
+
+    def test_flush_keeps_4bpp_for_other_levels(self):
+        self.fb.fill_rect(Rectangle(0, 0, 32, 16), 0x0)
+        self.fb.pixel(31, 15, 0x3)
+        self.sim.reset_stats()
+        self.fb.flush(DisplayMode.GC16)
+        self.assertPanelMatches()
+        self.assertGreater(self.sim.stats["bytes_tx"], 256)
+        self.assertFalse(self.sim.bpp2_white)
+
+    def test_redrawing_same_content_is_free(self):
+        self.fb.fill_rect(Rectangle(0, 0, 8, 8), 0x0)
+        self.fb.flush()
+        self.fb.fill_rect(Rectangle(0, 0, 8, 8), 0x0)
+        self.sim.reset_stats()
+        self.assertEqual(self.fb.flush(), [])
+        self.assertEqual(self.sim.stats["transactions"], 0)
+
+    def test_invalidate_forces_upload(self):
+        self.assertEqual(self.fb.flush(), [])
+        self.fb.invalidate()
+        areas = self.fb.flush()
+        self.assertEqual([a.to_list() for a, _ in areas], [[0, 0, 64, 48]])
+
+    def test_invalidate_refreshes_with_gc16(self):
+        self.fb.scheduler = WaveformScheduler(self.tcon.panel_area)
+        self.fb.fill_rect(Rectangle(0, 0, 16, 16), 0x7)
+        self.fb.flush()
+        # A black tile next to the forced grey one is merged into its area
+        self.fb.fill_rect(Rectangle(16, 0, 16, 16), 0x0)
+        self.fb.invalidate(Rectangle(0, 0, 16, 16))
+        areas = self.fb.flush()
+        self.assertEqual([(a.to_list(), m) for a, m in areas], [([0, 0, 32, 16], DisplayMode.GC16)])
+        self.assertEqual(self.sim.refreshes[-1][4], DisplayMode.GC16)
+        self.fb.invalidate()
+        self.assertEqual({m for _, m in self.fb.flush()}, {DisplayMode.GC16})
+
+    def test_blit(self):
+        rect = Rectangle(5, 3, 7, 2)
+        colour = [i % 16 for i in range(rect.area())]
+        self.fb.blit(rect, colour)
+        self.fb.flush()
+        self.assertEqual(self.sim.panel_rect(5, 3, 7, 2), colour)
+        self.assertPanelMatches()
+
+    def test_blit_packed(self):
+        # 3 pixels per row: (1, 2, 3) and (4, 5, 6)
+        data = bytes([0x21, 0x03, 0x54, 0x06])
+        self.fb.blit_packed(10, 1, data, 3, 2)
+        self.assertEqual([self.fb.get_pixel(x, 1) for x in range(9, 14)], [0xF, 1, 2, 3, 0xF])
+        self.assertEqual([self.fb.get_pixel(x, 2) for x in range(9, 14)], [0xF, 4, 5, 6, 0xF])
+        with self.assertRaises(ValueError):
+            self.fb.blit_packed(11, 1, data, 3, 2)
+
+if __name__ == '__main__':
+    unittest.main()
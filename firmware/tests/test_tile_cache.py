@@ -0,0 +1,120 @@
+import unittest
+import sys
+import os
+import tempfile
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from tile_cache import fnv1a, tile_key, TileCache, TileLayer
+from update_queue import UpdateQueue
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+class test_tile_cache(unittest.TestCase):
+    print("==[Running tile cache tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=64, height=32)
+        self.tcon = make_tcon(self.sim)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.renders = []
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    def render(self, rect: Rectangle, img_info: ImageInfo):
+        """
+        Fills the cell with the grey level of its first event
+        """
+        colour = self.inputs[1][0] if self.inputs[1] else 0xF
+        self.renders.append(rect)
+        return it8951.pack_pixels_into(img_info, rect, [colour]*rect.area())
+
+    def draw(self, layer: TileLayer, cell: int, events: tuple, mode = None) -> bool:
+        self.inputs = ("2024-03-%02d" % cell, events, "light")
+        rect = Rectangle(16*(cell % 4), 16*(cell // 4), 16, 16)
+        return layer.draw(cell, rect, self.inputs, self.render, mode)
+
+    def test_fnv1a(self):
+        self.assertEqual(fnv1a(b''), 0x811C9DC5)
+        self.assertEqual(fnv1a(b'a'), 0xE40C292C)
+        self.assertEqual(fnv1a(b'foobar'), 0xBF9CF968)
+        self.assertEqual(fnv1a(b'bar', fnv1a(b'foo')), fnv1a(b'foobar'))
+        self.assertEqual(tile_key("2024-03-01", (1, "Gym")), tile_key("2024-03-01", (1, "Gym")))
+        self.assertNotEqual(tile_key("2024-03-01", (1, "Gym")), tile_key("2024-03-01", (2, "Gym")))
+
+    def test_ram_lru(self):
+        cache = TileCache(ram_bytes=300)
+        for key in range(3):
+            cache.put(key, bytes([key])*100)
+        self.assertEqual(cache.get(0), bytes(100))
+        # Evicts 1, the least recently used
+        cache.put(3, b'\x03'*100)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.get(2), b'\x02'*100)
+        self.assertEqual(cache.stats, {"hits": 2, "flash_hits": 0, "misses": 1, "evictions": 1,
+                                       "ram_used": 300, "flash_used": 0})
+        # Replacing a tile doesn't count it twice
+        cache.put(2, b'\x02'*50)
+        self.assertEqual(cache.stats["ram_used"], 250)
+        with self.assertRaises(ValueError):
+            TileCache(ram_bytes=0)
+
+    def test_flash_spill(self):
+        flash_dir = os.path.join(self.tmp.name, "tiles")
+        cache = TileCache(ram_bytes=200, flash_dir=flash_dir, flash_bytes=200)
+        for key in range(5):
+            cache.put(key, bytes([key])*100)
+        # 3 and 4 in RAM, 1 and 2 in flash, 0 dropped
+        self.assertEqual(sorted(os.listdir(flash_dir)), ["00000001.tile", "00000002.tile"])
+        self.assertEqual(cache.stats["flash_used"], 200)
+        self.assertIsNone(cache.get(0))
+        self.assertEqual(cache.get(1), b'\x01'*100)
+        self.assertEqual(cache.stats["flash_hits"], 1)
+        # The flash tiles survive a reset
+        restored = TileCache(ram_bytes=200, flash_dir=flash_dir, flash_bytes=200)
+        self.assertEqual(restored.stats["flash_used"], cache.stats["flash_used"])
+        self.assertEqual(restored.get(2), b'\x02'*100)
+
+    def test_unchanged_cells_are_skipped(self):
+        layer = TileLayer(self.tcon)
+        for cell in range(8):
+            self.assertTrue(self.draw(layer, cell, ()))
+        self.assertTrue(self.draw(layer, 5, (0x0, "Dentist")))
+        self.sim.reset_stats()
+        for cell in range(8):
+            self.assertFalse(self.draw(layer, cell, (0x0, "Dentist") if cell == 5 else ()))
+        self.assertEqual(self.sim.stats["transactions"], 0)
+        self.assertEqual(layer.stats, {"skipped": 8, "uploaded": 9, "rendered": 9})
+        self.tcon.display_area(self.tcon.panel_area, DisplayMode.GC16)
+        self.assertEqual(self.sim.panel_rect(16, 16, 16, 1), [0x0]*16)
+        self.assertEqual(self.sim.panel_rect(32, 16, 16, 1), [0xF]*16)
+
+    def test_known_tiles_are_not_rendered(self):
+        layer = TileLayer(self.tcon)
+        self.draw(layer, 1, (0x8, "Gym"))
+        self.draw(layer, 1, (0x3, "Lunch"))
+        self.draw(layer, 1, (0x8, "Gym"))
+        self.assertEqual(len(self.renders), 2)
+        self.assertEqual(layer.cache.stats["hits"], 1)
+        self.tcon.display_area(self.tcon.panel_area, DisplayMode.GC16)
+        self.assertEqual(self.sim.panel_rect(16, 0, 16, 1), [0x8]*16)
+        # A cleared panel needs every cell again, from the cache
+        self.tcon.fill_rect(self.tcon.panel_area, DisplayMode.INIT, 0xF)
+        layer.invalidate()
+        self.assertTrue(self.draw(layer, 1, (0x8, "Gym")))
+        self.assertEqual(len(self.renders), 2)
+
+    def test_queue(self):
+        layer = TileLayer(self.tcon, queue=UpdateQueue(self.tcon))
+        for cell in range(4):
+            self.draw(layer, cell, (cell,), DisplayMode.DU)
+        layer.queue.wait_idle()
+        self.assertEqual(self.sim.panel_rect(0, 0, 64, 1), [0]*16 + [1]*16 + [2]*16 + [3]*16)
+        self.assertEqual(self.sim.hazards, [])
+
+if __name__ == '__main__':
+    unittest.main()
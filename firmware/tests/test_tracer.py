@@ -0,0 +1,140 @@
+import unittest
+import sys
+import os
+import io
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from tracer import Tracer, TracedSPI
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+class test_tracer(unittest.TestCase):
+    print("==[Running tracer tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=64, height=32)
+        self.tcon = make_tcon(self.sim)
+        # Reads the bitmap mode setting up front, so that it isn't traced
+        self.tcon._set_bitmap_mode(False)
+        self.tracer = Tracer(clock=self.sim.ticks_us)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(self.tcon._trace)
+        self.assertIs(self.tcon._spi, self.sim.spi)
+        # Untraced calls go straight to the methods
+        self.assertNotIn("fill_rect", vars(self.tcon))
+        self.tcon.set_tracer(self.tracer)
+        self.assertIsInstance(self.tcon._spi, TracedSPI)
+        self.assertIn("fill_rect", vars(self.tcon))
+        self.tcon.set_tracer(Tracer(clock=self.sim.ticks_us))
+        self.tcon.set_tracer(None)
+        self.assertIs(self.tcon._spi, self.sim.spi)
+        self.assertNotIn("fill_rect", vars(self.tcon))
+
+    def test_command_records(self):
+        self.tcon.set_tracer(self.tracer)
+        self.sim.reset_stats()
+        self.tcon.fill_rect(Rectangle(0, 0, 16, 8), DisplayMode.DU, 0x0)
+        records = self.tracer.records()
+        self.assertEqual([r[:2] for r in records],
+                         [(Tracer.COMMAND, "FILL_RECT"), (Tracer.SPAN, "fill_rect")])
+        cmd, span = records
+        # Preamble + command, preamble + 6 argument words
+        self.assertEqual(cmd[4], 2*2 + 2*7)
+        self.assertEqual(span[4], self.sim.stats["bytes_tx"])
+        self.assertGreater(cmd[3], 0)
+        self.assertEqual(self.tracer.totals[Command.FILL_RECT][0], 1)
+
+    def test_hrdy_wait(self):
+        self.tcon.set_tracer(self.tracer)
+        self.tcon.fill_rect(Rectangle(0, 0, 16, 8), DisplayMode.DU, 0x0)
+        self.sim._busy(0.001)
+        self.tcon.get_temperature()
+        self.assertGreaterEqual(self.tracer.hrdy_us, 1000)
+        temperature = [r for r in self.tracer.records() if r[1] == "CMD_TEMPERATURE"]
+        self.assertGreaterEqual(temperature[0][5], 1000)
+
+    def test_lut_wait_is_merged(self):
+        self.tcon.set_tracer(self.tracer)
+        rect = Rectangle(0, 0, 16, 8)
+        self.tcon.display_area(rect, DisplayMode.GC16)
+        self.tcon.display_area(rect, DisplayMode.GC16)
+        records = self.tracer.records()
+        names = [r[1] for r in records]
+        # The LUTAFSR polls don't show up as commands of their own
+        self.assertEqual(names, ["DPY_AREA", "display_area", "DPY_AREA", "display_area"])
+        waited = records[2]
+        refresh_us = self.sim.waveform_times[DisplayMode.GC16]*1e6
+        self.assertGreater(waited[6], 0.9*refresh_us)
+        self.assertGreaterEqual(waited[3], waited[6])
+        self.assertEqual(self.tracer.lut_us, records[0][6] + waited[6])
+
+    def test_ring_buffer(self):
+        tracer = Tracer(capacity=4, clock=self.sim.ticks_us)
+        self.tcon.set_tracer(tracer)
+        for i in range(5):
+            self.tcon.fill_rect(Rectangle(0, 0, 16, 8), DisplayMode.DU, i)
+        records = tracer.records()
+        self.assertEqual(tracer.count, 10)
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[-1][1], "fill_rect")
+        self.assertTrue(all(a[2] <= b[2] for a, b in zip(records, records[1:])))
+        with self.assertRaises(ValueError):
+            Tracer(capacity=0)
+
+    def test_long_runs(self):
+        self.tcon.set_tracer(self.tracer)
+        # Longer than an array('i') of microseconds holds
+        self.sim.advance(3600)
+        self.tcon.fill_rect(Rectangle(0, 0, 16, 8), DisplayMode.DU, 0x0)
+        records = self.tracer.records()
+        self.assertGreaterEqual(records[0][2], 3600*10**6)
+        self.assertLess(records[0][3], 10**6)
+        self.assertGreaterEqual(self.tracer.state_us["run"], 3600*10**6)
+
+    def test_energy(self):
+        tracer = Tracer(power_mW={"run": 100.0, "refresh": 1000.0, "sleep": 0.0},
+                        clock=self.sim.ticks_us)
+        self.tcon.set_tracer(tracer)
+        self.tcon.display_area(Rectangle(0, 0, 16, 8), DisplayMode.GC16)
+        self.tcon._wait_for_display_ready()
+        self.assertEqual(tracer.state, "run")
+        refresh_s = self.sim.waveform_times[DisplayMode.GC16]
+        self.assertAlmostEqual(tracer.state_us["refresh"]/1e6, refresh_s, delta=0.01)
+        self.tcon.sleep()
+        self.assertEqual(tracer.state, "sleep")
+        energy = tracer.energy_mJ()
+        self.sim.advance(10)
+        self.assertEqual(tracer.energy_mJ(), energy)
+        # The refresh state lasts until the LUTAFSR poll that sees it end
+        busy_s = tracer.state_us["refresh"]/1e6
+        self.assertAlmostEqual(energy, 1000*busy_s + 100*(tracer.now()/1e6 - busy_s - 10),
+                               delta=0.1)
+
+    def test_traced_start_up(self):
+        sim = SimulatedIT8951(width=64, height=32)
+        tracer = Tracer(clock=sim.ticks_us)
+        make_tcon(sim, tracer=tracer)
+        records = tracer.records()
+        self.assertEqual(records[-1][:2], (Tracer.SPAN, "initialise"))
+        self.assertIn("GET_DEV_INFO", [r[1] for r in records])
+
+    def test_dump(self):
+        self.tcon.set_tracer(self.tracer)
+        self.tcon.fill_rect(Rectangle(0, 0, 16, 8), DisplayMode.DU, 0x0)
+        out = io.StringIO()
+        self.tracer.dump(out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].startswith("cmd FILL_RECT "))
+        self.assertTrue(lines[2].startswith("span fill_rect "))
+        self.assertTrue(lines[3].startswith("energy_mJ "))
+
+if __name__ == '__main__':
+    unittest.main()
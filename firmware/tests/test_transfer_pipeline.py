@@ -0,0 +1,182 @@
+import unittest
+from parameterized import parameterized
+import sys
+import os
+import io
+import time
+import tempfile
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from transfer_pipeline import TransferPipeline
+from panel_asset import AssetHeader, Compression, read_chunks
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+from test_panel_asset import make_asset
+import test_it8951
+
+def counting_chunks(total: int, log: list = None):
+    """
+    Chunk generator that fills every buffer with its byte index mod 251
+    """
+    out = yield
+    i = 0
+    while i < total:
+        n = min(len(out), total - i)
+        for k in range(n):
+            out[k] = (i + k) % 251
+        i += n
+        if log is not None:
+            log.append(n)
+        out = yield n
+
+class test_transfer_pipeline(unittest.TestCase):
+    print("==[Running transfer pipeline tests]==")
+    @parameterized.expand([
+        (2, 2, 0),
+        (2, 2, 1),
+        (8, 2, 64),
+        (8, 3, 65),
+        (64, 4, 1000),
+    ])
+    def test_order(self, chunk_size: int, depth: int, total: int):
+        pipeline = TransferPipeline(chunk_size, depth)
+        out = bytearray()
+        chunks = counting_chunks(total)
+        next(chunks)
+        pipeline.run(chunks, lambda mv: out.extend(mv))
+        self.assertEqual(bytes(out), bytes(i % 251 for i in range(total)))
+        self.assertEqual(pipeline.stats["chunks"], (total + chunk_size - 1) // chunk_size)
+
+    def test_reusable(self):
+        pipeline = TransferPipeline(16)
+        for total in (100, 3, 40):
+            out = bytearray()
+            chunks = counting_chunks(total)
+            next(chunks)
+            pipeline.run(chunks, out.extend)
+            self.assertEqual(len(out), total)
+
+    def test_overlap(self):
+        # A source and a sink of 10ms per chunk take ~10 x 10ms, not 10 x 20ms
+        def slow_chunks():
+            out = yield
+            for _ in range(10):
+                time.sleep(0.01)
+                out = yield len(out)
+        pipeline = TransferPipeline(4)
+        chunks = slow_chunks()
+        next(chunks)
+        t0 = time.perf_counter()
+        pipeline.run(chunks, lambda mv: time.sleep(0.01))
+        self.assertLess(time.perf_counter() - t0, 0.18)
+
+    def test_source_error(self):
+        def failing_chunks():
+            out = yield
+            out = yield len(out)
+            raise ValueError("corrupt")
+        pipeline = TransferPipeline(4)
+        out = bytearray()
+        chunks = failing_chunks()
+        next(chunks)
+        with self.assertRaises(ValueError):
+            pipeline.run(chunks, out.extend)
+        self.assertEqual(len(out), 4)
+        # The pipeline is left ready for the next transfer
+        chunks = counting_chunks(10)
+        next(chunks)
+        pipeline.run(chunks, out.extend)
+        self.assertEqual(len(out), 14)
+
+    def test_write_error(self):
+        log = []
+        def write(mv):
+            raise OSError("SPI")
+        pipeline = TransferPipeline(4, depth=3)
+        chunks = counting_chunks(1000, log)
+        next(chunks)
+        with self.assertRaises(OSError):
+            pipeline.run(chunks, write)
+        # The worker stopped once every buffer was full
+        self.assertLessEqual(len(log), 3)
+        with self.assertRaises(StopIteration):
+            next(chunks)
+
+    @parameterized.expand([(0, 2), (3, 2), (4, 1)])
+    def test_invalid(self, chunk_size: int, depth: int):
+        with self.assertRaises(ValueError):
+            TransferPipeline(chunk_size, depth)
+
+    def test_read_chunks(self):
+        data = bytes(range(200))
+        pipeline = TransferPipeline(16)
+        out = bytearray()
+        chunks = read_chunks(io.BytesIO(data), len(data))
+        next(chunks)
+        pipeline.run(chunks, out.extend)
+        self.assertEqual(bytes(out), data)
+
+class test_pipelined_loads(unittest.TestCase):
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=64, height=32)
+        self.tcon = make_tcon(self.sim)
+        self.tmp = tempfile.TemporaryDirectory()
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+        self.assertEqual(self.sim.errors, [])
+        return super().tearDown()
+
+    def test_load_bmp(self):
+        rows = [bytes(((2*i + y) << 4 | (2*i + 1)) & 0xFF for i in range(4)) for y in range(5)]
+        path = os.path.join(self.tmp.name, 'img.bmp')
+        test_it8951.test_it8951.make_bmp(path, 8, rows)
+        with open(path, 'rb') as f:
+            self.tcon.load_bmp(8, 4, f, chunk_size=8)
+        self.tcon.display_area(self.tcon.panel_area, DisplayMode.GC16)
+        expected = self.sim.panel_rect(8, 4, 8, 5)
+        self.tcon.fill_rect(self.tcon.panel_area, DisplayMode.GC16, 0xF)
+        pipeline = TransferPipeline(8)
+        self.tcon.load_bmp(8, 4, path, pipeline=pipeline)
+        self.tcon.display_area(self.tcon.panel_area, DisplayMode.GC16)
+        self.assertEqual(self.sim.panel_rect(8, 4, 8, 5), expected)
+        self.assertEqual(self.sim.panel_rect(8, 4, 8, 1), [3, 2, 1, 0, 7, 6, 5, 4])
+        # 4 byte rows, 2 per chunk
+        self.assertEqual(pipeline.stats["chunks"], 3)
+
+    def test_bmp_rows_must_fit(self):
+        rows = [bytes(16) for _ in range(2)]
+        path = os.path.join(self.tmp.name, 'img.bmp')
+        test_it8951.test_it8951.make_bmp(path, 32, rows)
+        with self.assertRaises(ValueError):
+            self.tcon.load_bmp(0, 0, path, pipeline=TransferPipeline(8))
+
+    @parameterized.expand([(Compression.NONE,), (Compression.RLE,)])
+    def test_load_asset(self, compression: int):
+        header = AssetHeader(ColorDepth.BPP_4BIT, Endianness.LITTLE, 32, 16, 16, 16,
+                             compression=compression)
+        colour = [(x + y) & 0xF if y % 4 else 0xF for y in range(16) for x in range(32)]
+        path = os.path.join(self.tmp.name, 'img.ita')
+        make_asset(path, header, colour)
+        pipeline = TransferPipeline(6, depth=3)
+        for tile in range(2):
+            self.tcon.load_asset(16*tile, 8, path, tile, pipeline=pipeline)
+        self.tcon.display_area(self.tcon.panel_area, DisplayMode.GC16)
+        self.assertEqual(self.sim.panel_rect(0, 8, 32, 16), colour)
+
+    def test_load_truncated_asset(self):
+        header = AssetHeader(ColorDepth.BPP_4BIT, Endianness.LITTLE, 16, 8)
+        path = os.path.join(self.tmp.name, 'img.ita')
+        make_asset(path, header, [0]*128)
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 8)
+        with self.assertRaises(ValueError):
+            self.tcon.load_asset(0, 0, path, pipeline=TransferPipeline(8))
+        self.assertEqual(self.sim.errors, ["Image load ended before the area was filled"])
+        self.sim.errors.clear()
+
+if __name__ == '__main__':
+    unittest.main()
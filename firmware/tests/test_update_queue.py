@@ -0,0 +1,153 @@
+import unittest
+import sys
+import os
+import time
+from unittest.mock import patch
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from update_queue import UpdateQueue
+from shadow_fb import ShadowFrameBuffer
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+class test_update_queue(unittest.TestCase):
+    print("==[Running update queue tests]==")
+    def setUp(self) -> None:
+        self.sim = SimulatedIT8951(width=128, height=64)
+        self.tcon = make_tcon(self.sim)
+        self.queue = UpdateQueue(self.tcon)
+        self.img_info = ImageInfo(Endianness.LITTLE, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.assertEqual(self.sim.errors, [])
+        self.assertEqual(self.sim.hazards, [])
+        return super().tearDown()
+
+    def submit(self, rect: Rectangle, colour: int, mode: DisplayMode = DisplayMode.GC16):
+        data = bytearray(it8951.pack_pixels_into(self.img_info, rect, [colour]*rect.area()))
+        self.queue.submit(self.img_info, rect, data, mode)
+
+    def test_disjoint_areas_overlap_refreshes(self):
+        for i in range(4):
+            self.submit(Rectangle(32*i, 0, 32, 32), i)
+        self.assertEqual(self.queue.stats["stalls"], 0)
+        self.assertEqual(len(self.queue.in_flight()), 4)
+        # Every refresh started before the first one finished
+        first_end = self.sim.refreshes[0][7]
+        for refresh in self.sim.refreshes:
+            self.assertLess(refresh[6], first_end)
+        self.assertEqual(len(set(refresh[7] for refresh in self.sim.refreshes)), 4)
+        for i in range(4):
+            self.assertEqual(self.sim.panel_rect(32*i, 0, 32, 1), [i]*32)
+
+    def test_overlapping_area_waits(self):
+        self.submit(Rectangle(0, 0, 32, 32), 0x3)
+        first_end = self.sim.refreshes[-1][7]
+        self.submit(Rectangle(16, 16, 32, 32), 0x7)
+        self.assertEqual(self.queue.stats["stalls"], 1)
+        self.assertGreaterEqual(self.sim.refreshes[-1][6], first_end)
+        self.assertEqual(self.sim.panel_rect(16, 16, 1, 1), [0x7])
+        self.assertEqual(self.sim.panel_rect(0, 0, 1, 1), [0x3])
+
+    def test_engines_are_retired(self):
+        self.submit(Rectangle(0, 0, 32, 32), 0x3, DisplayMode.A2)
+        self.sim.advance(self.sim.waveform_times[DisplayMode.A2])
+        self.submit(Rectangle(32, 0, 32, 32), 0x5)
+        # The first engine was found idle and reused by the second refresh
+        self.assertEqual(len(self.queue.in_flight()), 1)
+        self.queue.wait_idle()
+        self.assertEqual(self.queue.in_flight(), [])
+        self.assertEqual(self.tcon.lut_status(), 0)
+
+    def test_fill(self):
+        self.queue.fill(Rectangle(0, 0, 16, 16), DisplayMode.DU, 0x0)
+        self.queue.fill(Rectangle(8, 8, 16, 16), DisplayMode.DU, 0xF)
+        self.assertEqual(self.queue.stats["stalls"], 1)
+        self.assertEqual(self.sim.panel_rect(0, 0, 1, 1), [0x0])
+        self.assertEqual(self.sim.panel_rect(8, 8, 1, 1), [0xF])
+
+    def test_all_engines_busy(self):
+        self.sim.lut_busy_until = self.sim.lut_busy_until[:2]
+        for i in range(3):
+            self.submit(Rectangle(32*i, 0, 32, 32), i)
+        # The third refresh was queued by the controller behind the others
+        self.assertGreaterEqual(self.sim.refreshes[2][6], self.sim.refreshes[0][7])
+        self.submit(Rectangle(64, 16, 8, 8), 0x9)
+        self.assertGreaterEqual(self.sim.refreshes[3][6], self.sim.refreshes[2][7])
+
+    def test_unlatched_refresh_is_tracked(self):
+        lut_status = self.tcon.lut_status
+        unlatched_reads = []
+        def unlatched() -> int:
+            # The first read after DPY_AREA finds the engine not latched yet
+            if self.sim.refreshes and not unlatched_reads:
+                unlatched_reads.append(0)
+                return 0
+            return lut_status()
+        rect = Rectangle(0, 0, 32, 32)
+        with patch.object(self.tcon, "lut_status", unlatched):
+            self.submit(rect, 0x3)
+        self.assertEqual(self.queue.in_flight(), [rect])
+        first_end = self.sim.refreshes[-1][7]
+        # Must wait for the refresh, otherwise the simulator records a hazard
+        self.submit(Rectangle(16, 0, 32, 32), 0x7)
+        self.assertEqual(self.queue.stats["stalls"], 1)
+        self.assertGreaterEqual(self.sim.refreshes[-1][6], first_end)
+        self.queue.wait_idle()
+        self.assertEqual(self.queue.in_flight(), [])
+
+    def test_idle_lutafsr_keeps_refresh(self):
+        lut_status = self.tcon.lut_status
+        idle_reads = []
+        def late_latch() -> int:
+            # The engine only shows up in LUTAFSR from the 4th read on
+            if self.sim.refreshes and len(idle_reads) < 3:
+                idle_reads.append(0)
+                return 0
+            return lut_status()
+        rect = Rectangle(0, 0, 32, 32)
+        with patch.object(self.tcon, "lut_status", late_latch):
+            self.submit(rect, 0x3)
+            self.queue._poll()
+            self.queue._poll()
+            self.assertEqual(self.queue.in_flight(), [rect])
+            first_end = self.sim.refreshes[-1][7]
+            self.submit(Rectangle(16, 0, 32, 32), 0x7)
+        self.assertGreaterEqual(self.sim.refreshes[-1][6], first_end)
+
+    def test_idle_lutafsr_retires_after_latch_time(self):
+        rect = Rectangle(0, 0, 32, 32)
+        # A refresh that never shows up in LUTAFSR, e.g. one that already ended
+        with patch.object(self.tcon, "lut_status", lambda: 0):
+            self.submit(rect, 0x3)
+            self.queue._poll()
+            self.assertEqual(self.queue.in_flight(), [rect])
+            time.sleep(UpdateQueue._LATCH_US/1e6)
+            self.queue._poll()
+        self.assertEqual(self.queue.in_flight(), [])
+        self.sim.advance(self.sim.waveform_times[DisplayMode.GC16])
+
+    def test_shadow_flush(self):
+        fb = ShadowFrameBuffer(self.tcon, 32, 32, queue=self.queue, background=0x0)
+        fb.fill_rect(Rectangle(0, 0, 8, 8), 0xF)
+        fb.fill_rect(Rectangle(96, 32, 8, 8), 0xF)
+        fb.flush()
+        self.assertEqual(self.queue.stats["submitted"], 2)
+        self.assertLess(self.sim.refreshes[1][6], self.sim.refreshes[0][7])
+        self.assertEqual(self.sim.panel_rect(96, 32, 8, 1), [0xF]*8)
+
+    def test_sequential_display_is_a_hazard(self):
+        # Without the queue a quick rewrite of an area tears its refresh
+        rect = Rectangle(0, 0, 32, 32)
+        for colour in (0x3, 0x7):
+            data = bytearray(it8951.pack_pixels_into(self.img_info, rect, [colour]*rect.area()))
+            self.tcon.write_packed_pixels(self.img_info, rect, data)
+            self.tcon.display_area(rect, DisplayMode.GC16)
+        self.assertEqual(len(self.sim.hazards), 1)
+        self.sim.hazards.clear()
+
+if __name__ == '__main__':
+    unittest.main()
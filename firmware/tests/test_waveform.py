@@ -0,0 +1,88 @@
+import unittest
+from parameterized import parameterized
+import sys
+import os
+# Ensure that the parent directory is visible from this module
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+from it8951 import *
+from waveform import WaveformScheduler
+from shadow_fb import ShadowFrameBuffer
+from host.it8951_sim import SimulatedIT8951
+from test_it8951_sim import make_tcon
+
+def levels(*values) -> int:
+    mask = 0
+    for v in values:
+        mask |= 1 << v
+    return mask
+
+class test_waveform(unittest.TestCase):
+    print("==[Running waveform scheduler tests]==")
+    def setUp(self) -> None:
+        self.scheduler = WaveformScheduler(Rectangle(0, 0, 256, 128), cell_size=64,
+                                           region_threshold=8, panel_threshold=20)
+        return super().setUp()
+
+    @parameterized.expand([
+        (levels(0, 15),     levels(0, 15),  False, DisplayMode.A2),
+        (levels(15),        levels(0),      False, DisplayMode.A2),
+        (levels(3, 8),      levels(0, 15),  True,  DisplayMode.DU),
+        (levels(15),        levels(0, 7),   False, DisplayMode.GL16),
+        (levels(0, 7, 15),  levels(15),     False, DisplayMode.DU),
+        (levels(3),         levels(15, 5),  True,  DisplayMode.GC16),
+        (0,                 0,              False, DisplayMode.GC16),
+    ])
+    def test_choose(self, old_levels: int, new_levels: int, grey_to_grey: bool, expected: DisplayMode):
+        mode = self.scheduler.choose(Rectangle(0, 0, 32, 32), old_levels, new_levels, grey_to_grey)
+        self.assertEqual(mode, expected)
+
+    def test_region_debt_forces_gc16(self):
+        rect = Rectangle(10, 10, 20, 20)
+        self.scheduler.commit(rect, DisplayMode.A2)
+        self.scheduler.commit(rect, DisplayMode.A2)
+        self.assertEqual(self.scheduler.choose(rect, levels(0), levels(15), False), DisplayMode.GC16)
+        # Other regions are unaffected
+        self.assertEqual(self.scheduler.choose(Rectangle(128, 0, 8, 8), levels(0), levels(15), False), DisplayMode.A2)
+        # GC16 clears the debt
+        self.scheduler.commit(rect, DisplayMode.GC16)
+        self.assertEqual(self.scheduler.debt(rect), 0)
+
+    def test_choose_fill(self):
+        self.assertEqual(self.scheduler.choose_fill(Rectangle(0, 0, 8, 8), 0xF), DisplayMode.DU)
+        self.assertEqual(self.scheduler.choose_fill(Rectangle(0, 0, 8, 8), 0x7), DisplayMode.GC16)
+
+    def test_panel_cleanup(self):
+        for i in range(5):
+            self.assertFalse(self.scheduler.needs_cleanup())
+            self.scheduler.commit(Rectangle(64*(i % 4), 0, 8, 8), DisplayMode.A2)
+        self.assertTrue(self.scheduler.needs_cleanup())
+
+    def test_shadow_flush_uses_scheduler(self):
+        sim = SimulatedIT8951(width=128, height=64)
+        tcon = make_tcon(sim)
+        scheduler = WaveformScheduler(tcon.panel_area, cell_size=32, region_threshold=8, panel_threshold=10)
+        fb = ShadowFrameBuffer(tcon, 32, 32, scheduler=scheduler)
+
+        fb.fill_rect(Rectangle(0, 0, 8, 8), 0x0)
+        fb.fill_rect(Rectangle(64, 0, 8, 8), 0x6)
+        fb.fill_rect(Rectangle(32, 32, 32, 32), 0x6)
+        modes = {tuple(r.to_list()): m for r, m in fb.flush()}
+        self.assertEqual(modes, {
+            (0, 0, 32, 32):  DisplayMode.A2,
+            (64, 0, 32, 32): DisplayMode.GL16,
+            (32, 32, 32, 32): DisplayMode.GL16,
+        })
+        fb.fill_rect(Rectangle(32, 32, 32, 32), 0x3)
+        self.assertEqual(fb.flush()[0][1], DisplayMode.GC16)
+
+        # Keep toggling a black/white area until the panel cleanup kicks in
+        for i in range(3):
+            fb.fill_rect(Rectangle(96, 32, 8, 8), 0xF if i % 2 else 0x0)
+            fb.flush()
+        self.assertIn((0, 0, 128, 64, DisplayMode.GC16), [r[:5] for r in sim.refreshes])
+        self.assertLess(scheduler.panel_debt, scheduler.panel_threshold)
+        self.assertEqual(sim.errors, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+import os
+from it8951 import *
+
+_FNV_OFFSET = 0x811C9DC5
+_FNV_PRIME  = 0x01000193
+
+def fnv1a(data, h: int = _FNV_OFFSET) -> int:
+    """
+    32 bit FNV-1a hash of bytes. Pass the result back as h to hash
+    several buffers as one.
+    """
+    for b in data:
+        h = ((h ^ b) * _FNV_PRIME) & 0xFFFF_FFFF
+    return h
+
+def tile_key(*inputs) -> int:
+    """
+    Hash of everything a tile's pixels depend on, e.g. the date, its events
+    and the theme. The inputs are hashed through their repr(), so they must
+    be values with a stable one: numbers, strings, tuples and lists of them.
+    """
+    return fnv1a(repr(inputs).encode())
+
+class TileCache:
+    """
+    Packed tiles keyed by tile_key, in a RAM cache that evicts the least
+    recently used tiles once it holds ram_bytes. With a flash directory the
+    evicted tiles are written there instead of being dropped, up to
+    flash_bytes, and are found again on the next boot.
+    """
+    def __init__(self, ram_bytes: int = 1 << 20, flash_dir: str = None,
+                 flash_bytes: int = 1 << 20):
+        """
+        Args:
+            ram_bytes: [Optional] Bytes of tile data kept in RAM (PSRAM)
+            flash_dir: [Optional] Directory to spill the evicted tiles to
+            flash_bytes: [Optional] Bytes of tile data kept in flash_dir
+        """
+        if ram_bytes <= 0 or flash_bytes <= 0:
+            raise ValueError("The cache sizes must be positive")
+        self.ram_bytes   = ram_bytes
+        self.flash_bytes = flash_bytes
+        self._flash_dir  = flash_dir
+        # key -> [last use, packed tile]
+        self._ram = {}
+        # key -> [last use, size in bytes]
+        self._flash = {}
+        self._tick = 0
+        self.stats = {"hits": 0, "flash_hits": 0, "misses": 0, "evictions": 0,
+                      "ram_used": 0, "flash_used": 0}
+        if flash_dir is not None:
+            try:
+                os.mkdir(flash_dir)
+            except OSError:
+                pass
+            # Tiles saved before the last reset, oldest use unknown
+            for name in os.listdir(flash_dir):
+                if name.endswith('.tile'):
+                    size = os.stat(self._path(int(name[:-5], 16)))[6]
+                    self._flash[int(name[:-5], 16)] = [0, size]
+                    self.stats["flash_used"] += size
+
+    def _path(self, key: int) -> str:
+        return "%s/%08x.tile" % (self._flash_dir, key)
+
+    @staticmethod
+    def _oldest(entries: dict) -> int:
+        oldest = None
+        for key, entry in entries.items():
+            if oldest is None or entry[0] < entries[oldest][0]:
+                oldest = key
+        return oldest
+
+    def get(self, key: int):
+        """
+        Returns the packed tile stored under key, or None
+        """
+        self._tick += 1
+        entry = self._ram.get(key)
+        if entry is not None:
+            entry[0] = self._tick
+            self.stats["hits"] += 1
+            return entry[1]
+        entry = self._flash.get(key)
+        if entry is not None:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            if len(data) == entry[1]:
+                self.stats["flash_hits"] += 1
+                self._remove_flash(key)
+                self._put_ram(key, data)
+                return data
+            self._remove_flash(key)
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: int, data):
+        """
+        Stores a copy of a packed tile under key
+        """
+        self._tick += 1
+        data = bytes(data)
+        if key in self._ram:
+            self.stats["ram_used"] -= len(self._ram.pop(key)[1])
+        if key in self._flash:
+            self._remove_flash(key)
+        self._put_ram(key, data)
+
+    def _put_ram(self, key: int, data: bytes):
+        self._ram[key] = [self._tick, data]
+        self.stats["ram_used"] += len(data)
+        while self.stats["ram_used"] > self.ram_bytes and len(self._ram) > 1:
+            oldest = self._oldest(self._ram)
+            last_use, tile = self._ram.pop(oldest)
+            self.stats["ram_used"] -= len(tile)
+            self.stats["evictions"] += 1
+            if self._flash_dir is not None and len(tile) <= self.flash_bytes:
+                self._put_flash(oldest, last_use, tile)
+
+    def _put_flash(self, key: int, last_use: int, data: bytes):
+        while self.stats["flash_used"] + len(data) > self.flash_bytes:
+            self._remove_flash(self._oldest(self._flash))
+        with open(self._path(key), 'wb') as f:
+            f.write(data)
+        self._flash[key] = [last_use, len(data)]
+        self.stats["flash_used"] += len(data)
+
+    def _remove_flash(self, key: int):
+        self.stats["flash_used"] -= self._flash.pop(key)[1]
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+class TileLayer:
+    """
+    Render layer for a grid of cells, e.g. the calendar's day cells. Every
+    cell is rendered into a packed tile keyed by the hash of its inputs.
+    Redrawing a cell whose key is the one on the panel is skipped without
+    touching the bus, a known key is uploaded from the TileCache and only a
+    new key is rendered.
+    """
+    def __init__(self, tcon: it8951, cache: TileCache = None, queue = None,
+                 img_info: ImageInfo = None):
+        """
+        Args:
+            tcon: Initialised IT8951 driver
+            cache: [Optional] TileCache. Defaults to 1MB of RAM.
+            queue: [Optional] UpdateQueue that the tiles are submitted to, so
+                   that uploads overlap with the previous cells' refreshes
+            img_info: [Optional] Packing of the rendered tiles. Defaults to
+                      little endian 4bpp.
+        """
+        self._tcon = tcon
+        self.cache = cache if cache is not None else TileCache()
+        self.queue = queue
+        self.img_info = img_info if img_info is not None else \
+            ImageInfo(Endianness.LITTLE, ColorDepth.BPP_4BIT, RotateMode.ROTATE_0)
+        # Cell id -> key of the tile on the panel
+        self._shown = {}
+        self.stats = {"skipped": 0, "uploaded": 0, "rendered": 0}
+
+    def invalidate(self, cell = None):
+        """
+        Forgets what the panel shows in a cell, or in every cell with None,
+        e.g. after it was cleared
+        """
+        if cell is None:
+            self._shown.clear()
+        else:
+            self._shown.pop(cell, None)
+
+    def draw(self, cell, rect: Rectangle, inputs: tuple, render, mode: DisplayMode = None) -> bool:
+        """
+        Brings a cell up to date
+        Args:
+            cell: Id of the cell, e.g. its date
+            rect: Area of the cell on the panel
+            inputs: Everything the cell's pixels depend on, see tile_key
+            render: Called as render(rect, img_info) on a cache miss. Returns
+                    the packed pixels of rect, e.g. from pack_pixels_into.
+            mode: [Optional] Waveform to refresh the cell with after its
+                  upload. None only loads the image buffer.
+        Returns:
+            True if the tile was uploaded
+        """
+        key = tile_key(rect.x % ColorDepth.pixel_per_word(self.img_info.bpp), rect.width,
+                       rect.height, self.img_info.pack_to_u16(), inputs)
+        if self._shown.get(cell) == key:
+            self.stats["skipped"] += 1
+            return False
+        data = self.cache.get(key)
+        if data is None:
+            data = render(rect, self.img_info)
+            self.stats["rendered"] += 1
+            self.cache.put(key, data)
+        if self.queue is not None and mode is not None:
+            self.queue.submit(self.img_info, rect, data, mode)
+        else:
+            if self.queue is not None:
+                self.queue.upload(self.img_info, rect, data)
+            else:
+                self._tcon.write_packed_pixels(self.img_info, rect, data)
+            if mode is not None:
+                self._tcon.display_area(rect, mode)
+        self._shown[cell] = key
+        self.stats["uploaded"] += 1
+        return True
@@ -0,0 +1,247 @@
+import sys
+from array import array
+from it8951 import Command, _ticks_us, _ticks_diff
+
+class TracedSPI:
+    """
+    Counts the bytes clocked through an SPI channel while a Tracer is attached
+    """
+    def __init__(self, spi, tracer: 'Tracer'):
+        self.spi = spi
+        self._tracer = tracer
+
+    def write(self, buf):
+        self._tracer.spi_bytes += len(buf)
+        self.spi.write(buf)
+
+    def read(self, nbytes: int, write: int = 0x00) -> bytes:
+        self._tracer.spi_bytes += nbytes
+        return self.spi.read(nbytes, write)
+
+    def readinto(self, buf, write: int = 0x00):
+        self._tracer.spi_bytes += len(buf)
+        self.spi.readinto(buf, write)
+
+    def write_readinto(self, write_buf, read_buf):
+        self._tracer.spi_bytes += len(write_buf)
+        self.spi.write_readinto(write_buf, read_buf)
+
+class Tracer:
+    """
+    Opt-in instrumentation of the it8951 driver (see it8951.set_tracer).
+    Every command is recorded with its duration, SPI bytes, HRDY wait and
+    LUT-busy wait until the next command, and the driver's high-level calls
+    as spans around their commands. The records go to a preallocated ring
+    buffer that keeps the latest capacity of them.
+
+    Polling LUTAFSR until the LUT engines are idle isn't recorded command by
+    command: the wait and its polls are merged into the record of the command
+    that waited, e.g. DPY_AREA.
+
+    The energy estimate integrates a power figure over the time spent in
+    every controller state. A refresh lasts from the display command until
+    LUTAFSR reads idle.
+    """
+    # Record kinds
+    COMMAND = 0
+    SPAN    = 1
+    # Fields of every record: kind, command or span name index, start time
+    # (us since the tracer was created), duration (us), SPI bytes, HRDY wait
+    # (us), LUT-busy wait (us)
+    FIELDS = 7
+    # Rough power figures of the IT8951 board and panel per controller state,
+    # in mW. Measure the actual board to get meaningful estimates.
+    POWER_MW = {"run": 110.0, "standby": 25.0, "sleep": 0.5, "refresh": 370.0}
+    # Controller state that every command leaves the IT8951 in
+    _STATES = {Command.SYS_RUN: "run", Command.STANDBY: "standby", Command.SLEEP: "sleep",
+               Command.DPY_AREA: "refresh", Command.DPY_BUF_AREA: "refresh",
+               Command.FILL_RECT: "refresh"}
+
+    def __init__(self, capacity: int = 256, power_mW: dict = None, clock = None):
+        """
+        Args:
+            capacity: [Optional] Number of records kept
+            power_mW: [Optional] Power figures that override POWER_MW
+            clock: [Optional] Microsecond clock, e.g. the simulator's
+                   ticks_us on the host. Defaults to time.ticks_us.
+        """
+        if capacity <= 0:
+            raise ValueError("The capacity must be positive")
+        self.capacity = capacity
+        self.power_mW = dict(self.POWER_MW)
+        if power_mW:
+            self.power_mW.update(power_mW)
+        self._clock = _ticks_us if clock is None else clock
+        # Microseconds since the tracer was created, as of the clock reading
+        # _t_last. The ticks wrap (every ~18 minutes for the ESP32's
+        # ticks_us), so now() adds up the time between its calls instead of
+        # diffing against the first reading.
+        self._t_last = self._clock()
+        self._elapsed = 0
+        # The start times have a 64-bit array of their own: they overflow an
+        # 'i' array after ~36 minutes, the other fields hold short durations
+        # and counts
+        self._starts = array('q', [0]*capacity)
+        self._ring = array('i', [0]*(capacity*(self.FIELDS - 1)))
+        # Number of records ever written
+        self.count = 0
+        # Span names, indexed by the records
+        self._names = []
+        # Running totals since the tracer was created
+        self.spi_bytes = 0
+        self.hrdy_us   = 0
+        self.lut_us    = 0
+        # Command -> [count, duration, SPI bytes, HRDY wait, LUT wait]
+        self.totals = {}
+        # Open command record: [command, start, SPI bytes, HRDY us, LUT us]
+        # at its start. Command None: a LUT wait whose command isn't known yet.
+        self._cmd = [None, 0, 0, 0, 0]
+        self._cmd_open = False
+        self._waiting = False
+        self._spans = []
+        self.state = "run"
+        # now() when the current state was entered
+        self._state_t = 0
+        # Time spent in every controller state, in us
+        self.state_us = {state: 0 for state in self.power_mW}
+
+    def now(self) -> int:
+        t = self._clock()
+        self._elapsed += _ticks_diff(t, self._t_last)
+        self._t_last = t
+        return self._elapsed
+
+    def _snapshot(self, code, out: list = None) -> list:
+        if out is None:
+            out = [0]*5
+        out[0] = code
+        out[1] = self.now()
+        out[2] = self.spi_bytes
+        out[3] = self.hrdy_us
+        out[4] = self.lut_us
+        return out
+
+    def _write(self, kind: int, code: int, start: list) -> int:
+        n = self.count % self.capacity
+        self._starts[n] = start[1]
+        i = n*(self.FIELDS - 1)
+        ring = self._ring
+        ring[i]   = kind
+        ring[i+1] = code
+        ring[i+2] = self.now() - start[1]
+        ring[i+3] = self.spi_bytes - start[2]
+        ring[i+4] = self.hrdy_us - start[3]
+        ring[i+5] = self.lut_us - start[4]
+        self.count += 1
+        return i
+
+    def _close_command(self):
+        if not self._cmd_open:
+            return
+        self._cmd_open = False
+        code = self._cmd[0]
+        if code is None:
+            code = -1
+        i = self._write(self.COMMAND, code, self._cmd)
+        total = self.totals.get(code)
+        if total is None:
+            total = self.totals[code] = [0, 0, 0, 0, 0]
+        total[0] += 1
+        for k in range(4):
+            total[k+1] += self._ring[i+2+k]
+
+    def _set_state(self, state: str):
+        if state == self.state:
+            return
+        t = self.now()
+        self.state_us[self.state] = self.state_us.get(self.state, 0) + t - self._state_t
+        self.state = state
+        self._state_t = t
+
+    # --- Driver hooks --------------------------------------------------------
+
+    def command(self, command: Command):
+        if self._waiting:
+            return
+        if self._cmd_open and self._cmd[0] is None:
+            # The command that waited for the LUT engines
+            self._cmd[0] = command
+        else:
+            self._close_command()
+            self._snapshot(command, self._cmd)
+            self._cmd_open = True
+        state = self._STATES.get(command)
+        if state is not None:
+            self._set_state(state)
+
+    def hrdy_wait(self, us: int):
+        self.hrdy_us += us
+
+    def lut_wait_begin(self):
+        self._close_command()
+        self._snapshot(None, self._cmd)
+        self._cmd_open = True
+        self._waiting = True
+        return self._clock()
+
+    def lut_wait_end(self, t_start: int):
+        self.lut_us += _ticks_diff(self._clock(), t_start)
+        self._waiting = False
+
+    def lut_status(self, status: int):
+        if status == 0 and self.state == "refresh":
+            self._set_state("run")
+
+    def begin(self, name: str):
+        self._close_command()
+        if name not in self._names:
+            self._names.append(name)
+        self._spans.append(self._snapshot(self._names.index(name)))
+
+    def end(self):
+        self._close_command()
+        start = self._spans.pop()
+        self._write(self.SPAN, start[0], start)
+
+    # --- Results -------------------------------------------------------------
+
+    def records(self) -> list:
+        """
+        The records still in the ring buffer, oldest first, as (kind, name,
+        start_us, duration_us, spi_bytes, hrdy_us, lut_us) tuples. The open
+        command record is closed first.
+        """
+        self._close_command()
+        names = {}
+        for name in dir(Command):
+            if not name.startswith('_'):
+                names[getattr(Command, name)] = name
+        names[-1] = "LUT_WAIT"
+        out = []
+        for n in range(max(0, self.count - self.capacity), self.count):
+            i = (n % self.capacity)*(self.FIELDS - 1)
+            rec = tuple(self._ring[i:i + self.FIELDS - 1])
+            name = self._names[rec[1]] if rec[0] == self.SPAN else names.get(rec[1], hex(rec[1]))
+            out.append((rec[0], name, self._starts[n % self.capacity]) + rec[2:])
+        return out
+
+    def energy_mJ(self) -> float:
+        """
+        Estimated energy used since the tracer was created
+        """
+        elapsed = dict(self.state_us)
+        elapsed[self.state] = elapsed.get(self.state, 0) + self.now() - self._state_t
+        return sum(us*self.power_mW.get(state, 0) for state, us in elapsed.items()) / 1e6
+
+    def dump(self, stream = None):
+        """
+        Writes the records and the energy estimate as text, e.g. to the
+        serial console (default) or to an open file on flash
+        """
+        if stream is None:
+            stream = sys.stdout
+        stream.write("kind name start_us duration_us spi_bytes hrdy_us lut_us\n")
+        for rec in self.records():
+            kind = "span" if rec[0] == self.SPAN else "cmd"
+            stream.write("%s %s %d %d %d %d %d\n" % ((kind,) + rec[1:]))
+        stream.write("energy_mJ %.3f\n" % self.energy_mJ())
@@ -0,0 +1,121 @@
+import _thread
+
+class TransferPipeline:
+    """
+    Overlaps the production of image data with its transfer: a worker thread
+    reads (or decodes, or packs) chunk N+1 into one buffer while the calling
+    thread clocks chunk N out over SPI from another. Runs on MicroPython's
+    _thread and on CPython threads for the host simulator. The overlap is
+    only real where the blocking SPI transfer and file reads release the
+    interpreter lock.
+
+    The data comes from a chunk generator. It is primed with next() before
+    the transfer starts, so that it can validate its input up front, and
+    then receives every buffer to fill with send(), answering with the
+    number of bytes it put into it. It ends by returning:
+
+        def chunks(f, size):
+            out = yield
+            while size:
+                n = f.readinto(out[:min(size, len(out))])
+                size -= n
+                out = yield n
+    """
+    def __init__(self, chunk_size: int = 4096, depth: int = 2):
+        """
+        Args:
+            chunk_size: [Optional] Size of every buffer. Must be a whole number
+                        of u16 words.
+            depth: [Optional] Number of buffers. 2 is double buffering, more
+                   absorbs jitter in the source's speed.
+        """
+        if chunk_size <= 0 or chunk_size % 2:
+            raise ValueError("The chunk size must be a positive, even number of bytes")
+        if depth < 2:
+            raise ValueError("A pipeline needs at least 2 buffers")
+        self.chunk_size = chunk_size
+        self.depth      = depth
+        self._bufs  = [memoryview(bytearray(chunk_size)) for _ in range(depth)]
+        self._sizes = [0]*depth
+        # Binary semaphores per buffer: free is held while the writer owns
+        # the buffer, full while the worker does
+        self._free  = [_thread.allocate_lock() for _ in range(depth)]
+        self._full  = [_thread.allocate_lock() for _ in range(depth)]
+        for lock in self._full:
+            lock.acquire()
+        # Released by the worker when it exits
+        self._done  = _thread.allocate_lock()
+        self._done.acquire()
+        self._stop  = False
+        self._error = None
+        # Number of chunks written, times the writer waited for the source
+        # and times the source waited for a free buffer
+        self.stats = {"chunks": 0, "write_waits": 0, "fill_waits": 0}
+
+    def _produce(self, chunks):
+        i = 0
+        try:
+            while True:
+                if not self._free[i].acquire(0):
+                    self.stats["fill_waits"] += 1
+                    self._free[i].acquire()
+                if self._stop:
+                    return
+                try:
+                    n = chunks.send(self._bufs[i])
+                except StopIteration:
+                    n = 0
+                except Exception as e:
+                    self._error = e
+                    n = -1
+                self._sizes[i] = n
+                self._full[i].release()
+                if n <= 0:
+                    return
+                i = (i + 1) % self.depth
+        finally:
+            chunks.close()
+            self._done.release()
+
+    def run(self, chunks, write):
+        """
+        Writes the output of a primed chunk generator, in order, while the
+        next chunks are produced by a worker thread. Returns once both are
+        done. Exceptions of the generator are raised here.
+        Args:
+            chunks: Primed chunk generator
+            write: Called with a memoryview of every chunk. It must be done
+                   with the data when it returns.
+        """
+        self._stop  = False
+        self._error = None
+        _thread.start_new_thread(self._produce, (chunks,))
+        i = 0
+        try:
+            while True:
+                if not self._full[i].acquire(0):
+                    self.stats["write_waits"] += 1
+                    self._full[i].acquire()
+                n = self._sizes[i]
+                if n <= 0:
+                    break
+                write(self._bufs[i][:n])
+                self.stats["chunks"] += 1
+                self._free[i].release()
+                i = (i + 1) % self.depth
+        finally:
+            # Wakes the worker if it waits for a buffer, e.g. after write
+            # raised, and leaves every buffer free for the next run
+            self._stop = True
+            for lock in self._free:
+                if lock.locked():
+                    lock.release()
+            self._done.acquire()
+            for lock in self._full:
+                lock.acquire(0)
+            for lock in self._free:
+                if lock.locked():
+                    lock.release()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
@@ -0,0 +1,170 @@
+from it8951 import *
+from it8951 import _ticks_us, _ticks_diff
+
+class UpdateQueue:
+    """
+    Overlaps image uploads with the refreshes of the IT8951's LUT engines.
+    it8951.display_area() waits for every LUT engine to go idle before it
+    refreshes, so uploads and waveforms run one after the other. The queue
+    issues refreshes without waiting and only blocks an upload while its area
+    overlaps a refresh that is still running from the same image buffer,
+    because the upload would overwrite content the running waveform still
+    reads.
+
+    The LUT engine(s) of every refresh are identified from the LUTAFSR bits
+    that it sets, and the refresh is retired when they clear.
+    """
+    # LUTAFSR mask of a refresh whose engine couldn't be identified
+    _ALL_ENGINES = 0xFFFF
+    # How long such a refresh is kept while LUTAFSR reads idle, for its
+    # engine to latch it
+    _LATCH_US = 20_000
+
+    def __init__(self, tcon: it8951):
+        """
+        Args:
+            tcon: Initialised IT8951 driver
+        """
+        self._tcon = tcon
+        self._default_address = tcon.device_info.img_buff_addr
+        # [Rectangle, LUTAFSR bit mask, image buffer address, issue time] of
+        # the refreshes that may be running. The issue time is None once the
+        # refresh's engine bits were seen set.
+        self._in_flight = []
+        # Number of refreshes, uploads that had to wait for an overlapping
+        # refresh, and LUTAFSR reads
+        self.stats = {"submitted": 0, "stalls": 0, "lutafsr_polls": 0}
+
+    def in_flight(self) -> list:
+        """
+        Areas of the refreshes that may still be running
+        """
+        return [entry[0] for entry in self._in_flight]
+
+    def _poll(self) -> int:
+        """
+        Reads LUTAFSR and retires the refreshes whose LUT engines are idle.
+        A refresh whose engine bits were never seen set is kept for _LATCH_US
+        after it was issued, as its engine may not have latched it yet.
+        """
+        status = self._tcon.lut_status()
+        self.stats["lutafsr_polls"] += 1
+        now = None
+        running = []
+        for entry in self._in_flight:
+            if entry[1] & status:
+                entry[3] = None
+            elif entry[3] is None:
+                continue
+            else:
+                if now is None:
+                    now = _ticks_us()
+                if _ticks_diff(now, entry[3]) >= self._LATCH_US:
+                    continue
+            running.append(entry)
+        self._in_flight = running
+        return status
+
+    def _overlaps(self, rect: Rectangle, address: int) -> bool:
+        for area, _, addr, _ in self._in_flight:
+            if addr == address and (rect is None or area.intersects(rect)):
+                return True
+        return False
+
+    def _wait_clear(self, rect: Rectangle, address: int):
+        """
+        Blocks until no running refresh from the image buffer at address
+        overlaps rect (None: anywhere). Doesn't touch the bus if none of the
+        tracked refreshes do.
+        """
+        if not self._overlaps(rect, address):
+            return
+        self.stats["stalls"] += 1
+        self._poll()
+        while self._overlaps(rect, address):
+            self._poll()
+
+    def wait_buffer(self, base_address: int = None):
+        """
+        Blocks until no refresh reads the image buffer at base_address
+        (default: the one reported by the IT8951)
+        """
+        if base_address is None:
+            base_address = self._default_address
+        self._wait_clear(None, base_address)
+
+    def _issued(self, rect: Rectangle, before: int, address: int):
+        """
+        Records a refresh that was just issued. Its engine is the LUTAFSR bit
+        that was clear before it. If there is none, e.g. because every engine
+        was busy and the controller queued it, it is conservatively assumed
+        to run until all currently busy engines are idle. If LUTAFSR still
+        reads idle, because the engine hasn't latched the refresh yet or it
+        already finished, it is assumed to run on any engine, until one was
+        seen busy and went idle or _LATCH_US passed (see _poll).
+        """
+        status = self._tcon.lut_status()
+        self.stats["lutafsr_polls"] += 1
+        bits = status & ~before
+        if bits == 0:
+            bits = status
+        issued = None
+        if bits == 0:
+            bits = self._ALL_ENGINES
+            issued = _ticks_us()
+        self._in_flight.append([rect, bits, address, issued])
+        self.stats["submitted"] += 1
+
+    def upload(self, img_info: ImageInfo, rect: Rectangle, data, base_address: int = None,
+               stride: int = None):
+        """
+        Uploads packed pixels (see it8951.write_packed_pixels, also for
+        stride) to the image buffer at base_address (default: the one
+        reported by the IT8951) without refreshing them
+        """
+        if base_address is None:
+            base_address = self._default_address
+        self._wait_clear(rect, base_address)
+        # A no-op while the register cache holds the address
+        self._tcon.set_img_buff_base_address(base_address)
+        self._tcon.write_packed_pixels(img_info, rect, data, stride)
+
+    def display(self, rect: Rectangle, mode: DisplayMode, base_address: int = None):
+        """
+        Refreshes rect from the image buffer at base_address (default: the
+        one reported by the IT8951) without waiting for other refreshes
+        """
+        if base_address is None:
+            base_address = self._default_address
+        before = self._poll()
+        if base_address == self._default_address:
+            self._tcon.display_area(rect, mode, wait=False)
+        else:
+            self._tcon.display_buffer_area(rect, mode, base_address, wait=False)
+        self._issued(rect, before, base_address)
+
+    def submit(self, img_info: ImageInfo, rect: Rectangle, data, mode: DisplayMode,
+               base_address: int = None, stride: int = None):
+        """
+        Uploads packed pixels and refreshes rect with mode, without waiting
+        for unrelated refreshes to finish
+        """
+        self.upload(img_info, rect, data, base_address, stride)
+        self.display(rect, mode, base_address)
+
+    def fill(self, rect: Rectangle, mode: DisplayMode, colour: int):
+        """
+        Queued equivalent of it8951.fill_rect, which always fills the default
+        image buffer
+        """
+        self._wait_clear(rect, self._default_address)
+        before = self._poll()
+        self._tcon.fill_rect(rect, mode, colour)
+        self._issued(rect, before, self._default_address)
+
+    def wait_idle(self):
+        """
+        Blocks until every tracked refresh has finished
+        """
+        while self._in_flight:
+            self._poll()
@@ -0,0 +1,127 @@
+from it8951 import *
+
+# Grey level bit masks, bit n set = level n present
+_BLACK = 1 << 0x0
+_WHITE = 1 << 0xF
+_BW    = _BLACK | _WHITE
+
+class WaveformScheduler:
+    """
+    Picks the fastest waveform that renders an update correctly and keeps
+    track of the ghosting that the fast waveforms leave behind:
+    - A2:   black/white to black/white
+    - DU:   anything to black/white
+    - GL16: grey levels appearing on, or disappearing to, white (text)
+    - GC16: grey to grey changes, and regions that accumulated too much debt
+    The panel is divided into square cells. Every non-GC16 refresh adds its
+    debt to the cells it covers and a GC16 refresh clears them. Once a region
+    reaches region_threshold it is refreshed with GC16 instead, and once the
+    fast refreshes on the whole panel add up to panel_threshold a full panel
+    cleanup is requested.
+    """
+    # Ghosting debt added by a refresh with each waveform
+    DEBT = {
+        DisplayMode.A2:    4,
+        DisplayMode.DU:    2,
+        DisplayMode.DU4:   2,
+        DisplayMode.GL16:  1,
+        DisplayMode.GLR16: 1,
+        DisplayMode.GLD16: 1,
+    }
+
+    def __init__(self, panel_area: Rectangle, cell_size: int = 64,
+                 region_threshold: int = 16, panel_threshold: int = 200,
+                 cleanup_mode: DisplayMode = DisplayMode.GC16):
+        """
+        Args:
+            panel_area: Area of the whole panel
+            cell_size: Size of the square cells debt is tracked for, in pixels
+            region_threshold: Debt at which a region is refreshed with GC16
+            panel_threshold: Total debt at which a full panel cleanup is due
+            cleanup_mode: Waveform of the full panel cleanup (GC16 or INIT)
+        """
+        self.panel_area = panel_area
+        self.cell_size = cell_size
+        self.region_threshold = region_threshold
+        self.panel_threshold = panel_threshold
+        self.cleanup_mode = cleanup_mode
+        self._cells_x = (panel_area.width + cell_size - 1) // cell_size
+        self._cells_y = (panel_area.height + cell_size - 1) // cell_size
+        self._debt = bytearray(self._cells_x*self._cells_y)
+        self.panel_debt = 0
+
+    def _cells(self, rect: Rectangle):
+        cx0 = rect.x // self.cell_size
+        cx1 = (rect.x + rect.width - 1) // self.cell_size
+        cy0 = rect.y // self.cell_size
+        cy1 = (rect.y + rect.height - 1) // self.cell_size
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                yield cy*self._cells_x + cx
+
+    def debt(self, rect: Rectangle) -> int:
+        """
+        Highest ghosting debt of the cells covered by rect
+        """
+        return max(self._debt[i] for i in self._cells(rect))
+
+    def choose(self, rect: Rectangle, old_levels: int, new_levels: int, grey_to_grey: bool) -> DisplayMode:
+        """
+        Picks the waveform for an update of rect
+        Args:
+            rect: Area to refresh
+            old_levels: Bit mask of the grey levels the changed pixels had
+            new_levels: Bit mask of the grey levels the changed pixels get
+            grey_to_grey: True if a pixel changed with neither its old nor its
+                          new level being white
+        An area without changed pixels, i.e. a forced refresh, gets GC16.
+        """
+        if new_levels == 0:
+            return DisplayMode.GC16
+        if new_levels & ~_BW == 0:
+            mode = DisplayMode.A2 if old_levels & ~_BW == 0 else DisplayMode.DU
+        elif not grey_to_grey:
+            mode = DisplayMode.GL16
+        else:
+            return DisplayMode.GC16
+        if self.debt(rect) + self.DEBT[mode] > self.region_threshold:
+            return DisplayMode.GC16
+        return mode
+
+    def choose_fill(self, rect: Rectangle, colour: int) -> DisplayMode:
+        """
+        Picks the waveform of a uniform fill, whose previous content is unknown
+        """
+        if (1 << (colour & 0xF)) & _BW and \
+           self.debt(rect) + self.DEBT[DisplayMode.DU] <= self.region_threshold:
+            return DisplayMode.DU
+        return DisplayMode.GC16
+
+    def commit(self, rect: Rectangle, mode: DisplayMode):
+        """
+        Records that rect was refreshed with mode
+        """
+        cost = self.DEBT.get(mode, 0)
+        for i in self._cells(rect):
+            self._debt[i] = 0 if cost == 0 else min(255, self._debt[i] + cost)
+        self.panel_debt += cost
+
+    def needs_cleanup(self) -> bool:
+        return self.panel_debt >= self.panel_threshold
+
+    def cleanup(self, tcon: it8951, base_address: int = None):
+        """
+        Refreshes the whole panel from the image buffer with cleanup_mode and
+        clears all debt
+        Args:
+            tcon: Initialised IT8951 driver
+            base_address: [Optional] Image buffer to refresh from, if not the
+                          IT8951's default one
+        """
+        if base_address is None:
+            tcon.display_area(self.panel_area, self.cleanup_mode)
+        else:
+            tcon.display_buffer_area(self.panel_area, self.cleanup_mode, base_address)
+        for i in range(len(self._debt)):
+            self._debt[i] = 0
+        self.panel_debt = 0